@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Database latency benchmark for SCNMS services
+Compares the blocking SQLAlchemy Session path with the AsyncSession path
+when many requests share one event loop, as they do inside a FastAPI worker.
+
+Usage (from the repository root, against a running PostgreSQL):
+    python -m benchmarks.db_latency --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+from sqlalchemy import select, desc
+
+from shared.database import SessionLocal, AsyncSessionLocal, engine, async_engine
+from shared.models import Alarm
+
+
+def list_alarms_query(limit: int):
+    """Same query the /alarms endpoint runs"""
+    return select(Alarm).order_by(desc(Alarm.raised_at)).limit(limit)
+
+
+async def sync_request(limit: int) -> float:
+    """One request using the blocking Session inside a coroutine"""
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        db.execute(list_alarms_query(limit)).scalars().all()
+    finally:
+        db.close()
+    return time.perf_counter() - start
+
+
+async def async_request(limit: int) -> float:
+    """One request using AsyncSession"""
+    start = time.perf_counter()
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(list_alarms_query(limit))
+        result.scalars().all()
+    return time.perf_counter() - start
+
+
+async def run_load(request_func, concurrency: int, total: int, limit: int) -> List[float]:
+    """Fire `total` requests with at most `concurrency` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def worker():
+        async with semaphore:
+            queued = time.perf_counter()
+            await request_func(limit)
+            # Measure from enqueue so event-loop stalls show up in the numbers
+            latencies.append(time.perf_counter() - queued)
+
+    await asyncio.gather(*(worker() for _ in range(total)))
+    return latencies
+
+
+def summarize(name: str, latencies: List[float], elapsed: float):
+    """Print latency percentiles and throughput"""
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+
+    print(
+        f"{name:<14} n={len(ordered):<6} "
+        f"p50={percentile(0.50):8.2f}ms p95={percentile(0.95):8.2f}ms "
+        f"p99={percentile(0.99):8.2f}ms mean={statistics.mean(ordered) * 1000:8.2f}ms "
+        f"throughput={len(ordered) / elapsed:8.1f} req/s"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="SCNMS sync vs async DB latency benchmark")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--limit", type=int, default=100, help="Rows per query")
+    args = parser.parse_args()
+
+    # Warm up both pools so connection setup is not measured
+    await sync_request(args.limit)
+    await async_request(args.limit)
+
+    print(f"concurrency={args.concurrency} requests={args.requests} limit={args.limit}")
+    for name, func in (("sync Session", sync_request), ("AsyncSession", async_request)):
+        start = time.perf_counter()
+        latencies = await run_load(func, args.concurrency, args.requests, args.limit)
+        summarize(name, latencies, time.perf_counter() - start)
+
+    engine.dispose()
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
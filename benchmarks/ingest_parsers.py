@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Receiver parser benchmark for SCNMS data ingestion
+Times the Prometheus remote_write and InfluxDB line protocol parsers on
+synthetic payloads, without a database: the device index is filled in memory
+and rows are only collected, not written.
+
+Usage (from the repository root):
+    python -m benchmarks.ingest_parsers --samples 1000000 --devices 500
+"""
+import argparse
+import time
+from typing import List
+
+import snappy
+
+from services.data_ingestion.bulk import BulkIngestResult
+from services.data_ingestion.device_index import DeviceIndex
+from services.data_ingestion.prompb import encode_write_request
+from services.data_ingestion.receivers import SeriesResolver, TimeWindow, parse_line_protocol, parse_remote_write
+
+METRICS = ('cpu_utilization', 'memory_utilization', 'if_in_octets', 'if_out_octets', 'temperature')
+TARGET_SAMPLES_PER_MINUTE = 1_000_000
+
+
+def fake_device_index(devices: int) -> DeviceIndex:
+    """A DeviceIndex populated in memory instead of from PostgreSQL"""
+    index = DeviceIndex()
+    for device_id in range(1, devices + 1):
+        index.ids[device_id] = f"device-{device_id}"
+        index.by_ip[f"10.{device_id // 256}.{device_id % 256}.1"] = device_id
+        index.by_name[f"device-{device_id}"] = device_id
+    index.loaded_at = time.time()
+    return index
+
+
+def remote_write_payloads(samples: int, devices: int, per_request: int, now: float) -> List[bytes]:
+    """Snappy WriteRequests with one sample per series, like a scrape-and-forward agent"""
+    payloads = []
+    timestamp = int(now * 1000)
+    for start in range(0, samples, per_request):
+        series = []
+        for n in range(start, min(samples, start + per_request)):
+            device_id = n % devices + 1
+            labels = [
+                ('__name__', METRICS[n // devices % len(METRICS)]),
+                ('instance', f"10.{device_id // 256}.{device_id % 256}.1:9100"),
+                ('job', 'node'),
+                ('ifName', f"eth{n // (devices * len(METRICS)) % 48}")
+            ]
+            series.append((labels, [(float(n % 100), timestamp)]))
+        payloads.append(snappy.compress(encode_write_request(series)))
+    return payloads
+
+
+def line_protocol_payloads(samples: int, devices: int, per_request: int, now: float) -> List[str]:
+    """Telegraf-style lines with two fields each"""
+    payloads = []
+    timestamp = int(now * 1e9)
+    for start in range(0, samples, per_request * 2):
+        lines = []
+        for n in range(start, min(samples, start + per_request * 2), 2):
+            device_id = n % devices + 1
+            lines.append(
+                f"interface,host=device-{device_id},ifName=eth{n // devices % 48} "
+                f"in_octets={n}i,out_octets={n * 2}i {timestamp}"
+            )
+        payloads.append('\n'.join(lines))
+    return payloads
+
+
+def run(name: str, parse, payloads: list, samples: int):
+    """Parse every payload twice (cold then warm series cache) and print throughput"""
+    for label in ('cold', 'warm'):
+        result = BulkIngestResult()
+        rows = 0
+        start = time.perf_counter()
+        for payload in payloads:
+            rows += len(parse(payload, result))
+        elapsed = time.perf_counter() - start
+        rate = samples / elapsed
+        core_share = TARGET_SAMPLES_PER_MINUTE / 60 / rate
+        print(
+            f"{name:<14} {label:<5} rows={rows:<8} rejected={result.rejected:<6} "
+            f"time={elapsed:7.2f}s rate={rate:11.0f} samples/s "
+            f"core_for_1M_per_min={core_share * 100:5.1f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SCNMS receiver parser benchmark")
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--devices", type=int, default=500)
+    parser.add_argument("--per-request", type=int, default=2000, help="Samples per request body")
+    args = parser.parse_args()
+
+    now = time.time()
+    index = fake_device_index(args.devices)
+    window = TimeWindow(now - 3600, now + 300)
+
+    print(f"samples={args.samples} devices={args.devices} per_request={args.per_request}")
+
+    resolver = SeriesResolver(index)
+    payloads = remote_write_payloads(args.samples, args.devices, args.per_request, now)
+    run("remote_write", lambda body, result: parse_remote_write(body, resolver, window, result),
+        payloads, args.samples)
+
+    resolver = SeriesResolver(index)
+    payloads = line_protocol_payloads(args.samples, args.devices, args.per_request, now)
+    run("line_protocol", lambda text, result: parse_line_protocol(text, 'ns', resolver, window, now, result),
+        payloads, args.samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -34,9 +34,16 @@ CREATE TABLE IF NOT EXISTS metrics (
     metric_value FLOAT NOT NULL,
     unit VARCHAR(50),
     timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    ingest_xid BIGINT NOT NULL DEFAULT CAST(CAST(pg_current_xact_id() AS text) AS bigint),
     labels JSONB
 );
 
+-- Added after the first release: the writing transaction of each row. Ids are taken
+-- before commit, so incremental readers gate on the snapshot (rows of transactions
+-- below its xmin) rather than on id or time. Rows written before have 0.
+ALTER TABLE metrics ADD COLUMN IF NOT EXISTS ingest_xid BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE metrics ALTER COLUMN ingest_xid SET DEFAULT CAST(CAST(pg_current_xact_id() AS text) AS bigint);
+
 CREATE TABLE IF NOT EXISTS alarms (
     id SERIAL PRIMARY KEY,
     device_id INTEGER NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
@@ -51,9 +58,71 @@ CREATE TABLE IF NOT EXISTS alarms (
     acknowledged_by VARCHAR(100),
     cleared_at TIMESTAMP,
     closed_at TIMESTAMP,
+    root_cause_alarm_id VARCHAR(255),
     additional_info JSONB
 );
 
+-- Added after the first release; set on symptoms of an upstream outage
+ALTER TABLE alarms ADD COLUMN IF NOT EXISTS root_cause_alarm_id VARCHAR(255);
+
+-- Closed alarms moved out of alarms by the alarm manager; one partition per day of
+-- closed_at (database clock and time zone), created by the archiver as needed and
+-- dropped whole at retention
+CREATE TABLE IF NOT EXISTS alarm_history (
+    id INTEGER NOT NULL,
+    device_id INTEGER NOT NULL,
+    alarm_id VARCHAR(255) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    severity VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    source VARCHAR(100),
+    raised_at TIMESTAMP,
+    acknowledged_at TIMESTAMP,
+    acknowledged_by VARCHAR(100),
+    cleared_at TIMESTAMP,
+    closed_at TIMESTAMP NOT NULL,
+    root_cause_alarm_id VARCHAR(255),
+    archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, closed_at)
+) PARTITION BY RANGE (closed_at);
+
+-- Takes rows whose day partition is missing, so archiving never fails on one
+CREATE TABLE IF NOT EXISTS alarm_history_default PARTITION OF alarm_history DEFAULT;
+
+-- Append-only alarm lifecycle log (state after each event); alarms is its projection.
+-- One partition per day of ts, created ahead by the alarm manager from the database's
+-- current_date. Alarms active before the log existed: migrate_alarm_events_backfill.sql
+CREATE TABLE IF NOT EXISTS alarm_events (
+    id BIGSERIAL,
+    ts TIMESTAMPTZ NOT NULL DEFAULT now(),
+    event_type VARCHAR(20) NOT NULL,
+    alarm_id VARCHAR(255) NOT NULL,
+    alarm_row_id INTEGER NOT NULL,
+    device_id INTEGER NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    severity VARCHAR(20) NOT NULL,
+    title VARCHAR(255) NOT NULL,
+    description TEXT,
+    source VARCHAR(100),
+    raised_at TIMESTAMP,
+    actor VARCHAR(100),
+    root_cause_alarm_id VARCHAR(255),
+    PRIMARY KEY (id, ts)
+) PARTITION BY RANGE (ts);
+
+-- Takes events whose day partition is missing, so no alarm transition fails on one
+CREATE TABLE IF NOT EXISTS alarm_events_default PARTITION OF alarm_events DEFAULT;
+
+CREATE TABLE IF NOT EXISTS device_dependencies (
+    id SERIAL PRIMARY KEY,
+    parent_device_id INTEGER NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+    child_device_id INTEGER NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+    source VARCHAR(20) NOT NULL DEFAULT 'manual',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (parent_device_id, child_device_id)
+);
+
 CREATE TABLE IF NOT EXISTS alarm_rules (
     id SERIAL PRIMARY KEY,
     name VARCHAR(255) NOT NULL UNIQUE,
@@ -61,13 +130,20 @@ CREATE TABLE IF NOT EXISTS alarm_rules (
     metric_name VARCHAR(255) NOT NULL,
     threshold_value FLOAT NOT NULL,
     comparison_operator VARCHAR(5) NOT NULL,
+    clear_threshold_value FLOAT,
     duration_seconds INTEGER DEFAULT 60,
     severity VARCHAR(20) NOT NULL,
     enabled BOOLEAN DEFAULT TRUE,
+    device_id INTEGER REFERENCES devices(id) ON DELETE CASCADE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Added after the first release; NULL clears at threshold_value (no hysteresis)
+ALTER TABLE alarm_rules ADD COLUMN IF NOT EXISTS clear_threshold_value FLOAT;
+-- Added after the first release; NULL applies the rule to every device
+ALTER TABLE alarm_rules ADD COLUMN IF NOT EXISTS device_id INTEGER REFERENCES devices(id) ON DELETE CASCADE;
+
 CREATE TABLE IF NOT EXISTS polling_jobs (
     id SERIAL PRIMARY KEY,
     device_id INTEGER NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
@@ -81,14 +157,70 @@ CREATE TABLE IF NOT EXISTS polling_jobs (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE IF NOT EXISTS retention_policies (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(255) UNIQUE NOT NULL,
+    metric_pattern VARCHAR(255) NOT NULL,
+    raw_ttl_days INTEGER NOT NULL,
+    rollup_ttls TEXT,
+    archive BOOLEAN DEFAULT FALSE,
+    priority INTEGER DEFAULT 100,
+    enabled BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS metric_rollups (
+    id BIGSERIAL PRIMARY KEY,
+    device_id INTEGER NOT NULL REFERENCES devices(id) ON DELETE CASCADE,
+    metric_name VARCHAR(255) NOT NULL,
+    resolution_seconds INTEGER NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    min_value FLOAT NOT NULL,
+    max_value FLOAT NOT NULL,
+    sum_value FLOAT NOT NULL,
+    sample_count INTEGER NOT NULL,
+    UNIQUE (device_id, metric_name, resolution_seconds, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS metrics_archive (
+    id INTEGER PRIMARY KEY,
+    device_id INTEGER NOT NULL,
+    metric_name VARCHAR(255) NOT NULL,
+    metric_value FLOAT NOT NULL,
+    metric_unit VARCHAR(50),
+    timestamp TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS ingestion_checkpoints (
+    consumer VARCHAR(100) PRIMARY KEY,
+    last_xid BIGINT NOT NULL DEFAULT 0,
+    last_metric_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Added with metrics.ingest_xid; existing checkpoints continue with the pre-upgrade rows
+ALTER TABLE ingestion_checkpoints ADD COLUMN IF NOT EXISTS last_xid BIGINT NOT NULL DEFAULT 0;
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_devices_ip_address ON devices(ip_address);
 CREATE INDEX IF NOT EXISTS idx_devices_status ON devices(status);
 CREATE INDEX IF NOT EXISTS idx_metrics_device_timestamp ON metrics(device_id, timestamp);
 CREATE INDEX IF NOT EXISTS idx_metrics_name_timestamp ON metrics(metric_name, timestamp);
+CREATE INDEX IF NOT EXISTS idx_metrics_ingest_xid ON metrics(ingest_xid, id);
 CREATE INDEX IF NOT EXISTS idx_alarms_device_status ON alarms(device_id, status);
 CREATE INDEX IF NOT EXISTS idx_alarms_severity ON alarms(severity);
 CREATE INDEX IF NOT EXISTS idx_alarms_raised_at ON alarms(raised_at);
+CREATE INDEX IF NOT EXISTS idx_alarms_root_cause ON alarms(root_cause_alarm_id);
+CREATE INDEX IF NOT EXISTS idx_alarms_closed_at ON alarms(closed_at);
+CREATE INDEX IF NOT EXISTS idx_alarm_history_device_closed ON alarm_history(device_id, closed_at);
+CREATE INDEX IF NOT EXISTS idx_alarm_history_alarm_id ON alarm_history(alarm_id);
+CREATE INDEX IF NOT EXISTS idx_alarm_events_device_ts ON alarm_events(device_id, ts);
+CREATE INDEX IF NOT EXISTS idx_alarm_events_alarm_ts ON alarm_events(alarm_id, ts);
+CREATE INDEX IF NOT EXISTS idx_device_dependencies_child ON device_dependencies(child_device_id);
+CREATE INDEX IF NOT EXISTS idx_alarm_rules_device ON alarm_rules(device_id);
+CREATE INDEX IF NOT EXISTS idx_metric_rollups_name_bucket ON metric_rollups(metric_name, resolution_seconds, bucket_start);
+CREATE INDEX IF NOT EXISTS idx_metrics_archive_timestamp ON metrics_archive(timestamp);
 
 -- Create update timestamp function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -105,3 +237,6 @@ CREATE TRIGGER update_devices_updated_at BEFORE UPDATE ON devices
 
 CREATE TRIGGER update_alarm_rules_updated_at BEFORE UPDATE ON alarm_rules
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_retention_policies_updated_at BEFORE UPDATE ON retention_policies
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -38,11 +38,18 @@ INSERT INTO polling_jobs (device_id, protocol, oid_or_path, polling_interval, en
 (1, 'snmp', '1.3.6.1.2.1.2.2.1.10', 60, true),  -- Interface in octets
 (1, 'snmp', '1.3.6.1.2.1.2.2.1.16', 60, true);  -- Interface out octets
 
--- Create a function to clean up old metrics
+-- Insert default retention policies (lowest priority wins; unmatched metrics keep METRIC_RETENTION_DAYS)
+INSERT INTO retention_policies (name, metric_pattern, raw_ttl_days, rollup_ttls, archive, priority) VALUES
+('interface-counters', 'snmp_1.3.6.1.2.1.2.2.1.*', 7, '{"300": 90, "3600": 730}', false, 10),
+('interface-metrics', 'interface_*', 7, '{"300": 90, "3600": 730}', false, 20),
+('utilization', '*_utilization', 14, '{"300": 90, "3600": 365}', false, 30),
+('temperature', 'temperature', 2, '{"3600": 30}', false, 40);
+
+-- Create a function to clean up old alarms
+-- Metric retention is enforced per policy by the data ingestion service
 CREATE OR REPLACE FUNCTION cleanup_old_metrics()
 RETURNS void AS $$
 BEGIN
-    DELETE FROM metrics WHERE timestamp < NOW() - INTERVAL '30 days';
     DELETE FROM alarms WHERE status = 'closed' AND closed_at < NOW() - INTERVAL '7 days';
 END;
 $$ LANGUAGE plpgsql;
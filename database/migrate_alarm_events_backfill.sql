@@ -0,0 +1,22 @@
+-- Backfill alarm_events for alarms that were active before the event log existed
+-- Run once after create_tables.sql has added alarm_events, e.g.
+--   psql -h localhost -U scnms -d scnms -f database/migrate_alarm_events_backfill.sql
+-- Replaying the log (POST /alarm-events/replay) rebuilds the active-alarm table from
+-- events only, so every alarm active at cutover gets a 'raised' event holding its
+-- current state. Alarms that already have an event are skipped, so running it again
+-- is harmless.
+
+-- Events land in today's partition if the alarm manager has created it, else here
+CREATE TABLE IF NOT EXISTS alarm_events_default PARTITION OF alarm_events DEFAULT;
+
+INSERT INTO alarm_events (
+    ts, event_type, alarm_id, alarm_row_id, device_id, status, severity,
+    title, description, source, raised_at, root_cause_alarm_id
+)
+SELECT now(), 'raised', a.alarm_id, a.id, a.device_id, a.status, a.severity,
+       a.title, a.description, a.source, a.raised_at, a.root_cause_alarm_id
+FROM alarms a
+-- The service stores enum names (RAISED), the schema default is the value (raised)
+WHERE lower(a.status) IN ('raised', 'acknowledged')
+  AND NOT EXISTS (SELECT 1 FROM alarm_events e WHERE e.alarm_id = a.alarm_id)
+ORDER BY a.raised_at, a.id;
@@ -0,0 +1,123 @@
+"""
+In-memory active-alarm table for the Alarm Manager Service
+Every raised or acknowledged alarm, keyed by alarm_id. Metric evaluation
+checks this table instead of querying alarms on every sample, so the database
+is only touched when an alarm actually changes state. The table is rebuilt
+from the database at startup and kept in step by the lifecycle methods.
+"""
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import Alarm, AlarmSeverity, AlarmStatus
+from shared.logger import get_logger
+
+logger = get_logger("alarm_manager")
+
+ACTIVE_STATUSES = (AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED)
+
+
+@dataclass
+class ActiveAlarm:
+    """What evaluation needs to know about an active alarm"""
+    id: int
+    alarm_id: str
+    device_id: int
+    severity: AlarmSeverity
+    status: AlarmStatus
+    raised_at: Optional[datetime]
+    source: Optional[str]
+    root_cause_alarm_id: Optional[str] = None
+
+    @classmethod
+    def from_model(cls, alarm: Alarm) -> 'ActiveAlarm':
+        return cls(
+            id=alarm.id,
+            alarm_id=alarm.alarm_id,
+            device_id=alarm.device_id,
+            severity=alarm.severity,
+            status=alarm.status,
+            raised_at=alarm.raised_at,
+            source=alarm.source,
+            root_cause_alarm_id=alarm.root_cause_alarm_id
+        )
+
+
+class ActiveAlarmTable:
+    """alarm_id -> ActiveAlarm for raised/acknowledged alarms, plus a per-device index"""
+
+    def __init__(self):
+        self.alarms: Dict[str, ActiveAlarm] = {}
+        self.by_device: Dict[int, Set[str]] = {}
+        self.loaded_at = 0.0
+        self.lookups = 0
+        self.transitions = 0
+        # Called with (alarm_id, active) on every change, (None, False) after a reload
+        self.listeners: List[Callable[[Optional[str], bool], None]] = []
+
+    async def load(self, db: AsyncSession):
+        """Rebuild the table from the alarms currently active in the database"""
+        result = await db.execute(select(Alarm).where(Alarm.status.in_(ACTIVE_STATUSES)))
+        self.replace(ActiveAlarm.from_model(alarm) for alarm in result.scalars().all())
+        logger.info("Active alarm table loaded", alarms=len(self.alarms))
+
+    def replace(self, entries: Iterable[ActiveAlarm]):
+        """Swap in a complete set of active alarms (from the alarms table or the event log)"""
+        self.alarms = {}
+        self.by_device = {}
+        for entry in entries:
+            self._put(entry)
+        self.loaded_at = time.time()
+        for listener in self.listeners:
+            listener(None, False)
+
+    def _put(self, entry: ActiveAlarm):
+        self.alarms[entry.alarm_id] = entry
+        self.by_device.setdefault(entry.device_id, set()).add(entry.alarm_id)
+        for listener in self.listeners:
+            listener(entry.alarm_id, True)
+
+    def get(self, alarm_id: str) -> Optional[ActiveAlarm]:
+        self.lookups += 1
+        return self.alarms.get(alarm_id)
+
+    def is_active(self, alarm_id: str) -> bool:
+        self.lookups += 1
+        return alarm_id in self.alarms
+
+    def track(self, alarm: Alarm):
+        """Record an alarm after a committed state change; inactive alarms leave the table"""
+        self.transitions += 1
+        if alarm.status in ACTIVE_STATUSES:
+            self._put(ActiveAlarm.from_model(alarm))
+        else:
+            self.discard(alarm.alarm_id)
+
+    def discard(self, alarm_id: str):
+        entry = self.alarms.pop(alarm_id, None)
+        if entry is None:
+            return
+        for listener in self.listeners:
+            listener(alarm_id, False)
+        device_alarms = self.by_device.get(entry.device_id)
+        if device_alarms is not None:
+            device_alarms.discard(alarm_id)
+            if not device_alarms:
+                del self.by_device[entry.device_id]
+
+    def stats(self) -> Dict[str, object]:
+        by_status: Dict[str, int] = {}
+        for entry in self.alarms.values():
+            by_status[entry.status.value] = by_status.get(entry.status.value, 0) + 1
+        return {
+            'active': len(self.alarms),
+            'by_status': by_status,
+            'devices': len(self.by_device),
+            'lookups': self.lookups,
+            'transitions': self.transitions,
+            'loaded_at': self.loaded_at
+        }
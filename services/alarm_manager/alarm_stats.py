@@ -0,0 +1,144 @@
+"""
+Incrementally maintained alarm counters for the Alarm Manager Service
+Alarms are counted per (status, severity). Every state transition moves one
+alarm between two cells, so the counters are updated where the transition is
+written instead of being recounted per request. The cells live in a Redis
+hash shared by all workers (HINCRBY, whose results refresh this process's
+copy) and in memory, which the stats endpoint reads. A periodic GROUP BY
+query overwrites both, correcting any drift from crashes, races or writes
+made outside this service.
+"""
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import redis.asyncio as aioredis
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import Alarm, AlarmSeverity, AlarmStatus
+from shared.logger import get_logger
+from services.alarm_manager.active_alarms import ACTIVE_STATUSES
+
+logger = get_logger("alarm_manager")
+
+STATS_KEY = 'alarm_stats'
+
+# (status, severity) of an alarm row; None for a row that does not exist
+AlarmState = Optional[Tuple[AlarmStatus, AlarmSeverity]]
+
+_ACTIVE = frozenset(status.value for status in ACTIVE_STATUSES)
+
+
+def _field(state: Tuple[AlarmStatus, AlarmSeverity]) -> str:
+    status, severity = state
+    return f"{AlarmStatus(status).value}:{AlarmSeverity(severity).value}"
+
+
+class CounterChanges:
+    """Net per-cell changes of one group of transitions"""
+
+    def __init__(self):
+        self.deltas: Dict[str, int] = {}
+
+    def __bool__(self) -> bool:
+        return any(self.deltas.values())
+
+    def move(self, old: AlarmState, new: AlarmState, count: int = 1):
+        if old == new:
+            return
+        if old is not None:
+            field = _field(old)
+            self.deltas[field] = self.deltas.get(field, 0) - count
+        if new is not None:
+            field = _field(new)
+            self.deltas[field] = self.deltas.get(field, 0) + count
+
+
+class AlarmCounters:
+    """(status, severity) -> alarm count, mirrored in a Redis hash"""
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.reconciled_at = 0.0
+        self.refreshed_at = 0.0
+        self.updates = 0
+        self.reconciles = 0
+        # Total absolute correction applied by the last reconcile
+        self.last_drift = 0
+
+    async def apply(self, redis_client: Optional[aioredis.Redis], changes: CounterChanges):
+        """Add a group of transitions to the counters"""
+        deltas = {field: delta for field, delta in changes.deltas.items() if delta}
+        if not deltas:
+            return
+        self.updates += 1
+        for field, delta in deltas.items():
+            self.counts[field] = self.counts.get(field, 0) + delta
+        if redis_client is None:
+            return
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for field, delta in deltas.items():
+                    pipe.hincrby(STATS_KEY, field, delta)
+                values = await pipe.execute()
+            # The shared totals include other workers' transitions
+            self.counts.update(zip(deltas, (int(value) for value in values)))
+        except Exception as e:
+            logger.warning("Failed to update alarm counters in Redis", error=str(e))
+
+    async def refresh(self, redis_client: aioredis.Redis):
+        """Pick up the shared counters (other workers' transitions)"""
+        values = await redis_client.hgetall(STATS_KEY)
+        if values:
+            self.counts = {field: int(value) for field, value in values.items()}
+        self.refreshed_at = time.time()
+
+    async def reconcile(self, db: AsyncSession, redis_client: Optional[aioredis.Redis]):
+        """Replace the counters with one grouped count of the alarms table"""
+        result = await db.execute(
+            select(Alarm.status, Alarm.severity, func.count(Alarm.id)).group_by(Alarm.status, Alarm.severity)
+        )
+        counts = {_field((status, severity)): count for status, severity, count in result.all()}
+        self.last_drift = sum(
+            abs(counts.get(field, 0) - self.counts.get(field, 0)) for field in set(counts) | set(self.counts)
+        )
+        self.counts = counts
+        self.reconciled_at = time.time()
+        self.reconciles += 1
+        if redis_client is not None:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(STATS_KEY)
+                if counts:
+                    pipe.hset(STATS_KEY, mapping=counts)
+                await pipe.execute()
+        if self.last_drift:
+            logger.info("Alarm counters reconciled", drift=self.last_drift)
+
+    def _cells(self) -> Iterable[Tuple[str, str, int]]:
+        for field, count in self.counts.items():
+            status, _, severity = field.partition(':')
+            yield status, severity, count
+
+    def summary(self) -> Dict[str, Any]:
+        """total_alarms, by_status and active_by_severity, as /alarms/stats/summary returns them"""
+        by_status = {status.value: 0 for status in AlarmStatus}
+        active_by_severity = {severity.value: 0 for severity in AlarmSeverity}
+        for status, severity, count in self._cells():
+            by_status[status] = by_status.get(status, 0) + count
+            if status in _ACTIVE:
+                active_by_severity[severity] = active_by_severity.get(severity, 0) + count
+        return {
+            'total_alarms': sum(by_status.values()),
+            'by_status': by_status,
+            'active_by_severity': active_by_severity
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cells': len(self.counts),
+            'updates': self.updates,
+            'reconciles': self.reconciles,
+            'last_drift': self.last_drift,
+            'reconciled_at': self.reconciled_at,
+            'refreshed_at': self.refreshed_at
+        }
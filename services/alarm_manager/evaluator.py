@@ -0,0 +1,187 @@
+"""
+Vectorized rule evaluation for the Alarm Manager Service
+Each (device, rule) pair gets a slot with its raise and clear thresholds,
+operator, last condition result and alarm-active flag in NumPy arrays; an
+active alarm is compared against the clear threshold (hysteresis). A micro-batch of
+samples is expanded to (slot, value) pairs with one dict lookup per sample,
+compared with one NumPy operation per operator, and reduced to the pairs that
+need attention: the condition changed since the previous sample of that slot,
+or it disagrees with the alarm state (a raise or clear may be pending).
+Steady-state samples never reach the per-pair Python code.
+"""
+import operator
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.alarm_manager.active_alarms import ActiveAlarmTable
+from services.alarm_manager.rule_index import AlarmRuleIndex, IndexedRule
+
+OPERATORS = ('>', '<', '>=', '<=', '==', '!=')
+OPERATOR_FUNCS = {
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+_UFUNCS = (np.greater, np.less, np.greater_equal, np.less_equal, np.equal, np.not_equal)
+
+UNKNOWN = -1
+
+_EMPTY_SLOTS = np.zeros(0, dtype=np.int64)
+
+
+def _grow(array: np.ndarray, size: int, fill) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, len(array) * 2, 1024), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class EvaluatedPairs:
+    """(slot, value, condition) triples that need the hold-down state machine"""
+
+    def __init__(self, slots: np.ndarray, values: np.ndarray, breached: np.ndarray, total: int):
+        self.slots = slots
+        self.values = values
+        self.breached = breached
+        self.total = total
+
+    def __iter__(self):
+        return zip(self.slots.tolist(), self.values.tolist(), self.breached.tolist())
+
+
+class BatchRuleEvaluator:
+    """Slot arrays for every (device, rule) pair seen, rebuilt when the rule index changes"""
+
+    def __init__(self, rule_index: AlarmRuleIndex, active_alarms: ActiveAlarmTable,
+                 alarm_id: Callable[[int, int], str], is_active: Callable[[str], bool]):
+        self.rule_index = rule_index
+        self.alarm_id = alarm_id
+        self.is_active = is_active
+        active_alarms.listeners.append(self._on_active_change)
+        self._reset()
+        self.batches = 0
+        self.pairs = 0
+        self.attention = 0
+
+    def _reset(self):
+        self._rules_version = self.rule_index.version
+        # (device_id, metric_name) -> slots of the rules that apply
+        self.series: Dict[Tuple[int, str], np.ndarray] = {}
+        self.slot_index: Dict[Tuple[int, int], int] = {}
+        self.slot_rule: List[Tuple[int, IndexedRule]] = []
+        self.slot_alarm_id: List[str] = []
+        self.alarm_slots: Dict[str, int] = {}
+        self.threshold = np.zeros(0)
+        self.clear_threshold = np.zeros(0)
+        self.op = np.zeros(0, dtype=np.int8)
+        self.condition = np.full(0, UNKNOWN, dtype=np.int8)
+        self.active = np.zeros(0, dtype=bool)
+
+    def _on_active_change(self, alarm_id: Optional[str], active: bool):
+        if alarm_id is None:
+            # Table reloaded
+            for alarm_id in self.alarm_slots:
+                self.refresh(alarm_id)
+            return
+        self.refresh(alarm_id)
+
+    def refresh(self, alarm_id: str):
+        """Re-read the active flag of one alarm (e.g. after a suppressed or deferred transition)"""
+        slot = self.alarm_slots.get(alarm_id)
+        if slot is not None:
+            self.active[slot] = self.is_active(alarm_id)
+
+    def _slot(self, device_id: int, rule: IndexedRule) -> int:
+        key = (device_id, rule.id)
+        slot = self.slot_index.get(key)
+        if slot is None:
+            slot = self.slot_index[key] = len(self.slot_rule)
+            alarm_id = self.alarm_id(device_id, rule.id)
+            self.slot_rule.append((device_id, rule))
+            self.slot_alarm_id.append(alarm_id)
+            self.alarm_slots[alarm_id] = slot
+            size = slot + 1
+            self.threshold = _grow(self.threshold, size, 0.0)
+            self.clear_threshold = _grow(self.clear_threshold, size, 0.0)
+            self.op = _grow(self.op, size, 0)
+            self.condition = _grow(self.condition, size, UNKNOWN)
+            self.active = _grow(self.active, size, False)
+            self.threshold[slot] = rule.threshold_value
+            self.clear_threshold[slot] = rule.clear_threshold
+            self.op[slot] = OPERATORS.index(rule.comparison_operator)
+            self.active[slot] = self.is_active(alarm_id)
+        return slot
+
+    def _series_slots(self, device_id: int, metric_name: str) -> np.ndarray:
+        rules = [rule for rule in self.rule_index.rules_for(metric_name, device_id)
+                 if rule.comparison_operator in OPERATORS]
+        slots = np.array([self._slot(device_id, rule) for rule in rules], dtype=np.int64) if rules else _EMPTY_SLOTS
+        self.series[(device_id, metric_name)] = slots
+        return slots
+
+    def evaluate(self, samples: Iterable[Tuple[int, str, float]]) -> EvaluatedPairs:
+        """Evaluate (device_id, metric_name, value) samples; returns the pairs needing attention in order"""
+        if self.rule_index.version != self._rules_version:
+            self._reset()
+
+        series = self.series
+        slot_lists = []
+        values = []
+        for device_id, metric_name, value in samples:
+            slots = series.get((device_id, metric_name))
+            if slots is None:
+                slots = self._series_slots(device_id, metric_name)
+            if len(slots):
+                slot_lists.append(slots)
+                values.append(value)
+        self.batches += 1
+        if not slot_lists:
+            return EvaluatedPairs(_EMPTY_SLOTS, np.zeros(0), np.zeros(0, dtype=bool), 0)
+
+        counts = np.fromiter((len(slots) for slots in slot_lists), dtype=np.int64, count=len(slot_lists))
+        slots = np.concatenate(slot_lists)
+        pair_values = np.repeat(np.asarray(values, dtype=np.float64), counts)
+
+        # One comparison per operator over every pair that uses it
+        breached = np.zeros(len(slots), dtype=bool)
+        ops = self.op[slots]
+        active = self.active[slots]
+        thresholds = np.where(active, self.clear_threshold[slots], self.threshold[slots])
+        for code in np.unique(ops).tolist():
+            selected = ops == code
+            breached[selected] = _UFUNCS[code](pair_values[selected], thresholds[selected])
+
+        # Previous condition of each pair: the earlier sample of the same slot in this batch, else the stored one
+        order = np.argsort(slots, kind='stable')
+        sorted_slots = slots[order]
+        sorted_breached = breached[order].astype(np.int8)
+        first = np.ones(len(slots), dtype=bool)
+        first[1:] = sorted_slots[1:] != sorted_slots[:-1]
+        previous_sorted = np.empty(len(slots), dtype=np.int8)
+        previous_sorted[1:] = sorted_breached[:-1]
+        previous_sorted[first] = self.condition[sorted_slots[first]]
+        previous = np.empty(len(slots), dtype=np.int8)
+        previous[order] = previous_sorted
+
+        last = np.ones(len(slots), dtype=bool)
+        last[:-1] = sorted_slots[1:] != sorted_slots[:-1]
+        self.condition[sorted_slots[last]] = sorted_breached[last]
+
+        attention = (breached != active) | (breached.astype(np.int8) != previous)
+        self.pairs += len(slots)
+        self.attention += int(np.count_nonzero(attention))
+        return EvaluatedPairs(slots[attention], pair_values[attention], breached[attention], len(slots))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'slots': len(self.slot_rule),
+            'series': len(self.series),
+            'batches': self.batches,
+            'pairs': self.pairs,
+            'attention': self.attention
+        }
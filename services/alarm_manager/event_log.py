@@ -0,0 +1,119 @@
+"""
+Append-only alarm event log for the Alarm Manager Service
+Every lifecycle change appends a row to alarm_events holding the alarm's state
+right after it (raise, acknowledge, clear, close, root-cause change), in the
+same transaction that updates the alarms row. alarms is therefore a projection
+of the latest event per alarm_id: it keeps one row per alarm_id, while every
+earlier occurrence of a re-raised alarm stays in the log. Events of a batch
+are written as one multi-row INSERT; history is read through the
+(device_id, ts) and (alarm_id, ts) indexes, and replaying the log rebuilds the
+active-alarm table; alarms active before the log existed get their raise event
+from database/migrate_alarm_events_backfill.sql.
+"""
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import Alarm, AlarmEvent
+from shared.logger import get_logger
+from services.alarm_manager.active_alarms import ACTIVE_STATUSES, ActiveAlarm, ActiveAlarmTable
+
+logger = get_logger("alarm_manager")
+
+_REPLAY_COLUMNS = (
+    AlarmEvent.id, AlarmEvent.alarm_id, AlarmEvent.alarm_row_id, AlarmEvent.device_id, AlarmEvent.severity,
+    AlarmEvent.status, AlarmEvent.raised_at, AlarmEvent.source, AlarmEvent.root_cause_alarm_id
+)
+
+
+def event_row(event_type: str, alarm: Alarm, actor: Optional[str] = None) -> Dict[str, Any]:
+    """alarm_events values for an alarm row right after a change"""
+    return {
+        'event_type': event_type,
+        'alarm_id': alarm.alarm_id,
+        'alarm_row_id': alarm.id,
+        'device_id': alarm.device_id,
+        'status': alarm.status,
+        'severity': alarm.severity,
+        'title': alarm.title,
+        'description': alarm.description,
+        'source': alarm.source,
+        'raised_at': alarm.raised_at,
+        'actor': actor,
+        'root_cause_alarm_id': alarm.root_cause_alarm_id
+    }
+
+
+async def append_events(db: AsyncSession, event_type: str, alarms: Iterable[Alarm], actor: Optional[str] = None) -> int:
+    """Append one event per alarm as a single INSERT in the caller's transaction"""
+    rows = [event_row(event_type, alarm, actor) for alarm in alarms]
+    if rows:
+        await db.execute(insert(AlarmEvent).values(rows))
+    return len(rows)
+
+
+async def load_events(
+    db: AsyncSession,
+    device_id: Optional[int] = None,
+    alarm_id: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    limit: int = 100
+) -> List[AlarmEvent]:
+    """Events in a time range, newest first"""
+    query = select(AlarmEvent)
+    if device_id is not None:
+        query = query.where(AlarmEvent.device_id == device_id)
+    if alarm_id is not None:
+        query = query.where(AlarmEvent.alarm_id == alarm_id)
+    if start is not None:
+        query = query.where(AlarmEvent.ts >= start)
+    if end is not None:
+        query = query.where(AlarmEvent.ts < end)
+    if event_type:
+        query = query.where(AlarmEvent.event_type == event_type)
+    result = await db.execute(query.order_by(AlarmEvent.ts.desc(), AlarmEvent.id.desc()).limit(limit))
+    return list(result.scalars().all())
+
+
+async def replay(db: AsyncSession, table: ActiveAlarmTable, page_size: int) -> Dict[str, Any]:
+    """Rebuild the active-alarm table by folding the whole log in id order, page by page"""
+    started = time.time()
+    latest: Dict[str, Optional[ActiveAlarm]] = {}
+    last_id = 0
+    events = 0
+    while True:
+        result = await db.execute(
+            select(*_REPLAY_COLUMNS).where(AlarmEvent.id > last_id).order_by(AlarmEvent.id).limit(page_size)
+        )
+        rows = result.all()
+        for event_id, alarm_id, alarm_row_id, device_id, severity, status, raised_at, source, root in rows:
+            latest[alarm_id] = ActiveAlarm(
+                id=alarm_row_id,
+                alarm_id=alarm_id,
+                device_id=device_id,
+                severity=severity,
+                status=status,
+                raised_at=raised_at,
+                source=source,
+                root_cause_alarm_id=root
+            ) if status in ACTIVE_STATUSES else None
+            last_id = event_id
+        events += len(rows)
+        if len(rows) < page_size:
+            break
+
+    table.replace(entry for entry in latest.values() if entry is not None)
+    report = {
+        'events': events,
+        'alarms': len(latest),
+        'active': len(table.alarms),
+        'last_event_id': last_id,
+        'duration_seconds': round(time.time() - started, 3)
+    }
+    logger.info("Active alarm table replayed from event log", **report)
+    return report
@@ -0,0 +1,164 @@
+"""
+WebSocket fan-out for the Alarm Manager Service
+Messages are published on a Redis channel and every alarm manager process
+delivers them to its own clients, so any worker or replica can raise an alarm
+and every console sees it. Delivery never waits on a socket: each client has a
+bounded queue (the oldest message is dropped when it is full) drained by its
+own sender task, and a client that cannot take a message within
+ALARM_WS_SEND_TIMEOUT seconds is disconnected.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Set
+
+from fastapi import WebSocket
+
+from shared.models import AlarmSeverity
+from shared.logger import get_logger
+
+logger = get_logger("alarm_manager")
+
+WS_CHANNEL = 'alarm_ws'
+
+_SEVERITIES = frozenset(severity.value for severity in AlarmSeverity)
+
+
+def _split(value: Optional[str]) -> FrozenSet[str]:
+    return frozenset(item.strip() for item in (value or '').split(',') if item.strip())
+
+
+@dataclass(frozen=True)
+class Subscription:
+    """Client filter; an empty set matches everything"""
+    severities: FrozenSet[str] = frozenset()
+    device_ids: FrozenSet[int] = frozenset()
+    locations: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def from_params(cls, params: Mapping[str, Any]) -> 'Subscription':
+        """Build from query parameters or a subscribe message: comma-separated severity, device_id, location"""
+        def items(key):
+            value = params.get(key)
+            if isinstance(value, (list, tuple)):
+                return frozenset(str(item).strip() for item in value if str(item).strip())
+            return _split(value if value is None else str(value))
+
+        severities = frozenset(severity.lower() for severity in items('severity'))
+        unknown = severities - _SEVERITIES
+        if unknown:
+            raise ValueError(f"Unknown severity: {', '.join(sorted(unknown))}")
+        return cls(
+            severities=severities,
+            device_ids=frozenset(int(device_id) for device_id in items('device_id')),
+            locations=items('location')
+        )
+
+    def matches(self, message: Dict[str, Any]) -> bool:
+        """Messages without a device or severity (e.g. storm summaries) only face the filters they carry"""
+        if self.severities and 'severity' in message and message['severity'] not in self.severities:
+            return False
+        if 'device_id' in message:
+            if self.device_ids and message['device_id'] not in self.device_ids:
+                return False
+            if self.locations and message.get('location') not in self.locations:
+                return False
+        return True
+
+
+class FanoutClient:
+    """One WebSocket with its filter, bounded queue and sender task"""
+
+    def __init__(self, websocket: WebSocket, subscription: Subscription, queue_size: int):
+        self.websocket = websocket
+        self.subscription = subscription
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.dropped = 0
+        # Highest sequence sent; live messages already covered by a replay are skipped
+        self.last_seq = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def send(self, message: Dict[str, Any], timeout: float):
+        seq = message.get('seq')
+        if seq is not None:
+            if seq <= self.last_seq:
+                return
+            self.last_seq = seq
+        await asyncio.wait_for(self.websocket.send_json(message), timeout=timeout)
+        self.sent += 1
+
+    def offer(self, message: Dict[str, Any]):
+        """Enqueue without waiting; drops the oldest message when the queue is full"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class AlarmFanout:
+    """Local WebSocket clients of this process"""
+
+    def __init__(self, queue_size: int, send_timeout: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.clients: Set[FanoutClient] = set()
+        # device_id -> location, for location filters
+        self.locations: Dict[int, Optional[str]] = {}
+        self.delivered = 0
+        self.disconnected = 0
+
+    def register(self, websocket: WebSocket, subscription: Subscription) -> FanoutClient:
+        """Start queueing live messages for a client; sending starts with start()"""
+        client = FanoutClient(websocket, subscription, self.queue_size)
+        self.clients.add(client)
+        return client
+
+    def start(self, client: FanoutClient, replay: Optional[List[Dict[str, Any]]] = None):
+        """Send the replayed messages (if any), then the live queue"""
+        client.task = asyncio.create_task(self._sender(client, replay or []))
+
+    def unregister(self, client: FanoutClient):
+        if client in self.clients:
+            self.clients.discard(client)
+            if client.task is not None and client.task is not asyncio.current_task():
+                client.task.cancel()
+
+    async def _sender(self, client: FanoutClient, replay: List[Dict[str, Any]]):
+        try:
+            for message in replay:
+                if client.subscription.matches(message):
+                    await client.send(message, self.send_timeout)
+            while True:
+                await client.send(await client.queue.get(), self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Slow or broken client: drop it without affecting anyone else
+            self.disconnected += 1
+            logger.info("WebSocket client dropped", error=str(e) or type(e).__name__, dropped=client.dropped)
+            self.unregister(client)
+            try:
+                await client.websocket.close()
+            except Exception:
+                pass
+
+    def enrich(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        if 'device_id' in message and 'location' not in message:
+            message['location'] = self.locations.get(message['device_id'])
+        return message
+
+    def deliver(self, message: Dict[str, Any]):
+        """Queue a message for every matching local client"""
+        for client in list(self.clients):
+            if client.subscription.matches(message):
+                client.offer(message)
+                self.delivered += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'clients': len(self.clients),
+            'queued': sum(client.queue.qsize() for client in self.clients),
+            'dropped': sum(client.dropped for client in self.clients),
+            'delivered': self.delivered,
+            'disconnected': self.disconnected
+        }
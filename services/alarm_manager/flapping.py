@@ -0,0 +1,206 @@
+"""
+Flap detection and storm limiting for the Alarm Manager Service
+Every raise or auto-clear adds one to a per-alarm score that halves every
+ALARM_FLAP_HALF_LIFE_SECONDS. An alarm whose score reaches the start score is
+flapping: its transitions are no longer written or notified, only the state it
+last asked for is remembered and a summary goes out every
+ALARM_FLAP_SUMMARY_INTERVAL. Once the score decays below the (lower) stop
+score the alarm settles into that state with one write.
+Independently, a token bucket caps how many raises per second reach the
+database; the excess is deferred, oldest first, until tokens refill.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+
+from services.alarm_manager.transitions import TransitionBatch
+
+# Scores below this on settled alarms are forgotten
+_NEGLIGIBLE_SCORE = 0.05
+
+
+class FlapState:
+    """Decaying transition score of one alarm"""
+    __slots__ = ('score', 'updated', 'flapping', 'since', 'suppressed', 'reported', 'desired', 'payload',
+                 'device_id')
+
+    def __init__(self, now: float, device_id: Optional[int]):
+        self.score = 0.0
+        self.updated = now
+        self.flapping = False
+        self.since = 0.0
+        self.suppressed = 0
+        self.reported = 0.0
+        self.desired = False
+        self.payload: Optional[Dict[str, Any]] = None
+        self.device_id = device_id
+
+
+class FlapDetector:
+    """alarm_id -> FlapState; suppresses transitions of flapping alarms"""
+
+    def __init__(self, half_life: float, start_score: float, stop_score: float, summary_interval: float):
+        self.half_life = half_life
+        self.start_score = start_score
+        self.stop_score = stop_score
+        self.summary_interval = summary_interval
+        self.states: Dict[str, FlapState] = {}
+        self.flapping: Dict[str, FlapState] = {}
+        self._pruned_at = 0.0
+        self.started = 0
+        self.settled = 0
+        self.suppressed = 0
+
+    def _decay(self, state: FlapState, now: float):
+        if now > state.updated:
+            state.score *= 0.5 ** ((now - state.updated) / self.half_life)
+            state.updated = now
+
+    def record(self, alarm_id: str, raised: bool, payload: Optional[Dict[str, Any]],
+               device_id: Optional[int], now: float) -> bool:
+        """Count one transition; returns False when it must be suppressed"""
+        state = self.states.get(alarm_id)
+        if state is None:
+            state = self.states[alarm_id] = FlapState(now, device_id)
+        self._decay(state, now)
+        state.score += 1.0
+        if raised:
+            state.payload = payload
+            state.device_id = payload['device_id']
+        if not state.flapping:
+            if state.score < self.start_score:
+                return True
+            state.flapping = True
+            state.since = now
+            state.reported = 0.0
+            self.flapping[alarm_id] = state
+            self.started += 1
+        state.desired = raised
+        state.suppressed += 1
+        self.suppressed += 1
+        return False
+
+    def desired(self, alarm_id: str) -> Optional[bool]:
+        """State a flapping alarm last asked for; None when it is not flapping"""
+        state = self.flapping.get(alarm_id)
+        return state.desired if state is not None else None
+
+    def due(self, now: float) -> Tuple[List[Tuple[str, FlapState]], List[Tuple[str, FlapState]]]:
+        """(settled, needing a summary) flapping alarms; settled ones leave the flapping set"""
+        settled = []
+        summaries = []
+        for alarm_id, state in list(self.flapping.items()):
+            self._decay(state, now)
+            if state.score < self.stop_score:
+                del self.flapping[alarm_id]
+                state.flapping = False
+                self.settled += 1
+                settled.append((alarm_id, state))
+            elif now - state.reported >= self.summary_interval:
+                summaries.append((alarm_id, state))
+        if now - self._pruned_at >= self.summary_interval:
+            self._pruned_at = now
+            for alarm_id, state in list(self.states.items()):
+                if not state.flapping:
+                    self._decay(state, now)
+                    if state.score < _NEGLIGIBLE_SCORE:
+                        del self.states[alarm_id]
+        return settled, summaries
+
+    def summary(self, alarm_id: str, state: FlapState, now: float, event_type: str) -> Dict[str, Any]:
+        """Event payload; resets the suppressed count reported so far"""
+        event = {
+            'event_type': event_type,
+            'alarm_id': alarm_id,
+            'device_id': state.device_id,
+            'flap_score': round(state.score, 2),
+            'flapping_since': state.since,
+            'suppressed_transitions': state.suppressed,
+            'desired_status': 'raised' if state.desired else 'cleared'
+        }
+        state.suppressed = 0
+        state.reported = now
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tracked': len(self.states),
+            'flapping': len(self.flapping),
+            'started': self.started,
+            'settled': self.settled,
+            'suppressed': self.suppressed
+        }
+
+
+class StormLimiter:
+    """Token bucket on alarm raises across every series, deferring the excess"""
+
+    def __init__(self, rate: float, burst: int, summary_interval: float):
+        self.rate = rate
+        self.burst = burst
+        self.summary_interval = summary_interval
+        self.tokens = float(burst)
+        self.updated: Optional[float] = None
+        # alarm_id -> raise payload, oldest first
+        self.deferred: Dict[str, Dict[str, Any]] = {}
+        self.storm_since: Optional[float] = None
+        self.reported = 0.0
+        self.deferred_total = 0
+        self.storms = 0
+
+    def _refill(self, now: float):
+        if self.updated is not None and now > self.updated:
+            self.tokens = min(float(self.burst), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def cancel(self, alarm_id: str) -> bool:
+        """Drop a deferred raise whose condition cleared before it was written"""
+        return self.deferred.pop(alarm_id, None) is not None
+
+    def limit(self, batch: TransitionBatch, now: float) -> List[str]:
+        """Admit deferred raises first, then the batch's own, while tokens last; returns newly deferred ids"""
+        self._refill(now)
+        own = list(batch.raises)
+        for alarm_id in list(self.deferred):
+            if self.tokens < 1:
+                break
+            payload = self.deferred.pop(alarm_id)
+            if alarm_id not in batch.raises and alarm_id not in batch.clears:
+                batch.restore_raise(payload)
+                self.tokens -= 1
+
+        newly_deferred = []
+        for alarm_id in own:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                continue
+            self.deferred[alarm_id] = batch.raises.pop(alarm_id)
+            newly_deferred.append(alarm_id)
+        self.deferred_total += len(newly_deferred)
+
+        if self.deferred and self.storm_since is None:
+            self.storm_since = now
+            self.reported = 0.0
+            self.storms += 1
+        elif not self.deferred:
+            self.storm_since = None
+        return newly_deferred
+
+    def summary_due(self, now: float) -> bool:
+        return self.storm_since is not None and now - self.reported >= self.summary_interval
+
+    def summary(self, now: float) -> Dict[str, Any]:
+        self.reported = now
+        return {
+            'event_type': 'alarm_storm',
+            'storm_since': self.storm_since,
+            'deferred_raises': len(self.deferred),
+            'raise_rate_limit': self.rate
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tokens': round(self.tokens, 1),
+            'deferred': len(self.deferred),
+            'deferred_total': self.deferred_total,
+            'storms': self.storms,
+            'in_storm': self.storm_since is not None
+        }
@@ -0,0 +1,266 @@
+"""
+Closed-alarm archiving for the Alarm Manager Service
+The hot alarms table keeps active and recently closed alarms only. Alarms
+closed more than ALARM_HOT_RETENTION_HOURS ago are moved to alarm_history in
+chunks of ALARM_ARCHIVE_CHUNK_SIZE rows, one short transaction each with a
+pause in between, so an incident's worth of closed alarms never turns into one
+long lock and one huge WAL burst. alarm_history is partitioned by day of
+closed_at; retention drops whole partitions instead of deleting rows. Cutoffs
+and partition days come from the database clock, in the session time zone the
+partition bounds are read in, and a DEFAULT partition takes any row whose day
+partition could not be created, so archiving never fails on it. The same
+goes for the alarm_events log (by day of ts, which the database sets), whose
+partitions are created a few days ahead of the database's current_date, behind
+a DEFAULT partition as well, and kept as long as an active alarm's raise event
+is in them.
+"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Set
+
+import redis.asyncio as aioredis
+from sqlalchemy import Date, bindparam, cast, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.database import AsyncSessionLocal
+from shared.models import Alarm, AlarmStatus
+from shared.logger import get_logger
+from shared.config import settings
+from services.alarm_manager.active_alarms import ACTIVE_STATUSES
+from services.alarm_manager.alarm_stats import AlarmCounters, CounterChanges
+
+logger = get_logger("alarm_manager")
+
+HISTORY_TABLE = 'alarm_history'
+EVENTS_TABLE = 'alarm_events'
+
+# Columns shared by alarms and alarm_history
+HISTORY_COLUMNS = ', '.join((
+    'id', 'device_id', 'alarm_id', 'title', 'description', 'severity', 'status', 'source', 'raised_at',
+    'acknowledged_at', 'acknowledged_by', 'cleared_at', 'closed_at', 'root_cause_alarm_id'
+))
+
+_STATUS = Alarm.__table__.c.status.type
+_SEVERITY = Alarm.__table__.c.severity.type
+
+# One chunk: lock the oldest movable rows, delete them and insert those still
+# within retention into alarm_history, all in one statement
+MOVE_CHUNK_SQL = text(f"""
+    WITH candidates AS (
+        SELECT id FROM alarms
+        WHERE status = :closed AND closed_at < :hot_before
+        ORDER BY closed_at
+        LIMIT :chunk_size
+        FOR UPDATE SKIP LOCKED
+    ), moved AS (
+        DELETE FROM alarms WHERE id IN (SELECT id FROM candidates)
+        RETURNING {HISTORY_COLUMNS}
+    ), archived AS (
+        INSERT INTO alarm_history ({HISTORY_COLUMNS})
+        SELECT {HISTORY_COLUMNS} FROM moved WHERE closed_at >= :expire_before
+        RETURNING 1
+    )
+    SELECT severity, count(*) AS moved, (SELECT count(*) FROM archived) AS archived
+    FROM moved
+    GROUP BY severity
+""").bindparams(bindparam('closed', type_=_STATUS)).columns(severity=_SEVERITY)
+
+# Archive cutoffs from the database clock; expire_before is the start of expire_day
+CUTOFFS_SQL = text("""
+    SELECT now() - make_interval(hours => :hot_hours) AS hot_before,
+           CAST(now() - make_interval(days => :retention_days) AS date) AS expire_day,
+           CAST(CAST(now() - make_interval(days => :retention_days) AS date) AS timestamptz) AS expire_before
+""")
+
+MOVABLE_DAYS_SQL = text("""
+    SELECT CAST(min(closed_at) AS date) AS first_day, CAST(max(closed_at) AS date) AS last_day
+    FROM alarms WHERE status = :closed AND closed_at < :hot_before
+""").bindparams(bindparam('closed', type_=_STATUS))
+
+PARTITIONS_SQL = text("""
+    SELECT c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = CAST(:table AS regclass)
+""")
+
+
+# Column each partitioned table is ranged on
+PARTITION_COLUMNS = {HISTORY_TABLE: 'closed_at', EVENTS_TABLE: 'ts'}
+
+
+def partition_name(table: str, day: date) -> str:
+    return f"{table}_{day:%Y%m%d}"
+
+
+def default_partition(table: str) -> str:
+    return f"{table}_default"
+
+
+def partition_day(table: str, name: str) -> Optional[date]:
+    try:
+        return datetime.strptime(name[len(table) + 1:], '%Y%m%d').date()
+    except ValueError:
+        return None
+
+
+class AlarmArchiver:
+    """Moves closed alarms to alarm_history and manages the history and event log partitions"""
+
+    def __init__(self, counters: AlarmCounters):
+        self.counters = counters
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.partitions: Dict[str, Dict[date, str]] = {HISTORY_TABLE: {}, EVENTS_TABLE: {}}
+        self.defaults: Set[str] = set()
+        self._lock = asyncio.Lock()
+
+    async def prepare(self, db: AsyncSession) -> int:
+        """Make sure the event log can take today's and the next few days' events"""
+        await self._load_partitions(db, EVENTS_TABLE)
+        await self._ensure_default(db, EVENTS_TABLE)
+        # The day ts = now() falls on in the session time zone, which the partition bounds are read in
+        today = await db.scalar(text("SELECT current_date"))
+        return await self._ensure_partitions(
+            db, EVENTS_TABLE, today, today + timedelta(days=settings.alarm_event_partitions_ahead)
+        )
+
+    async def run(self, redis_client: Optional[aioredis.Redis] = None) -> Dict[str, Any]:
+        """Archive every movable closed alarm, then apply history retention; returns a report"""
+        async with self._lock:
+            started = time.time()
+
+            async with AsyncSessionLocal() as db:
+                cutoffs = (await db.execute(CUTOFFS_SQL, {
+                    'hot_hours': settings.alarm_hot_retention_hours,
+                    'retention_days': settings.alarm_retention_days
+                })).one()
+                hot_before, expire_before = cutoffs.hot_before, cutoffs.expire_before
+                created = await self.prepare(db)
+                await self._load_partitions(db, HISTORY_TABLE)
+                await self._ensure_default(db, HISTORY_TABLE)
+                days = (await db.execute(
+                    MOVABLE_DAYS_SQL, {'closed': AlarmStatus.CLOSED, 'hot_before': hot_before}
+                )).one()
+                if days.last_day is not None and days.last_day >= cutoffs.expire_day:
+                    created += await self._ensure_partitions(
+                        db, HISTORY_TABLE, max(days.first_day, cutoffs.expire_day), days.last_day
+                    )
+
+            moved = archived = chunks = 0
+            while True:
+                chunk_moved, chunk_archived = await self._move_chunk(redis_client, hot_before, expire_before)
+                moved += chunk_moved
+                archived += chunk_archived
+                chunks += 1
+                if chunk_moved < settings.alarm_archive_chunk_size:
+                    break
+                await asyncio.sleep(settings.alarm_archive_pause_seconds)
+
+            async with AsyncSessionLocal() as db:
+                dropped = await self._drop_expired(db, HISTORY_TABLE, cutoffs.expire_day)
+                # Event log replay needs the raise event of every active alarm
+                oldest_active = await db.scalar(
+                    select(cast(func.min(Alarm.raised_at), Date)).where(Alarm.status.in_(ACTIVE_STATUSES))
+                )
+                keep_events = cutoffs.expire_day
+                if oldest_active is not None:
+                    keep_events = min(keep_events, oldest_active)
+                dropped += await self._drop_expired(db, EVENTS_TABLE, keep_events)
+
+            self.last_report = {
+                'started_at': started,
+                'duration_seconds': round(time.time() - started, 3),
+                'chunks': chunks,
+                'alarms_moved': moved,
+                'alarms_archived': archived,
+                'alarms_expired': moved - archived,
+                'partitions_created': created,
+                'partitions_dropped': dropped,
+                'partitions': sum(len(days) for days in self.partitions.values())
+            }
+            if moved or created or dropped:
+                logger.info("Closed alarms archived", **{k: v for k, v in self.last_report.items() if k != 'started_at'})
+            return self.last_report
+
+    async def _move_chunk(self, redis_client: Optional[aioredis.Redis],
+                          hot_before: datetime, expire_before: datetime):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(MOVE_CHUNK_SQL, {
+                'closed': AlarmStatus.CLOSED,
+                'hot_before': hot_before,
+                'expire_before': expire_before,
+                'chunk_size': settings.alarm_archive_chunk_size
+            })
+            rows = result.all()
+            await db.commit()
+
+        changes = CounterChanges()
+        for row in rows:
+            changes.move((AlarmStatus.CLOSED, row.severity), None, row.moved)
+        await self.counters.apply(redis_client, changes)
+        return sum(row.moved for row in rows), rows[0].archived if rows else 0
+
+    async def _load_partitions(self, db: AsyncSession, table: str):
+        result = await db.execute(PARTITIONS_SQL, {'table': table})
+        partitions = self.partitions[table] = {}
+        for (name,) in result.all():
+            day = partition_day(table, name)
+            if day is not None:
+                partitions[day] = name
+
+    async def _ensure_default(self, db: AsyncSession, table: str):
+        if table in self.defaults:
+            return
+        await db.execute(text(f"CREATE TABLE IF NOT EXISTS {default_partition(table)} PARTITION OF {table} DEFAULT"))
+        await db.commit()
+        self.defaults.add(table)
+
+    async def _ensure_partitions(self, db: AsyncSession, table: str, first: date, last: date) -> int:
+        """Create the daily partitions first..last of table that do not exist yet"""
+        partitions = self.partitions[table]
+        created = 0
+        day = first
+        while day <= last:
+            if day not in partitions:
+                name = partition_name(table, day)
+                try:
+                    async with db.begin_nested():
+                        await db.execute(text(
+                            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+                            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                        ))
+                    partitions[day] = name
+                    created += 1
+                except Exception as e:
+                    # E.g. rows of that day already sit in the default partition; they stay there
+                    logger.warning("Failed to create partition", partition=name, error=str(e))
+            day += timedelta(days=1)
+        await db.commit()
+        return created
+
+    async def _drop_expired(self, db: AsyncSession, table: str, expire_before: date) -> int:
+        """Drop every partition of table whose whole day is before expire_before"""
+        partitions = self.partitions[table]
+        expired: List[date] = sorted(day for day in partitions if day < expire_before)
+        for day in expired:
+            await db.execute(text(f"DROP TABLE IF EXISTS {partitions.pop(day)}"))
+        if table in self.defaults:
+            # Rows that landed in the default partition expire row by row
+            await db.execute(
+                text(f"DELETE FROM {default_partition(table)} WHERE {PARTITION_COLUMNS[table]} < CAST(:before AS date)"),
+                {'before': expire_before}
+            )
+        await db.commit()
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {}
+        for table, partitions in self.partitions.items():
+            report[table] = {
+                'partitions': len(partitions),
+                'oldest_partition': min(partitions).isoformat() if partitions else None,
+                'newest_partition': max(partitions).isoformat() if partitions else None
+            }
+        report['last_report'] = self.last_report
+        return report
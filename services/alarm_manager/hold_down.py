@@ -0,0 +1,113 @@
+"""
+Hold-down and clear-delay timers for metric alarm rules
+A rule's condition must hold for duration_seconds before the alarm is raised,
+and must stay false for ALARM_CLEAR_DELAY_SECONDS before it is auto-cleared.
+Per (device, rule) state is two dicts of small lists; deadlines sit in one
+heap with lazy invalidation, drained by a single ticker task, so the cost is
+independent of how many series are pending.
+"""
+import heapq
+from typing import Dict, List, Optional, Tuple
+
+# (device_id, rule_id)
+SeriesKey = Tuple[int, int]
+
+RAISE = 'raise'
+CLEAR = 'clear'
+
+
+class HoldDownTimers:
+    """Pending-raise and pending-clear state per (device, rule)"""
+
+    def __init__(self, clear_delay: float, stale_after: float):
+        self.clear_delay = clear_delay
+        self.stale_after = stale_after
+        # key -> [condition true since, last sample time, last value]
+        self.pending: Dict[SeriesKey, list] = {}
+        # key -> [condition false since, last sample time, last value]
+        self.clearing: Dict[SeriesKey, list] = {}
+        # (deadline, action, key, since); an entry is live while its state still has that `since`
+        self._heap: List[Tuple[float, str, SeriesKey, float]] = []
+        self.raised = 0
+        self.cleared = 0
+        self.suppressed_blips = 0
+
+    def observe(self, key: SeriesKey, breached: bool, active: bool, duration: float,
+                value: float, now: float) -> Optional[str]:
+        """Feed one evaluated sample; returns RAISE or CLEAR when the timer has run out"""
+        if breached:
+            if self.clearing.pop(key, None) is not None:
+                self.suppressed_blips += 1
+            if active:
+                self.pending.pop(key, None)
+                return None
+            state = self.pending.get(key)
+            if state is None:
+                state = self.pending[key] = [now, now, value]
+                if duration > 0:
+                    heapq.heappush(self._heap, (now + duration, RAISE, key, now))
+            else:
+                state[1] = now
+                state[2] = value
+            if now - state[0] >= duration:
+                del self.pending[key]
+                self.raised += 1
+                return RAISE
+            return None
+
+        if self.pending.pop(key, None) is not None:
+            self.suppressed_blips += 1
+        if not active:
+            self.clearing.pop(key, None)
+            return None
+        state = self.clearing.get(key)
+        if state is None:
+            state = self.clearing[key] = [now, now, value]
+            if self.clear_delay > 0:
+                heapq.heappush(self._heap, (now + self.clear_delay, CLEAR, key, now))
+        else:
+            state[1] = now
+            state[2] = value
+        if now - state[0] >= self.clear_delay:
+            del self.clearing[key]
+            self.cleared += 1
+            return CLEAR
+        return None
+
+    def due(self, now: float) -> List[Tuple[str, SeriesKey, float]]:
+        """Timers that ran out between samples: [(action, key, last value)]"""
+        fired = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            _, action, key, since = heapq.heappop(heap)
+            states = self.pending if action == RAISE else self.clearing
+            state = states.get(key)
+            if state is None or state[0] != since:
+                continue  # superseded
+            if now - state[1] > self.stale_after:
+                # No recent samples: the condition is unknown, so do not act on it
+                del states[key]
+                continue
+            del states[key]
+            if action == RAISE:
+                self.raised += 1
+            else:
+                self.cleared += 1
+            fired.append((action, key, state[2]))
+        return fired
+
+    def forget_rule(self, rule_id: int):
+        """Drop timers of a deleted rule"""
+        for states in (self.pending, self.clearing):
+            for key in [key for key in states if key[1] == rule_id]:
+                del states[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending_raise': len(self.pending),
+            'pending_clear': len(self.clearing),
+            'timers': len(self._heap),
+            'raised': self.raised,
+            'cleared': self.cleared,
+            'suppressed_blips': self.suppressed_blips
+        }
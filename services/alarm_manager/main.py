@@ -6,22 +6,40 @@ Processes SNMP traps and metric-based alarms
 import asyncio
 import json
 import hashlib
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple
+from datetime import datetime
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, WebSocket
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import or_, desc, select
 import redis.asyncio as aioredis
 
-from shared.database import get_db, get_redis
-from shared.models import Alarm, AlarmRule, Device, Metric, AlarmStatus, AlarmSeverity
+from shared.database import AsyncSessionLocal, get_async_db, get_redis, render_pool_metrics
+from shared.models import Alarm, AlarmRule, Device, DeviceDependency, Metric, AlarmStatus, AlarmSeverity
 from shared.schemas import (
-    AlarmCreate, AlarmUpdate, Alarm as AlarmSchema,
+    AlarmCreate, AlarmUpdate, Alarm as AlarmSchema, AlarmEvent as AlarmEventSchema,
     AlarmRuleCreate, AlarmRule as AlarmRuleSchema,
+    DeviceDependencyCreate, DeviceDependency as DeviceDependencySchema,
     HealthCheck
 )
 from shared.logger import configure_logging, get_logger
 from shared.config import settings
+from services.alarm_manager.rule_index import RULE_CHANNEL, AlarmRuleIndex, IndexedRule
+from services.alarm_manager.active_alarms import ActiveAlarmTable
+from services.alarm_manager.alarm_stats import AlarmCounters, AlarmState, CounterChanges
+from services.alarm_manager.fanout import WS_CHANNEL, AlarmFanout, Subscription
+from services.alarm_manager.replay import ReplayBuffer
+from services.alarm_manager.event_log import append_events, load_events, replay
+from services.alarm_manager.evaluator import OPERATOR_FUNCS, BatchRuleEvaluator
+from services.alarm_manager.flapping import FlapDetector, StormLimiter
+from services.alarm_manager.history import AlarmArchiver
+from services.alarm_manager.hold_down import CLEAR, RAISE, HoldDownTimers
+from services.alarm_manager.topology import TOPOLOGY_CHANNEL, TopologyIndex
+from services.alarm_manager.transitions import (
+    TransitionBatch, load_active, load_reopenable, write_root_causes, write_transitions
+)
 
 # Configure logging
 configure_logging()
@@ -33,16 +51,33 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# WebSocket connections for real-time alarm updates
-active_connections: List[WebSocket] = []
-
-
 class AlarmManagerService:
     """Alarm management and lifecycle orchestration"""
     
     def __init__(self):
         self.redis_client: Optional[aioredis.Redis] = None
-        self.alarm_rules_cache: Dict[int, AlarmRule] = {}
+        self.rule_index = AlarmRuleIndex()
+        self.active_alarms = ActiveAlarmTable()
+        self.counters = AlarmCounters()
+        self.archiver = AlarmArchiver(self.counters)
+        self.topology = TopologyIndex(self.active_alarms)
+        self.fanout = AlarmFanout(settings.alarm_ws_queue_size, settings.alarm_ws_send_timeout)
+        self.replay = ReplayBuffer(settings.alarm_ws_replay_size)
+        self.hold_down = HoldDownTimers(settings.alarm_clear_delay_seconds, settings.alarm_pending_stale_seconds)
+        self.flapping = FlapDetector(
+            settings.alarm_flap_half_life_seconds,
+            settings.alarm_flap_start_score,
+            settings.alarm_flap_stop_score,
+            settings.alarm_flap_summary_interval
+        )
+        self.storm = StormLimiter(
+            settings.alarm_storm_raise_rate,
+            settings.alarm_storm_burst,
+            settings.alarm_flap_summary_interval
+        )
+        self.evaluator = BatchRuleEvaluator(
+            self.rule_index, self.active_alarms, self._generate_alarm_id, self._alarm_active
+        )
         
     async def initialize(self):
         """Initialize service connections"""
@@ -51,74 +86,256 @@ class AlarmManagerService:
                 f"redis://{settings.redis_host}:{settings.redis_port}",
                 decode_responses=True
             )
+            async with AsyncSessionLocal() as db:
+                await self.rule_index.load(db)
+                await self.topology.load(db)
+                await self.active_alarms.load(db)
+                await self.load_device_locations(db)
+                await self.counters.reconcile(db, self.redis_client)
+                await self.archiver.prepare(db)
             logger.info("Alarm Manager Service initialized")
         except Exception as e:
             logger.error("Failed to initialize Alarm Manager Service", error=str(e))
             raise
     
-    async def process_metric_alarm(self, metric: Dict[str, Any], db: Session) -> Optional[Alarm]:
-        """Process metric and check against alarm rules"""
+    async def process_metric_batch(self, metrics: List[Dict[str, Any]]) -> List[Alarm]:
+        """Evaluate a micro-batch of samples (plus expired timers) and write all transitions at once"""
+        batch = TransitionBatch()
+        now = time.time()
+        
+        # Vectorized evaluation; only pairs whose condition changed or disagrees with the alarm state come back
+        evaluator = self.evaluator
+        for slot, value, breached in evaluator.evaluate(self._samples(metrics)):
+            device_id, rule = evaluator.slot_rule[slot]
+            alarm_id = evaluator.slot_alarm_id[slot]
+            action = self.hold_down.observe(
+                (device_id, rule.id),
+                breached,
+                batch.is_active(alarm_id, self._alarm_active(alarm_id)),
+                rule.duration_seconds,
+                value,
+                now
+            )
+            if action == RAISE:
+                self._queue_raise(batch, device_id, rule, value)
+            elif action == CLEAR:
+                batch.clear_alarm(alarm_id)
+        
+        # Hold-down / clear-delay timers that ran out between samples
+        for action, (device_id, rule_id), value in self.hold_down.due(now):
+            if action == RAISE:
+                rule = self.rule_index.rules.get(rule_id)
+                if rule is not None:
+                    self._queue_raise(batch, device_id, rule, value)
+            else:
+                batch.clear_alarm(self._generate_alarm_id(device_id, rule_id))
+        
+        events = self._damp_transitions(batch, now)
+        raised = await self._commit_transitions(batch) if batch else []
+        for event in events:
+            await self._publish_event(event)
+            await self._broadcast(event)
+        return raised
+    
+    def _alarm_active(self, alarm_id: str) -> bool:
+        """Alarm state as evaluation should see it: a flapping alarm's last wish, or a deferred raise"""
+        desired = self.flapping.desired(alarm_id)
+        if desired is not None:
+            return desired
+        if alarm_id in self.storm.deferred:
+            return True
+        return self.active_alarms.is_active(alarm_id)
+    
+    def _damp_transitions(self, batch: TransitionBatch, now: float) -> List[Dict[str, Any]]:
+        """Apply flap suppression and the storm limiter to a metric batch; returns summary events"""
+        events = []
+        touched = []
+        
+        for alarm_id, payload in list(batch.raises.items()):
+            if not self.flapping.record(alarm_id, True, payload, payload['device_id'], now):
+                del batch.raises[alarm_id]
+                touched.append(alarm_id)
+        for alarm_id in list(batch.clears):
+            if self.storm.cancel(alarm_id):
+                batch.clears.discard(alarm_id)
+                touched.append(alarm_id)
+                continue
+            entry = self.active_alarms.get(alarm_id)
+            if not self.flapping.record(alarm_id, False, None, entry.device_id if entry else None, now):
+                batch.clears.discard(alarm_id)
+                touched.append(alarm_id)
+        
+        # Settled alarms get the state they last asked for, in one write
+        settled, summaries = self.flapping.due(now)
+        for alarm_id, state in settled:
+            events.append(self.flapping.summary(alarm_id, state, now, 'flapping_settled'))
+            active = self.active_alarms.is_active(alarm_id)
+            if state.desired and not active and state.payload is not None:
+                batch.restore_raise(state.payload)
+            elif not state.desired and active:
+                batch.clear_alarm(alarm_id)
+            touched.append(alarm_id)
+        for alarm_id, state in summaries:
+            event_type = 'flapping' if state.reported else 'flapping_started'
+            events.append(self.flapping.summary(alarm_id, state, now, event_type))
+        
+        touched.extend(self.storm.limit(batch, now))
+        if self.storm.summary_due(now):
+            events.append(self.storm.summary(now))
+        
+        for alarm_id in touched:
+            self.evaluator.refresh(alarm_id)
+        return events
+    
+    def _samples(self, metrics: List[Dict[str, Any]]):
+        """(device_id, metric_name, value) for each well-formed sample"""
+        for metric in metrics:
+            try:
+                yield int(metric['device_id']), metric['metric_name'], float(metric['metric_value'])
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error("Failed to process metric alarm", error=str(e), metric=metric)
+    
+    def _queue_raise(self, batch: TransitionBatch, device_id: int, rule: IndexedRule, value: float):
+        alarm_id = self._generate_alarm_id(device_id, rule.id)
+        if batch.is_active(alarm_id, self._alarm_active(alarm_id)):
+            return
+        batch.raise_alarm(
+            alarm_id=alarm_id,
+            device_id=device_id,
+            title=f"{rule.name} - {rule.metric_name}",
+            description=f"{rule.description or ''} Current value: {value}",
+            severity=rule.severity,
+            source="polling"
+        )
+    
+    async def _commit_transitions(self, batch: TransitionBatch,
+                                  db: Optional[AsyncSession] = None) -> List[Alarm]:
+        """Write a transition batch in one transaction, then update state and notify"""
+        if settings.alarm_topology_suppression:
+            self._mark_symptoms(batch)
+        down_before = set(self.topology.down)
         try:
-            # Get all enabled alarm rules for this metric
-            rules = db.query(AlarmRule).filter(
-                and_(
-                    AlarmRule.metric_name == metric['metric_name'],
-                    AlarmRule.enabled == True
-                )
-            ).all()
-            
-            for rule in rules:
-                # Evaluate alarm condition
-                if self._evaluate_condition(
-                    metric['metric_value'],
-                    rule.threshold_value,
-                    rule.comparison_operator
-                ):
-                    # Check if alarm already exists
-                    alarm_id = self._generate_alarm_id(metric['device_id'], rule.id)
-                    existing_alarm = db.query(Alarm).filter(
-                        and_(
-                            Alarm.alarm_id == alarm_id,
-                            Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
-                        )
-                    ).first()
-                    
-                    if not existing_alarm:
-                        # Create new alarm
-                        alarm = await self._create_alarm(
-                            device_id=metric['device_id'],
-                            alarm_id=alarm_id,
-                            title=f"{rule.name} - {metric.get('metric_name', 'Unknown')}",
-                            description=f"{rule.description or ''} Current value: {metric['metric_value']}",
-                            severity=rule.severity,
-                            source="polling",
-                            db=db
-                        )
-                        logger.info(
-                            "Alarm raised",
-                            alarm_id=alarm_id,
-                            device_id=metric['device_id'],
-                            rule=rule.name
-                        )
-                        return alarm
-                else:
-                    # Check if alarm should be auto-cleared
-                    alarm_id = self._generate_alarm_id(metric['device_id'], rule.id)
-                    await self._auto_clear_alarm(alarm_id, db)
-            
-            return None
-            
+            if db is None:
+                async with AsyncSessionLocal() as session:
+                    raised, cleared, untouched, reopened = await self._write_batch(session, batch)
+            else:
+                raised, cleared, untouched, reopened = await self._write_batch(db, batch)
         except Exception as e:
-            logger.error("Failed to process metric alarm", error=str(e), metric=metric)
-            return None
+            logger.error("Failed to write alarm transitions", error=str(e), transitions=len(batch))
+            return []
+        
+        # Counter cells each written row moved between; cleared rows were active in the table
+        changes = CounterChanges()
+        for alarm in raised:
+            changes.move(reopened.get(alarm.alarm_id), (alarm.status, alarm.severity))
+        for alarm in cleared:
+            entry = self.active_alarms.alarms.get(alarm.alarm_id)
+            before = (entry.status, entry.severity) if entry else (AlarmStatus.RAISED, alarm.severity)
+            changes.move(before, (alarm.status, alarm.severity))
+        await self.counters.apply(self.redis_client, changes)
+        
+        # Raises that hit an already active row (e.g. raised by another worker) just resync the table
+        for alarm in untouched:
+            self.active_alarms.track(alarm)
+        # Clears of alarms that were no longer active in the database
+        for alarm_id in batch.clears - {alarm.alarm_id for alarm in cleared}:
+            self.active_alarms.discard(alarm_id)
+        
+        # Symptoms of an upstream outage are recorded but only announced as one summary per root cause
+        symptoms: Dict[str, int] = {}
+        for alarm in raised:
+            self.active_alarms.track(alarm)
+            logger.info("Alarm raised", alarm_id=alarm.alarm_id, device_id=alarm.device_id, source=alarm.source)
+            if alarm.root_cause_alarm_id:
+                symptoms[alarm.root_cause_alarm_id] = symptoms.get(alarm.root_cause_alarm_id, 0) + 1
+                continue
+            await self._publish_alarm_event("raised", alarm)
+            await self._broadcast_alarm(alarm)
+        
+        for alarm in cleared:
+            self.active_alarms.track(alarm)
+            logger.info("Alarm auto-cleared", alarm_id=alarm.alarm_id)
+            if not alarm.root_cause_alarm_id:
+                await self._publish_alarm_event("auto_cleared", alarm)
+        
+        for root, count in symptoms.items():
+            await self._publish_symptoms("symptoms_suppressed", root, count)
+        
+        # Devices that went down or came back: re-point the alarms below them in bulk
+        changed = down_before ^ set(self.topology.down)
+        if changed and settings.alarm_topology_suppression:
+            await self._relink_symptoms(set().union(*(self.topology.descendants(d) for d in changed)), db)
+        
+        return raised
     
-    async def process_snmp_trap(self, trap_data: Dict[str, Any], db: Session) -> Optional[Alarm]:
+    def _mark_symptoms(self, batch: TransitionBatch):
+        """Tag raises below a down device (including criticals raised in this same batch) as symptoms"""
+        if not self.topology.parents:
+            return
+        pending_down = {
+            payload['device_id']: alarm_id
+            for alarm_id, payload in batch.raises.items()
+            if payload['severity'] == AlarmSeverity.CRITICAL
+        }
+        for payload in batch.raises.values():
+            payload['root_cause_alarm_id'] = self.topology.root_cause(payload['device_id'], pending_down)
+    
+    async def _relink_symptoms(self, devices: Set[int], db: Optional[AsyncSession] = None):
+        """Recompute the root cause of the active alarms of devices; changed ones are updated in bulk"""
+        relinks: Dict[str, Optional[str]] = {}
+        for device_id in devices:
+            root = self.topology.root_cause(device_id)
+            for alarm_id in self.active_alarms.by_device.get(device_id, ()):
+                entry = self.active_alarms.alarms[alarm_id]
+                if entry.root_cause_alarm_id != root:
+                    relinks[alarm_id] = root
+        if not relinks:
+            return
+        try:
+            if db is None:
+                async with AsyncSessionLocal() as session:
+                    await write_root_causes(session, relinks)
+            else:
+                await write_root_causes(db, relinks)
+        except Exception as e:
+            logger.error("Failed to update symptom alarms", error=str(e), alarms=len(relinks))
+            return
+        
+        counts: Dict[Tuple[str, Optional[str]], int] = {}
+        for alarm_id, root in relinks.items():
+            entry = self.active_alarms.alarms.get(alarm_id)
+            if entry is not None:
+                key = ('symptoms_released', entry.root_cause_alarm_id) if root is None else ('symptoms_suppressed', root)
+                counts[key] = counts.get(key, 0) + 1
+                entry.root_cause_alarm_id = root
+        for (event_type, root), count in counts.items():
+            await self._publish_symptoms(event_type, root, count)
+        logger.info("Symptom alarms relinked", alarms=len(relinks), devices=len(devices))
+    
+    async def _publish_symptoms(self, event_type: str, root_cause_alarm_id: Optional[str], count: int):
+        event = {'event_type': event_type, 'root_cause_alarm_id': root_cause_alarm_id, 'alarm_count': count}
+        await self._publish_event(event)
+        await self._broadcast(event)
+    
+    async def _write_batch(self, db: AsyncSession, batch: TransitionBatch):
+        reopened = await load_reopenable(db, set(batch.raises) - set(self.active_alarms.alarms))
+        raised, cleared = await write_transitions(db, batch)
+        untouched = await load_active(db, set(batch.raises) - {alarm.alarm_id for alarm in raised})
+        return raised, cleared, untouched, reopened
+    
+    async def _count_transition(self, before: AlarmState, alarm: Alarm):
+        changes = CounterChanges()
+        changes.move(before, (alarm.status, alarm.severity))
+        await self.counters.apply(self.redis_client, changes)
+    
+    async def process_snmp_trap(self, trap_data: Dict[str, Any], db: AsyncSession) -> Optional[Alarm]:
         """Process SNMP trap and create alarm if needed"""
         try:
             device_ip = trap_data.get('source_ip')
             
             # Find device by IP
-            device = db.query(Device).filter(Device.ip_address == device_ip).first()
+            result = await db.execute(select(Device).where(Device.ip_address == device_ip))
+            device = result.scalars().first()
             if not device:
                 logger.warning("Trap received from unknown device", ip=device_ip)
                 return None
@@ -127,14 +344,7 @@ class AlarmManagerService:
             alarm_id = self._generate_trap_alarm_id(device.id, trap_data)
             
             # Check if alarm already exists
-            existing_alarm = db.query(Alarm).filter(
-                and_(
-                    Alarm.alarm_id == alarm_id,
-                    Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
-                )
-            ).first()
-            
-            if not existing_alarm:
+            if not self.active_alarms.is_active(alarm_id):
                 severity = self._determine_trap_severity(trap_data)
                 alarm = await self._create_alarm(
                     device_id=device.id,
@@ -145,7 +355,8 @@ class AlarmManagerService:
                     source="snmp_trap",
                     db=db
                 )
-                logger.info("Alarm created from SNMP trap", alarm_id=alarm_id, device_id=device.id)
+                if alarm:
+                    logger.info("Alarm created from SNMP trap", alarm_id=alarm_id, device_id=device.id)
                 return alarm
             
             return None
@@ -154,10 +365,10 @@ class AlarmManagerService:
             logger.error("Failed to process SNMP trap", error=str(e), trap=trap_data)
             return None
     
-    async def acknowledge_alarm(self, alarm_id: str, acknowledged_by: str, db: Session) -> Optional[Alarm]:
+    async def acknowledge_alarm(self, alarm_id: str, acknowledged_by: str, db: AsyncSession) -> Optional[Alarm]:
         """Acknowledge an alarm"""
         try:
-            alarm = db.query(Alarm).filter(Alarm.alarm_id == alarm_id).first()
+            alarm = await self._get_alarm(alarm_id, db)
             if not alarm:
                 raise HTTPException(status_code=404, detail="Alarm not found")
             
@@ -167,12 +378,16 @@ class AlarmManagerService:
                     detail=f"Alarm cannot be acknowledged. Current status: {alarm.status}"
                 )
             
+            before = (alarm.status, alarm.severity)
             alarm.status = AlarmStatus.ACKNOWLEDGED
             alarm.acknowledged_at = datetime.utcnow()
             alarm.acknowledged_by = acknowledged_by
             
-            db.commit()
-            db.refresh(alarm)
+            await db.flush()
+            await append_events(db, "acknowledged", [alarm], acknowledged_by)
+            await db.commit()
+            self.active_alarms.track(alarm)
+            await self._count_transition(before, alarm)
             
             # Publish event to Redis
             await self._publish_alarm_event("acknowledged", alarm)
@@ -189,13 +404,13 @@ class AlarmManagerService:
             raise
         except Exception as e:
             logger.error("Failed to acknowledge alarm", error=str(e), alarm_id=alarm_id)
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=500, detail="Failed to acknowledge alarm")
     
-    async def clear_alarm(self, alarm_id: str, db: Session) -> Optional[Alarm]:
+    async def clear_alarm(self, alarm_id: str, db: AsyncSession) -> Optional[Alarm]:
         """Clear an alarm"""
         try:
-            alarm = db.query(Alarm).filter(Alarm.alarm_id == alarm_id).first()
+            alarm = await self._get_alarm(alarm_id, db)
             if not alarm:
                 raise HTTPException(status_code=404, detail="Alarm not found")
             
@@ -205,11 +420,15 @@ class AlarmManagerService:
                     detail=f"Alarm already cleared/closed. Current status: {alarm.status}"
                 )
             
+            before = (alarm.status, alarm.severity)
             alarm.status = AlarmStatus.CLEARED
             alarm.cleared_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(alarm)
+            await db.flush()
+            await append_events(db, "cleared", [alarm])
+            await db.commit()
+            self.active_alarms.track(alarm)
+            await self._count_transition(before, alarm)
             
             # Publish event to Redis
             await self._publish_alarm_event("cleared", alarm)
@@ -222,13 +441,13 @@ class AlarmManagerService:
             raise
         except Exception as e:
             logger.error("Failed to clear alarm", error=str(e), alarm_id=alarm_id)
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=500, detail="Failed to clear alarm")
     
-    async def close_alarm(self, alarm_id: str, db: Session) -> Optional[Alarm]:
+    async def close_alarm(self, alarm_id: str, db: AsyncSession) -> Optional[Alarm]:
         """Close an alarm"""
         try:
-            alarm = db.query(Alarm).filter(Alarm.alarm_id == alarm_id).first()
+            alarm = await self._get_alarm(alarm_id, db)
             if not alarm:
                 raise HTTPException(status_code=404, detail="Alarm not found")
             
@@ -238,11 +457,15 @@ class AlarmManagerService:
                     detail="Only cleared alarms can be closed"
                 )
             
+            before = (alarm.status, alarm.severity)
             alarm.status = AlarmStatus.CLOSED
             alarm.closed_at = datetime.utcnow()
             
-            db.commit()
-            db.refresh(alarm)
+            await db.flush()
+            await append_events(db, "closed", [alarm])
+            await db.commit()
+            self.active_alarms.track(alarm)
+            await self._count_transition(before, alarm)
             
             # Publish event to Redis
             await self._publish_alarm_event("closed", alarm)
@@ -255,7 +478,7 @@ class AlarmManagerService:
             raise
         except Exception as e:
             logger.error("Failed to close alarm", error=str(e), alarm_id=alarm_id)
-            db.rollback()
+            await db.rollback()
             raise HTTPException(status_code=500, detail="Failed to close alarm")
     
     async def _create_alarm(
@@ -266,65 +489,22 @@ class AlarmManagerService:
         description: str,
         severity: AlarmSeverity,
         source: str,
-        db: Session
-    ) -> Alarm:
-        """Create a new alarm"""
-        alarm = Alarm(
-            device_id=device_id,
-            alarm_id=alarm_id,
-            title=title,
-            description=description,
-            severity=severity,
-            status=AlarmStatus.RAISED,
-            source=source,
-            raised_at=datetime.utcnow()
-        )
-        
-        db.add(alarm)
-        db.commit()
-        db.refresh(alarm)
-        
-        # Publish event to Redis
-        await self._publish_alarm_event("raised", alarm)
-        
-        # Send to WebSocket clients
-        await self._broadcast_alarm(alarm)
-        
-        return alarm
+        db: AsyncSession
+    ) -> Optional[Alarm]:
+        """Create a new alarm, re-opening an inactive row with the same alarm_id"""
+        batch = TransitionBatch()
+        batch.raise_alarm(alarm_id, device_id, title, description, severity, source)
+        raised = await self._commit_transitions(batch, db)
+        return raised[0] if raised else None
     
-    async def _auto_clear_alarm(self, alarm_id: str, db: Session):
-        """Automatically clear an alarm if condition is no longer met"""
-        try:
-            alarm = db.query(Alarm).filter(
-                and_(
-                    Alarm.alarm_id == alarm_id,
-                    Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
-                )
-            ).first()
-            
-            if alarm:
-                alarm.status = AlarmStatus.CLEARED
-                alarm.cleared_at = datetime.utcnow()
-                db.commit()
-                
-                await self._publish_alarm_event("auto_cleared", alarm)
-                logger.info("Alarm auto-cleared", alarm_id=alarm_id)
-                
-        except Exception as e:
-            logger.error("Failed to auto-clear alarm", error=str(e), alarm_id=alarm_id)
+    async def _get_alarm(self, alarm_id: str, db: AsyncSession) -> Optional[Alarm]:
+        """Fetch an alarm by its alarm ID"""
+        result = await db.execute(select(Alarm).where(Alarm.alarm_id == alarm_id))
+        return result.scalars().first()
     
     def _evaluate_condition(self, value: float, threshold: float, operator: str) -> bool:
         """Evaluate alarm condition"""
-        operators = {
-            '>': lambda x, y: x > y,
-            '<': lambda x, y: x < y,
-            '>=': lambda x, y: x >= y,
-            '<=': lambda x, y: x <= y,
-            '==': lambda x, y: x == y,
-            '!=': lambda x, y: x != y
-        }
-        
-        op_func = operators.get(operator)
+        op_func = OPERATOR_FUNCS.get(operator)
         if op_func:
             return op_func(value, threshold)
         return False
@@ -354,45 +534,82 @@ class AlarmManagerService:
         else:
             return AlarmSeverity.INFO
     
+    async def notify_rule_change(self, action: str, rule_id: int):
+        """Tell every alarm manager process (including this one) to patch its rule index"""
+        try:
+            if self.redis_client:
+                await self.redis_client.publish(RULE_CHANNEL, json.dumps({'action': action, 'rule_id': rule_id}))
+        except Exception as e:
+            logger.error("Failed to publish rule change", error=str(e), rule_id=rule_id)
+    
+    async def apply_rule_change(self, change: Dict[str, Any], db: AsyncSession):
+        """Patch the rule index from a notification; timers of rules that dropped out are forgotten"""
+        before = set(self.rule_index.rules)
+        await self.rule_index.apply(change, db)
+        for rule_id in before - set(self.rule_index.rules):
+            self.hold_down.forget_rule(rule_id)
+    
+    async def apply_topology_change(self, db: AsyncSession):
+        """Reload the dependency index and re-point every active alarm to its new root cause"""
+        await self.topology.load(db)
+        if settings.alarm_topology_suppression:
+            await self._relink_symptoms(set(self.active_alarms.by_device), db)
+    
+    async def notify_topology_change(self):
+        """Tell every alarm manager process (including this one) to reload the dependency index"""
+        try:
+            if self.redis_client:
+                await self.redis_client.publish(TOPOLOGY_CHANNEL, json.dumps({'action': 'reload'}))
+        except Exception as e:
+            logger.error("Failed to publish topology change", error=str(e))
+    
     async def _publish_alarm_event(self, event_type: str, alarm: Alarm):
         """Publish alarm event to Redis"""
+        await self._publish_event({
+            'event_type': event_type,
+            'alarm_id': alarm.alarm_id,
+            'device_id': alarm.device_id,
+            'severity': alarm.severity.value,
+            'status': alarm.status.value
+        })
+    
+    async def _publish_event(self, event: Dict[str, Any]):
+        """Publish an event (alarm transition or flap/storm summary) on the alarms channel"""
         try:
             if self.redis_client:
-                event = {
-                    'event_type': event_type,
-                    'alarm_id': alarm.alarm_id,
-                    'device_id': alarm.device_id,
-                    'severity': alarm.severity.value,
-                    'status': alarm.status.value,
-                    'timestamp': datetime.utcnow().isoformat()
-                }
+                event['timestamp'] = datetime.utcnow().isoformat()
                 await self.redis_client.publish('alarms', json.dumps(event))
         except Exception as e:
             logger.error("Failed to publish alarm event", error=str(e))
     
     async def _broadcast_alarm(self, alarm: Alarm):
         """Broadcast alarm to WebSocket clients"""
-        if active_connections:
-            alarm_data = {
-                'id': alarm.id,
-                'alarm_id': alarm.alarm_id,
-                'device_id': alarm.device_id,
-                'title': alarm.title,
-                'severity': alarm.severity.value,
-                'status': alarm.status.value,
-                'raised_at': alarm.raised_at.isoformat()
-            }
-            
-            disconnected = []
-            for connection in active_connections:
-                try:
-                    await connection.send_json(alarm_data)
-                except Exception:
-                    disconnected.append(connection)
-            
-            # Remove disconnected clients
-            for conn in disconnected:
-                active_connections.remove(conn)
+        await self._broadcast({
+            'id': alarm.id,
+            'alarm_id': alarm.alarm_id,
+            'device_id': alarm.device_id,
+            'title': alarm.title,
+            'severity': alarm.severity.value,
+            'status': alarm.status.value,
+            'raised_at': alarm.raised_at.isoformat()
+        })
+    
+    async def _broadcast(self, data: Dict[str, Any]):
+        """Fan a message out to the WebSocket clients of every alarm manager process"""
+        message = self.fanout.enrich(data)
+        try:
+            if self.redis_client:
+                # Sequenced, appended to the replay stream and published in one step
+                await self.replay.publish(self.redis_client, WS_CHANNEL, message)
+                return
+        except Exception as e:
+            logger.error("Failed to publish WebSocket message", error=str(e))
+        # No Redis: at least this process's clients get it
+        self.fanout.deliver(self.replay.sequence_locally(message))
+    
+    async def load_device_locations(self, db: AsyncSession):
+        result = await db.execute(select(Device.id, Device.location))
+        self.fanout.locations = {device_id: location for device_id, location in result.all()}
 
 
 # Initialize service
@@ -406,6 +623,10 @@ async def startup_event():
     # Start background tasks
     asyncio.create_task(alarm_cleanup_task())
     asyncio.create_task(metric_processor_task())
+    asyncio.create_task(rule_listener_task())
+    asyncio.create_task(alarm_timer_task())
+    asyncio.create_task(websocket_fanout_task())
+    asyncio.create_task(alarm_stats_task())
 
 
 @app.on_event("shutdown")
@@ -428,6 +649,12 @@ async def health_check():
     )
 
 
+@app.get("/db-pool/metrics")
+async def db_pool_metrics():
+    """Database connection pool metrics in Prometheus text format"""
+    return Response(content=render_pool_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/alarms", response_model=List[AlarmSchema])
 async def list_alarms(
     status: Optional[AlarmStatus] = None,
@@ -435,20 +662,23 @@ async def list_alarms(
     device_id: Optional[int] = None,
     limit: int = 100,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List alarms with optional filters"""
     try:
-        query = db.query(Alarm)
+        query = select(Alarm)
         
         if status:
-            query = query.filter(Alarm.status == status)
+            query = query.where(Alarm.status == status)
         if severity:
-            query = query.filter(Alarm.severity == severity)
+            query = query.where(Alarm.severity == severity)
         if device_id:
-            query = query.filter(Alarm.device_id == device_id)
+            query = query.where(Alarm.device_id == device_id)
         
-        alarms = query.order_by(desc(Alarm.raised_at)).limit(limit).offset(offset).all()
+        result = await db.execute(
+            query.order_by(desc(Alarm.raised_at)).limit(limit).offset(offset)
+        )
+        alarms = result.scalars().all()
         
         return alarms
         
@@ -457,156 +687,345 @@ async def list_alarms(
         raise HTTPException(status_code=500, detail="Failed to retrieve alarms")
 
 
+@app.get("/alarms/active/table")
+async def get_active_alarm_table_stats():
+    """Size and lookup counters of the in-memory active-alarm table"""
+    return alarm_service.active_alarms.stats()
+
+
+@app.get("/alarms/active/timers")
+async def get_alarm_timer_stats():
+    """Pending hold-down and clear-delay timers"""
+    return alarm_service.hold_down.stats()
+
+
+@app.get("/alarms/active/evaluator")
+async def get_rule_evaluator_stats():
+    """Slots and attention counters of the vectorized rule evaluator"""
+    return alarm_service.evaluator.stats()
+
+
+@app.get("/alarms/active/flapping")
+async def get_flap_stats():
+    """Flap detector and storm limiter state"""
+    return {
+        'flapping': alarm_service.flapping.stats(),
+        'storm': alarm_service.storm.stats()
+    }
+
+
 @app.get("/alarms/{alarm_id}", response_model=AlarmSchema)
-async def get_alarm(alarm_id: str, db: Session = Depends(get_db)):
+async def get_alarm(alarm_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get alarm by ID"""
-    alarm = db.query(Alarm).filter(Alarm.alarm_id == alarm_id).first()
+    alarm = await alarm_service._get_alarm(alarm_id, db)
     if not alarm:
         raise HTTPException(status_code=404, detail="Alarm not found")
     return alarm
 
 
+@app.get("/alarms/{alarm_id}/events", response_model=List[AlarmEventSchema])
+async def get_alarm_events(
+    alarm_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Lifecycle history of one alarm_id across every time it was raised, newest first"""
+    try:
+        return await load_events(db, alarm_id=alarm_id, start=start, end=end, limit=min(limit, 1000))
+    except Exception as e:
+        logger.error("Failed to get alarm events", error=str(e), alarm_id=alarm_id)
+        raise HTTPException(status_code=500, detail="Failed to retrieve alarm events")
+
+
 @app.post("/alarms/{alarm_id}/acknowledge", response_model=AlarmSchema)
 async def acknowledge_alarm_endpoint(
     alarm_id: str,
     acknowledged_by: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Acknowledge an alarm"""
     return await alarm_service.acknowledge_alarm(alarm_id, acknowledged_by, db)
 
 
 @app.post("/alarms/{alarm_id}/clear", response_model=AlarmSchema)
-async def clear_alarm_endpoint(alarm_id: str, db: Session = Depends(get_db)):
+async def clear_alarm_endpoint(alarm_id: str, db: AsyncSession = Depends(get_async_db)):
     """Clear an alarm"""
     return await alarm_service.clear_alarm(alarm_id, db)
 
 
 @app.post("/alarms/{alarm_id}/close", response_model=AlarmSchema)
-async def close_alarm_endpoint(alarm_id: str, db: Session = Depends(get_db)):
+async def close_alarm_endpoint(alarm_id: str, db: AsyncSession = Depends(get_async_db)):
     """Close an alarm"""
     return await alarm_service.close_alarm(alarm_id, db)
 
 
 @app.get("/alarms/stats/summary")
-async def get_alarm_stats(db: Session = Depends(get_db)):
-    """Get alarm statistics"""
+async def get_alarm_stats():
+    """Get alarm statistics from the incrementally maintained counters"""
+    summary = alarm_service.counters.summary()
+    summary['timestamp'] = datetime.utcnow().isoformat()
+    return summary
+
+
+@app.get("/alarms/stats/counters")
+async def get_alarm_counter_stats():
+    """Alarm counter updates and reconciliation"""
+    return alarm_service.counters.stats()
+
+
+@app.post("/alarms/history/archive")
+async def run_alarm_archive():
+    """Move closed alarms to alarm_history now and return the report"""
     try:
-        total_alarms = db.query(Alarm).count()
-        
-        stats_by_status = {}
-        for status in AlarmStatus:
-            count = db.query(Alarm).filter(Alarm.status == status).count()
-            stats_by_status[status.value] = count
-        
-        stats_by_severity = {}
-        for severity in AlarmSeverity:
-            count = db.query(Alarm).filter(
-                and_(
-                    Alarm.severity == severity,
-                    Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
-                )
-            ).count()
-            stats_by_severity[severity.value] = count
-        
-        return {
-            'total_alarms': total_alarms,
-            'by_status': stats_by_status,
-            'active_by_severity': stats_by_severity,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
+        return await alarm_service.archiver.run(alarm_service.redis_client)
     except Exception as e:
-        logger.error("Failed to get alarm stats", error=str(e))
-        raise HTTPException(status_code=500, detail="Failed to retrieve alarm statistics")
+        logger.error("Failed to archive alarms", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to archive alarms")
+
+
+@app.get("/alarms/history/report")
+async def get_alarm_archive_report():
+    """alarm_history partitions and the most recent archive run"""
+    return alarm_service.archiver.stats()
 
 
 @app.websocket("/ws/alarms")
 async def websocket_alarms(websocket: WebSocket):
-    """WebSocket endpoint for real-time alarm updates"""
+    """WebSocket endpoint for real-time alarm updates
+    
+    Optional filters as query parameters (comma-separated): severity, device_id, location.
+    Send {"subscribe": {"severity": "critical,major", ...}} to change them later.
+    Every message carries a seq; reconnect with ?since=<last seq seen> to receive only the
+    missed messages. If they are no longer buffered a resync_required message is sent first.
+    """
+    try:
+        subscription = Subscription.from_params(websocket.query_params)
+        since = websocket.query_params.get('since')
+        since = int(since) if since is not None else None
+    except ValueError as e:
+        await websocket.close(code=1008, reason=str(e))
+        return
+    
     await websocket.accept()
-    active_connections.append(websocket)
+    # Register before reading the backlog so nothing published meanwhile is missed; duplicates are skipped by seq
+    client = alarm_service.fanout.register(websocket, subscription)
+    replay = []
+    if since is not None:
+        try:
+            replay, complete = await alarm_service.replay.since(alarm_service.redis_client, since)
+        except Exception as e:
+            logger.error("Failed to read alarm event backlog", error=str(e))
+            replay, complete = [], False
+        if not complete:
+            replay.insert(0, {'event_type': 'resync_required', 'since': since,
+                              'last_seq': alarm_service.replay.last_seq})
+    alarm_service.fanout.start(client, replay)
     try:
         while True:
-            # Keep connection alive
-            await websocket.receive_text()
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and isinstance(message.get('subscribe'), dict):
+                try:
+                    client.subscription = Subscription.from_params(message['subscribe'])
+                except ValueError as e:
+                    client.offer({'event_type': 'error', 'detail': str(e)})
     except Exception:
         pass
     finally:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        alarm_service.fanout.unregister(client)
+
+
+@app.get("/ws/alarms/stats")
+async def get_websocket_stats():
+    """Local WebSocket clients, queue depth, drops and the replay buffer"""
+    return {
+        'fanout': alarm_service.fanout.stats(),
+        'replay': alarm_service.replay.stats()
+    }
 
 
 # Alarm Rules Management
 
+@app.get("/alarm-events", response_model=List[AlarmEventSchema])
+async def list_alarm_events(
+    device_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    event_type: Optional[str] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Alarm events in a time range (optionally for one device), newest first"""
+    try:
+        return await load_events(
+            db, device_id=device_id, start=start, end=end, event_type=event_type, limit=min(limit, 1000)
+        )
+    except Exception as e:
+        logger.error("Failed to list alarm events", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to retrieve alarm events")
+
+
+@app.post("/alarm-events/replay")
+async def replay_alarm_events(db: AsyncSession = Depends(get_async_db)):
+    """Rebuild the in-memory active-alarm table from the event log"""
+    try:
+        return await replay(db, alarm_service.active_alarms, settings.alarm_event_replay_page_size)
+    except Exception as e:
+        logger.error("Failed to replay alarm events", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to replay alarm events")
+
+
 @app.get("/alarm-rules", response_model=List[AlarmRuleSchema])
-async def list_alarm_rules(db: Session = Depends(get_db)):
+async def list_alarm_rules(db: AsyncSession = Depends(get_async_db)):
     """List all alarm rules"""
-    rules = db.query(AlarmRule).all()
+    result = await db.execute(select(AlarmRule))
+    rules = result.scalars().all()
     return rules
 
 
 @app.post("/alarm-rules", response_model=AlarmRuleSchema)
-async def create_alarm_rule(rule: AlarmRuleCreate, db: Session = Depends(get_db)):
+async def create_alarm_rule(rule: AlarmRuleCreate, db: AsyncSession = Depends(get_async_db)):
     """Create new alarm rule"""
     try:
         db_rule = AlarmRule(**rule.dict())
         db.add(db_rule)
-        db.commit()
-        db.refresh(db_rule)
+        await db.commit()
+        await db.refresh(db_rule)
+        
+        # Patch the local index now; other processes follow the notification
+        await alarm_service.rule_index.apply({'action': 'upsert', 'rule_id': db_rule.id}, db)
+        await alarm_service.notify_rule_change('upsert', db_rule.id)
         
         logger.info("Alarm rule created", rule_name=rule.name)
         return db_rule
         
     except Exception as e:
         logger.error("Failed to create alarm rule", error=str(e))
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Failed to create alarm rule")
 
 
 @app.delete("/alarm-rules/{rule_id}")
-async def delete_alarm_rule(rule_id: int, db: Session = Depends(get_db)):
+async def delete_alarm_rule(rule_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete alarm rule"""
-    rule = db.query(AlarmRule).filter(AlarmRule.id == rule_id).first()
+    rule = await db.get(AlarmRule, rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="Alarm rule not found")
     
-    db.delete(rule)
-    db.commit()
+    await db.delete(rule)
+    await db.commit()
+    
+    alarm_service.rule_index.remove(rule_id)
+    alarm_service.hold_down.forget_rule(rule_id)
+    await alarm_service.notify_rule_change('delete', rule_id)
     
     logger.info("Alarm rule deleted", rule_id=rule_id)
     return {"message": "Alarm rule deleted successfully"}
 
 
+@app.get("/alarm-rules/index")
+async def get_rule_index_stats():
+    """In-memory rule index size and patch counters"""
+    return alarm_service.rule_index.stats()
+
+
+@app.get("/topology/dependencies", response_model=List[DeviceDependencySchema])
+async def list_device_dependencies(db: AsyncSession = Depends(get_async_db)):
+    """List parent/child device dependencies"""
+    result = await db.execute(select(DeviceDependency))
+    return result.scalars().all()
+
+
+@app.post("/topology/dependencies", response_model=DeviceDependencySchema)
+async def create_device_dependency(dependency: DeviceDependencyCreate, db: AsyncSession = Depends(get_async_db)):
+    """Add a parent/child device dependency"""
+    if dependency.parent_device_id == dependency.child_device_id:
+        raise HTTPException(status_code=400, detail="A device cannot depend on itself")
+    try:
+        db_dependency = DeviceDependency(**dependency.dict())
+        db.add(db_dependency)
+        await db.commit()
+        await db.refresh(db_dependency)
+        
+        await alarm_service.apply_topology_change(db)
+        await alarm_service.notify_topology_change()
+        
+        logger.info("Device dependency created", parent=dependency.parent_device_id, child=dependency.child_device_id)
+        return db_dependency
+    
+    except Exception as e:
+        logger.error("Failed to create device dependency", error=str(e))
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to create device dependency")
+
+
+@app.delete("/topology/dependencies/{dependency_id}")
+async def delete_device_dependency(dependency_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Delete a device dependency"""
+    dependency = await db.get(DeviceDependency, dependency_id)
+    if not dependency:
+        raise HTTPException(status_code=404, detail="Device dependency not found")
+    
+    await db.delete(dependency)
+    await db.commit()
+    
+    await alarm_service.apply_topology_change(db)
+    await alarm_service.notify_topology_change()
+    
+    logger.info("Device dependency deleted", dependency_id=dependency_id)
+    return {"message": "Device dependency deleted successfully"}
+
+
+@app.get("/topology/index")
+async def get_topology_index_stats():
+    """Dependency index size, down devices and reachability cache counters"""
+    return alarm_service.topology.stats()
+
+
 # Background Tasks
 
 async def alarm_cleanup_task():
-    """Background task to cleanup old closed alarms"""
+    """Background task to move closed alarms to alarm_history and expire old history"""
     while True:
         try:
             await asyncio.sleep(settings.alarm_cleanup_interval)
-            
-            db = next(get_db())
-            cutoff_date = datetime.utcnow() - timedelta(days=settings.alarm_retention_days)
-            
-            deleted = db.query(Alarm).filter(
-                and_(
-                    Alarm.status == AlarmStatus.CLOSED,
-                    Alarm.closed_at < cutoff_date
-                )
-            ).delete()
-            
-            db.commit()
-            
-            if deleted > 0:
-                logger.info("Cleaned up old alarms", count=deleted)
-                
+            await alarm_service.archiver.run(alarm_service.redis_client)
         except Exception as e:
             logger.error("Alarm cleanup task failed", error=str(e))
 
 
+async def _drain_metrics(pubsub) -> List[Dict[str, Any]]:
+    """Wait for one metric message, then take more until the batch is full or the window closes"""
+    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+    if message is None:
+        return []
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.alarm_batch_max_wait_ms / 1000
+    messages = [message]
+    while len(messages) < settings.alarm_batch_max_messages:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+        if message is None:
+            break
+        messages.append(message)
+    
+    metrics = []
+    for message in messages:
+        if message['type'] != 'message':
+            continue
+        try:
+            metrics.append(json.loads(message['data']))
+        except ValueError as e:
+            logger.error("Failed to decode metric", error=str(e))
+    return metrics
+
+
 async def metric_processor_task():
-    """Background task to process metrics from Redis queue"""
+    """Background task to evaluate metrics from Redis in micro-batches"""
     while True:
         try:
             if not alarm_service.redis_client:
@@ -616,21 +1035,103 @@ async def metric_processor_task():
             # Subscribe to metrics channel
             pubsub = alarm_service.redis_client.pubsub()
             await pubsub.subscribe('metrics')
-            
-            async for message in pubsub.listen():
-                if message['type'] == 'message':
-                    try:
-                        metric_data = json.loads(message['data'])
-                        db = next(get_db())
-                        await alarm_service.process_metric_alarm(metric_data, db)
-                    except Exception as e:
-                        logger.error("Failed to process metric", error=str(e))
+            try:
+                while True:
+                    metrics = await _drain_metrics(pubsub)
+                    if metrics:
+                        await alarm_service.process_metric_batch(metrics)
+            finally:
+                await pubsub.close()
                         
         except Exception as e:
             logger.error("Metric processor task failed", error=str(e))
             await asyncio.sleep(5)
 
 
+async def alarm_timer_task():
+    """Single ticker for every hold-down and clear-delay timer"""
+    while True:
+        try:
+            await asyncio.sleep(settings.alarm_timer_tick_seconds)
+            await alarm_service.process_metric_batch([])
+        except Exception as e:
+            logger.error("Alarm timer task failed", error=str(e))
+
+
+async def rule_listener_task():
+    """Apply rule and topology change notifications, with a periodic full reload as a safety net"""
+    while True:
+        try:
+            if not alarm_service.redis_client:
+                await asyncio.sleep(5)
+                continue
+            
+            pubsub = alarm_service.redis_client.pubsub()
+            await pubsub.subscribe(RULE_CHANNEL, TOPOLOGY_CHANNEL)
+            try:
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message['type'] == 'message':
+                        async with AsyncSessionLocal() as db:
+                            if message['channel'] == TOPOLOGY_CHANNEL:
+                                await alarm_service.apply_topology_change(db)
+                            else:
+                                await alarm_service.apply_rule_change(json.loads(message['data']), db)
+                    elif time.time() - alarm_service.rule_index.loaded_at >= settings.alarm_rule_reload_interval:
+                        async with AsyncSessionLocal() as db:
+                            await alarm_service.apply_rule_change({'action': 'reload'}, db)
+                            await alarm_service.apply_topology_change(db)
+                            await alarm_service.load_device_locations(db)
+            finally:
+                await pubsub.close()
+                
+        except Exception as e:
+            logger.error("Rule listener task failed", error=str(e))
+            await asyncio.sleep(5)
+
+
+async def websocket_fanout_task():
+    """Deliver WebSocket messages published by any alarm manager process to this one's clients"""
+    while True:
+        try:
+            if not alarm_service.redis_client:
+                await asyncio.sleep(5)
+                continue
+            
+            pubsub = alarm_service.redis_client.pubsub()
+            await pubsub.subscribe(WS_CHANNEL)
+            # Anything published while unsubscribed is in the stream
+            await alarm_service.replay.warm(alarm_service.redis_client)
+            try:
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message and message['type'] == 'message':
+                        event = json.loads(message['data'])
+                        alarm_service.replay.remember(event)
+                        alarm_service.fanout.deliver(event)
+            finally:
+                await pubsub.close()
+                
+        except Exception as e:
+            logger.error("WebSocket fan-out task failed", error=str(e))
+            await asyncio.sleep(5)
+
+
+async def alarm_stats_task():
+    """Pick up other workers' counter updates; periodically recount the alarms table"""
+    while True:
+        try:
+            await asyncio.sleep(settings.alarm_stats_refresh_seconds)
+            counters = alarm_service.counters
+            if time.time() - counters.reconciled_at >= settings.alarm_stats_reconcile_interval:
+                async with AsyncSessionLocal() as db:
+                    await counters.reconcile(db, alarm_service.redis_client)
+            elif alarm_service.redis_client:
+                await counters.refresh(alarm_service.redis_client)
+        except Exception as e:
+            logger.error("Alarm stats task failed", error=str(e))
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8004)
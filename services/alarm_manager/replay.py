@@ -0,0 +1,127 @@
+"""
+Sequenced alarm events and WebSocket replay
+Every message fanned out to consoles gets a global sequence number. One Lua
+script increments the counter, appends the event to a capped Redis Stream
+(entry ID "<seq>-0") and publishes it, so sequence, stream and pub/sub order
+always agree across workers. Each process also keeps the most recent events in
+memory; a reconnecting console asks for ?since=<seq> and is sent only the
+events it missed, from memory when possible and from the stream otherwise.
+If the gap is older than the stream, or the console's seq is ahead of it (the
+counter restarted), it is told to resync instead.
+"""
+import json
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+
+from shared.logger import get_logger
+
+logger = get_logger("alarm_manager")
+
+STREAM_KEY = 'alarm_events_stream'
+SEQ_KEY = 'alarm_events_seq'
+
+# KEYS: sequence counter, stream, pub/sub channel; ARGV: event JSON object, stream cap
+_APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], seq .. '-0', 'event', ARGV[1])
+local message = '{"seq":' .. seq .. ',' .. string.sub(ARGV[1], 2)
+redis.call('PUBLISH', KEYS[3], message)
+return seq
+"""
+
+
+def _seq_of(entry_id: str) -> int:
+    return int(entry_id.split('-', 1)[0])
+
+
+class ReplayBuffer:
+    """Recent sequenced events of this process, backed by the shared Redis Stream"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.events: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self.last_seq = 0
+        self._script = None
+        self.replays = 0
+        self.stream_reads = 0
+        self.resyncs = 0
+
+    async def publish(self, redis_client: aioredis.Redis, channel: str, event: Dict[str, Any]) -> int:
+        """Sequence, store and publish one event; returns its sequence number"""
+        if self._script is None:
+            self._script = redis_client.register_script(_APPEND_SCRIPT)
+        body = json.dumps(event)
+        return int(await self._script(keys=[SEQ_KEY, STREAM_KEY, channel], args=[body, self.size]))
+
+    def sequence_locally(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Without Redis, number events per process"""
+        event['seq'] = self.last_seq + 1
+        self.remember(event)
+        return event
+
+    def remember(self, event: Dict[str, Any]):
+        seq = event.get('seq')
+        if seq is not None and seq > self.last_seq:
+            self.events.append(event)
+            self.last_seq = seq
+
+    async def warm(self, redis_client: aioredis.Redis):
+        """(Re)fill the in-memory buffer from the stream, e.g. after a restart or a pub/sub reconnect"""
+        self.events.clear()
+        self.last_seq = 0
+        entries = await redis_client.xrevrange(STREAM_KEY, count=self.size)
+        for entry_id, fields in reversed(entries):
+            self.remember(self._decode(entry_id, fields))
+        logger.info("Alarm event replay buffer loaded", events=len(self.events), last_seq=self.last_seq)
+
+    @staticmethod
+    async def _stream_last(redis_client: aioredis.Redis) -> Optional[int]:
+        entries = await redis_client.xrevrange(STREAM_KEY, count=1)
+        return _seq_of(entries[0][0]) if entries else None
+
+    @staticmethod
+    def _decode(entry_id: str, fields: Dict[str, str]) -> Dict[str, Any]:
+        event = {'seq': _seq_of(entry_id)}
+        event.update(json.loads(fields['event']))
+        return event
+
+    async def since(self, redis_client: Optional[aioredis.Redis], seq: int) -> Tuple[List[Dict[str, Any]], bool]:
+        """Events after seq, oldest first, and whether that is the complete delta"""
+        self.replays += 1
+        if seq == self.last_seq:
+            return [], True
+        if seq > self.last_seq:
+            # This process may just not have received the newest events yet; a seq past the
+            # stream's end means the counter restarted (Redis flush or restart) or came from
+            # local numbering, so the console's position means nothing here
+            latest = await self._stream_last(redis_client) if redis_client is not None else None
+            if latest is None or seq > latest:
+                self.resyncs += 1
+                return [], False
+            if seq == latest:
+                return [], True
+        if seq < self.last_seq and self.events and self.events[0]['seq'] <= seq + 1:
+            return [event for event in self.events if event['seq'] > seq], True
+        if redis_client is None:
+            self.resyncs += 1
+            return [event for event in self.events if event['seq'] > seq], False
+
+        self.stream_reads += 1
+        entries = await redis_client.xrange(STREAM_KEY, min=f"{seq + 1}-0", max='+', count=self.size)
+        events = [self._decode(entry_id, fields) for entry_id, fields in entries]
+        complete = bool(events) and events[0]['seq'] == seq + 1 and len(events) < self.size
+        if not complete:
+            self.resyncs += 1
+        return events, complete
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'buffered': len(self.events),
+            'oldest_seq': self.events[0]['seq'] if self.events else None,
+            'last_seq': self.last_seq,
+            'replays': self.replays,
+            'stream_reads': self.stream_reads,
+            'resyncs': self.resyncs
+        }
@@ -0,0 +1,131 @@
+"""
+In-memory alarm rule index for the Alarm Manager Service
+Enabled rules keyed by metric_name and device scope, so evaluating a sample is
+a dict lookup instead of a query. The index is loaded at startup and patched
+when a rule changes: whoever creates or deletes a rule (this service or the
+API gateway) publishes {"action": "upsert"|"delete", "rule_id": N} on the
+alarm_rules Redis channel and every alarm manager process applies it.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import AlarmRule, AlarmSeverity
+from shared.logger import get_logger
+
+logger = get_logger("alarm_manager")
+
+RULE_CHANNEL = 'alarm_rules'
+
+_NO_RULES: Tuple = ()
+
+
+@dataclass(frozen=True)
+class IndexedRule:
+    """Detached copy of an enabled AlarmRule"""
+    id: int
+    name: str
+    description: Optional[str]
+    metric_name: str
+    threshold_value: float
+    comparison_operator: str
+    duration_seconds: int
+    severity: AlarmSeverity
+    device_id: Optional[int]
+    clear_threshold_value: Optional[float] = None
+
+    @classmethod
+    def from_model(cls, rule: AlarmRule) -> 'IndexedRule':
+        return cls(
+            id=rule.id,
+            name=rule.name,
+            description=rule.description,
+            metric_name=rule.metric_name,
+            threshold_value=rule.threshold_value,
+            comparison_operator=rule.comparison_operator,
+            duration_seconds=rule.duration_seconds or 0,
+            severity=rule.severity,
+            device_id=rule.device_id,
+            clear_threshold_value=rule.clear_threshold_value
+        )
+
+    @property
+    def clear_threshold(self) -> float:
+        """Threshold an active alarm is compared against (hysteresis when it differs from threshold_value)"""
+        return self.threshold_value if self.clear_threshold_value is None else self.clear_threshold_value
+
+
+class AlarmRuleIndex:
+    """metric_name -> device scope (None = all devices) -> rules"""
+
+    def __init__(self):
+        self.rules: Dict[int, IndexedRule] = {}
+        self.by_metric: Dict[str, Dict[Optional[int], Tuple[IndexedRule, ...]]] = {}
+        self.loaded_at = 0.0
+        self.version = 0
+        self.patches = 0
+
+    async def load(self, db: AsyncSession):
+        """Replace the index with the enabled rules in the database"""
+        result = await db.execute(select(AlarmRule).where(AlarmRule.enabled == True))
+        self.rules = {rule.id: IndexedRule.from_model(rule) for rule in result.scalars().all()}
+        self._rebuild()
+        self.loaded_at = time.time()
+        logger.info("Alarm rule index loaded", rules=len(self.rules))
+
+    def _rebuild(self):
+        by_metric: Dict[str, Dict[Optional[int], List[IndexedRule]]] = {}
+        for rule in sorted(self.rules.values(), key=lambda r: r.id):
+            by_metric.setdefault(rule.metric_name, {}).setdefault(rule.device_id, []).append(rule)
+        self.by_metric = {
+            metric_name: {scope: tuple(rules) for scope, rules in scopes.items()}
+            for metric_name, scopes in by_metric.items()
+        }
+        self.version += 1
+
+    def upsert(self, rule: IndexedRule):
+        self.rules[rule.id] = rule
+        self._rebuild()
+        self.patches += 1
+
+    def remove(self, rule_id: int):
+        if self.rules.pop(rule_id, None) is not None:
+            self._rebuild()
+        self.patches += 1
+
+    async def apply(self, change: Dict[str, Any], db: AsyncSession):
+        """Apply one change notification; upserts re-read the rule so disabled rules drop out"""
+        action = change.get('action')
+        if action == 'reload':
+            await self.load(db)
+            return
+        rule_id = int(change['rule_id'])
+        if action == 'delete':
+            self.remove(rule_id)
+            return
+        rule = await db.get(AlarmRule, rule_id)
+        if rule is None or not rule.enabled:
+            self.remove(rule_id)
+        else:
+            self.upsert(IndexedRule.from_model(rule))
+
+    def rules_for(self, metric_name: str, device_id: Optional[int] = None) -> Tuple[IndexedRule, ...]:
+        """Rules that apply to a metric of one device: global rules first, then device-scoped ones"""
+        scopes = self.by_metric.get(metric_name)
+        if not scopes:
+            return _NO_RULES
+        global_rules = scopes.get(None, _NO_RULES)
+        scoped = scopes.get(device_id, _NO_RULES) if device_id is not None else _NO_RULES
+        return global_rules + scoped if scoped else global_rules
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'rules': len(self.rules),
+            'metrics': len(self.by_metric),
+            'version': self.version,
+            'patches': self.patches,
+            'loaded_at': self.loaded_at
+        }
@@ -0,0 +1,152 @@
+"""
+Device dependency index for topology-aware alarm suppression
+Parent/child links from device_dependencies (entered manually or derived from
+LLDP) are held as adjacency sets. Each device's upstream closure is computed
+once and cached until the topology changes, so "is any ancestor down?" is a
+set intersection instead of a graph walk per alarm. A device counts as down
+while it has an active critical alarm; alarms below it are symptoms of the
+topmost down ancestor.
+"""
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import AlarmSeverity, DeviceDependency
+from shared.logger import get_logger
+from services.alarm_manager.active_alarms import ActiveAlarmTable
+
+logger = get_logger("alarm_manager")
+
+TOPOLOGY_CHANNEL = 'topology'
+
+_NO_DEVICES: FrozenSet[int] = frozenset()
+
+
+class TopologyIndex:
+    """parent/child adjacency, cached reachability and the set of down devices"""
+
+    def __init__(self, active_alarms: ActiveAlarmTable):
+        self.active_alarms = active_alarms
+        self.parents: Dict[int, Set[int]] = {}
+        self.children: Dict[int, Set[int]] = {}
+        # device_id -> (ancestors nearest first, same as a set)
+        self._ancestors: Dict[int, Tuple[Tuple[int, ...], FrozenSet[int]]] = {}
+        # Critical active alarms per down device, and the reverse
+        self.down: Dict[int, Set[str]] = {}
+        self._down_alarms: Dict[str, int] = {}
+        self.loaded_at = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        active_alarms.listeners.append(self._on_active_change)
+
+    async def load(self, db: AsyncSession):
+        """Replace the adjacency sets with device_dependencies"""
+        result = await db.execute(select(DeviceDependency.parent_device_id, DeviceDependency.child_device_id))
+        self.set_links(result.all())
+        self.loaded_at = time.time()
+        logger.info("Topology index loaded", links=sum(len(c) for c in self.children.values()))
+
+    def set_links(self, links: Iterable[Tuple[int, int]]):
+        self.parents = {}
+        self.children = {}
+        for parent_id, child_id in links:
+            if parent_id != child_id:
+                self.parents.setdefault(child_id, set()).add(parent_id)
+                self.children.setdefault(parent_id, set()).add(child_id)
+        self._ancestors = {}
+
+    def add_link(self, parent_id: int, child_id: int):
+        self.parents.setdefault(child_id, set()).add(parent_id)
+        self.children.setdefault(parent_id, set()).add(child_id)
+        self._ancestors = {}
+
+    def remove_link(self, parent_id: int, child_id: int):
+        self.parents.get(child_id, set()).discard(parent_id)
+        self.children.get(parent_id, set()).discard(child_id)
+        self._ancestors = {}
+
+    def _closure(self, device_id: int) -> Tuple[Tuple[int, ...], FrozenSet[int]]:
+        cached = self._ancestors.get(device_id)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        self.cache_misses += 1
+        order: List[int] = []
+        seen = {device_id}
+        frontier = [device_id]
+        while frontier:
+            next_frontier = []
+            for node in frontier:
+                for parent_id in self.parents.get(node, ()):
+                    if parent_id not in seen:
+                        seen.add(parent_id)
+                        order.append(parent_id)
+                        next_frontier.append(parent_id)
+            frontier = next_frontier
+        cached = self._ancestors[device_id] = (tuple(order), frozenset(order))
+        return cached
+
+    def ancestors(self, device_id: int) -> FrozenSet[int]:
+        return self._closure(device_id)[1] if device_id in self.parents else _NO_DEVICES
+
+    def descendants(self, device_id: int) -> Set[int]:
+        found: Set[int] = set()
+        frontier = [device_id]
+        while frontier:
+            node = frontier.pop()
+            for child_id in self.children.get(node, ()):
+                if child_id not in found and child_id != device_id:
+                    found.add(child_id)
+                    frontier.append(child_id)
+        return found
+
+    def root_cause(self, device_id: int, extra_down: Optional[Dict[int, str]] = None) -> Optional[str]:
+        """Alarm of the topmost down ancestor of device_id, if any"""
+        if (not self.down and not extra_down) or device_id not in self.parents:
+            return None
+        order, members = self._closure(device_id)
+        if self.down.keys().isdisjoint(members) and (not extra_down or extra_down.keys().isdisjoint(members)):
+            return None
+        for ancestor_id in reversed(order):
+            alarms = self.down.get(ancestor_id)
+            if alarms:
+                return min(alarms)
+            if extra_down and ancestor_id in extra_down:
+                return extra_down[ancestor_id]
+        return None
+
+    def _on_active_change(self, alarm_id: Optional[str], active: bool):
+        if alarm_id is None:
+            self.down = {}
+            self._down_alarms = {}
+            for entry in self.active_alarms.alarms.values():
+                if entry.severity == AlarmSeverity.CRITICAL:
+                    self._mark_down(entry.device_id, entry.alarm_id)
+            return
+        entry = self.active_alarms.alarms.get(alarm_id) if active else None
+        if entry is not None and entry.severity == AlarmSeverity.CRITICAL:
+            self._mark_down(entry.device_id, alarm_id)
+            return
+        device_id = self._down_alarms.pop(alarm_id, None)
+        if device_id is not None:
+            alarms = self.down.get(device_id)
+            alarms.discard(alarm_id)
+            if not alarms:
+                del self.down[device_id]
+
+    def _mark_down(self, device_id: int, alarm_id: str):
+        self._down_alarms[alarm_id] = device_id
+        self.down.setdefault(device_id, set()).add(alarm_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'devices_with_parents': len(self.parents),
+            'links': sum(len(children) for children in self.children.values()),
+            'down_devices': len(self.down),
+            'cached_closures': len(self._ancestors),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'loaded_at': self.loaded_at
+        }
@@ -0,0 +1,138 @@
+"""
+Batched alarm state transitions for the Alarm Manager Service
+Evaluation collects the raises and clears of a whole micro-batch and writes
+them in one transaction: raises as a multi-row INSERT ... ON CONFLICT
+(alarm_id) DO UPDATE, which re-opens a cleared or closed row with the same
+alarm_id, and clears as one UPDATE ... WHERE alarm_id IN (...). The rows that
+actually changed are appended to the alarm event log in the same transaction.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shared.models import Alarm, AlarmSeverity, AlarmStatus
+from services.alarm_manager.active_alarms import ACTIVE_STATUSES
+from services.alarm_manager.event_log import append_events
+
+# Columns reset when an inactive alarm row is raised again
+REOPEN_COLUMNS = ('device_id', 'title', 'description', 'severity', 'status', 'source', 'raised_at',
+                  'root_cause_alarm_id')
+
+
+class TransitionBatch:
+    """Raises and clears decided during one micro-batch, keyed by alarm_id"""
+
+    def __init__(self):
+        self.raises: Dict[str, Dict[str, Any]] = {}
+        self.clears: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self.raises) + len(self.clears)
+
+    def raise_alarm(self, alarm_id: str, device_id: int, title: str, description: Optional[str],
+                    severity: AlarmSeverity, source: str, raised_at: Optional[datetime] = None):
+        self.clears.discard(alarm_id)
+        self.raises[alarm_id] = {
+            'alarm_id': alarm_id,
+            'device_id': device_id,
+            'title': title,
+            'description': description,
+            'severity': severity,
+            'status': AlarmStatus.RAISED,
+            'source': source,
+            'raised_at': raised_at or datetime.utcnow(),
+            'root_cause_alarm_id': None
+        }
+
+    def clear_alarm(self, alarm_id: str):
+        # A raise and a clear inside the same batch cancel out
+        if self.raises.pop(alarm_id, None) is None:
+            self.clears.add(alarm_id)
+
+    def restore_raise(self, payload: Dict[str, Any]):
+        """Queue a raise decided in an earlier batch (deferred or suppressed), keeping its raised_at"""
+        self.clears.discard(payload['alarm_id'])
+        self.raises[payload['alarm_id']] = payload
+
+    def is_active(self, alarm_id: str, active: bool) -> bool:
+        """Whether alarm_id will be active once this batch is written"""
+        if alarm_id in self.raises:
+            return True
+        if alarm_id in self.clears:
+            return False
+        return active
+
+
+async def write_transitions(db: AsyncSession, batch: TransitionBatch) -> Tuple[List[Alarm], List[Alarm]]:
+    """Write a batch in one transaction; returns (raised, cleared) alarm rows that actually changed"""
+    raised: List[Alarm] = []
+    cleared: List[Alarm] = []
+
+    if batch.raises:
+        stmt = pg_insert(Alarm).values(list(batch.raises.values()))
+        reopen = {column: stmt.excluded[column] for column in REOPEN_COLUMNS}
+        reopen.update(acknowledged_at=None, acknowledged_by=None, cleared_at=None, closed_at=None)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Alarm.alarm_id],
+            set_=reopen,
+            where=Alarm.status.in_([AlarmStatus.CLEARED, AlarmStatus.CLOSED])
+        ).returning(Alarm)
+        raised = list((await db.execute(stmt)).scalars().all())
+
+    if batch.clears:
+        stmt = (
+            update(Alarm)
+            .where(Alarm.alarm_id.in_(batch.clears), Alarm.status.in_(ACTIVE_STATUSES))
+            .values(status=AlarmStatus.CLEARED, cleared_at=datetime.utcnow())
+            .returning(Alarm)
+            .execution_options(synchronize_session=False)
+        )
+        cleared = list((await db.execute(stmt)).scalars().all())
+
+    await append_events(db, 'raised', raised)
+    await append_events(db, 'auto_cleared', cleared)
+    await db.commit()
+    return raised, cleared
+
+
+async def write_root_causes(db: AsyncSession, root_causes: Dict[str, Optional[str]]) -> int:
+    """Mark (or unmark, with None) active alarms as symptoms; one UPDATE per root cause"""
+    by_root: Dict[Optional[str], List[str]] = {}
+    for alarm_id, root in root_causes.items():
+        by_root.setdefault(root, []).append(alarm_id)
+    updated = 0
+    for root, alarm_ids in by_root.items():
+        result = await db.execute(
+            update(Alarm)
+            .where(Alarm.alarm_id.in_(alarm_ids), Alarm.status.in_(ACTIVE_STATUSES))
+            .values(root_cause_alarm_id=root)
+            .returning(Alarm)
+            .execution_options(synchronize_session=False)
+        )
+        updated += await append_events(db, 'root_cause', result.scalars().all())
+    await db.commit()
+    return updated
+
+
+async def load_active(db: AsyncSession, alarm_ids: Set[str]) -> List[Alarm]:
+    """Active rows for alarm_ids a raise did not touch (already active, e.g. raised by another worker)"""
+    if not alarm_ids:
+        return []
+    result = await db.execute(
+        select(Alarm).where(Alarm.alarm_id.in_(alarm_ids), Alarm.status.in_(ACTIVE_STATUSES))
+    )
+    return list(result.scalars().all())
+
+
+async def load_reopenable(db: AsyncSession, alarm_ids: Set[str]) -> Dict[str, Tuple[AlarmStatus, AlarmSeverity]]:
+    """(status, severity) of the cleared or closed rows a raise is about to re-open"""
+    if not alarm_ids:
+        return {}
+    result = await db.execute(
+        select(Alarm.alarm_id, Alarm.status, Alarm.severity)
+        .where(Alarm.alarm_id.in_(alarm_ids), Alarm.status.in_([AlarmStatus.CLEARED, AlarmStatus.CLOSED]))
+    )
+    return {alarm_id: (status, severity) for alarm_id, status, severity in result.all()}
@@ -0,0 +1,268 @@
+"""
+Bulk device import for the API Gateway
+Parses CSV / JSON / NDJSON inventories, validates every row, streams the valid
+rows into a temporary staging table with COPY and upserts them into devices
+"""
+import csv
+import io
+import ipaddress
+import json
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import String
+
+from shared.database import engine
+from shared.models import Device, DeviceStatus
+from shared.schemas import DeviceCreate
+from shared.logger import get_logger
+
+logger = get_logger("api_gateway")
+
+# Columns accepted from an import file, in COPY order
+IMPORT_COLUMNS = list(DeviceCreate.model_fields.keys())
+
+# Values used for columns left out of a row when the device is new
+INSERT_DEFAULTS = {
+    'snmp_enabled': 'false',
+    'snmp_version': "'2c'",
+    'netconf_enabled': 'false',
+    'restconf_enabled': 'false',
+}
+
+BOOLEAN_COLUMNS = {name for name, field in DeviceCreate.model_fields.items() if field.annotation is bool}
+
+COPY_CHUNK_ROWS = 10000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """Raised when the payload cannot be parsed in the requested format"""
+
+
+def detect_format(content_type: str, explicit: str = None) -> str:
+    """Resolve the payload format from a query parameter or Content-Type header"""
+    if explicit:
+        fmt = explicit.lower()
+    else:
+        media_type = (content_type or '').split(';')[0].strip().lower()
+        if media_type in ('text/csv', 'application/csv'):
+            fmt = 'csv'
+        elif media_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+            fmt = 'ndjson'
+        else:
+            fmt = 'json'
+
+    if fmt not in ('csv', 'json', 'ndjson'):
+        raise ImportFormatError(f"Unsupported import format: {fmt}")
+    return fmt
+
+
+def parse_rows(body: bytes, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """Yield (row_number, raw_row) pairs; row numbers are 1-based data rows"""
+    text = body.decode('utf-8-sig')
+
+    if fmt == 'csv':
+        reader = csv.DictReader(io.StringIO(text))
+        for row_number, row in enumerate(reader, start=1):
+            yield row_number, {key.strip(): value for key, value in row.items() if key}
+    elif fmt == 'ndjson':
+        row_number = 0
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                yield row_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, ImportFormatError(f"Invalid JSON: {e.msg}")
+    else:
+        try:
+            payload = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ImportFormatError(f"Invalid JSON document: {e.msg}")
+        if isinstance(payload, dict):
+            payload = payload.get('devices', [])
+        if not isinstance(payload, list):
+            raise ImportFormatError("JSON payload must be a list of devices or {\"devices\": [...]}")
+        for row_number, row in enumerate(payload, start=1):
+            yield row_number, row
+
+
+def _column_lengths() -> Dict[str, int]:
+    """Maximum string lengths from the devices table definition"""
+    lengths = {}
+    for column in Device.__table__.columns:
+        if isinstance(column.type, String) and column.type.length:
+            lengths[column.name] = column.type.length
+    return lengths
+
+
+COLUMN_LENGTHS = _column_lengths()
+
+
+def validate_row(raw: Any) -> Dict[str, Any]:
+    """Validate a single row and return the explicitly provided fields"""
+    if isinstance(raw, Exception):
+        raise raw
+    if not isinstance(raw, dict):
+        raise ImportFormatError("Row must be an object")
+
+    # CSV gives empty strings for missing cells
+    cleaned = {key: value for key, value in raw.items() if key in IMPORT_COLUMNS and value not in ('', None)}
+    device = DeviceCreate(**cleaned)
+    ipaddress.ip_address(device.ip_address)
+
+    values = device.model_dump(exclude_unset=True)
+    for column, value in values.items():
+        limit = COLUMN_LENGTHS.get(column)
+        if limit and isinstance(value, str) and len(value) > limit:
+            raise ImportFormatError(f"{column} exceeds {limit} characters")
+    return values
+
+
+def _format_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return "; ".join(
+            f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}" for item in error.errors()
+        )
+    return str(error)
+
+
+def validate_rows(rows: Iterator[Tuple[int, Any]]) -> Tuple[int, List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Validate all rows; returns (received, valid_rows, errors)"""
+    by_ip: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    errors: List[Dict[str, Any]] = []
+    received = 0
+
+    for row_number, raw in rows:
+        received += 1
+        try:
+            values = validate_row(raw)
+        except (ValidationError, ValueError) as e:
+            ip = raw.get('ip_address') if isinstance(raw, dict) else None
+            errors.append({'row': row_number, 'ip_address': ip, 'error': _format_error(e)})
+            continue
+
+        ip = values['ip_address']
+        previous = by_ip.get(ip)
+        if previous:
+            # ON CONFLICT cannot touch the same row twice in one statement; last row wins
+            errors.append({
+                'row': previous[0],
+                'ip_address': ip,
+                'error': f"Duplicate ip_address in payload, superseded by row {row_number}"
+            })
+        by_ip[ip] = (row_number, values)
+
+    return received, [values for _, values in by_ip.values()], errors
+
+
+def _copy_chunks(rows: List[Dict[str, Any]]) -> Iterator[io.StringIO]:
+    """Render rows as CSV buffers of COPY_CHUNK_ROWS rows each"""
+    for start in range(0, len(rows), COPY_CHUNK_ROWS):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in rows[start:start + COPY_CHUNK_ROWS]:
+            record = []
+            for column in IMPORT_COLUMNS:
+                value = values.get(column)
+                if column in BOOLEAN_COLUMNS and value is not None:
+                    value = 't' if value else 'f'
+                record.append(value)
+            record.append(DeviceStatus.UNKNOWN.name)
+            writer.writerow(record)
+        buffer.seek(0)
+        yield buffer
+
+
+def _upsert_sql() -> Tuple[str, str]:
+    """Build the UPDATE-existing and INSERT-new statements from the staging table"""
+    update_columns = [column for column in IMPORT_COLUMNS if column != 'ip_address']
+    update_sql = (
+        "UPDATE devices AS d SET "
+        + ", ".join(f"{column} = COALESCE(s.{column}, d.{column})" for column in update_columns)
+        + ", updated_at = now() "
+        "FROM device_import_staging AS s WHERE d.ip_address = s.ip_address"
+    )
+
+    insert_columns = IMPORT_COLUMNS + ['status']
+    select_list = [
+        f"COALESCE(s.{column}, {INSERT_DEFAULTS[column]})" if column in INSERT_DEFAULTS else f"s.{column}"
+        for column in insert_columns
+    ]
+    insert_sql = (
+        f"INSERT INTO devices ({', '.join(insert_columns)}) "
+        f"SELECT {', '.join(select_list)} FROM device_import_staging AS s "
+        "ON CONFLICT (ip_address) DO NOTHING"
+    )
+    return update_sql, insert_sql
+
+
+UPDATE_SQL, INSERT_SQL = _upsert_sql()
+
+
+def copy_upsert(rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """COPY rows into staging and upsert them into devices in one transaction; returns (inserted, updated)"""
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        # Same column types as devices (varchar or enum), but no defaults or sequence calls
+        cursor.execute("CREATE TEMP TABLE device_import_staging (LIKE devices) ON COMMIT DROP")
+        cursor.execute("ALTER TABLE device_import_staging ALTER COLUMN id DROP NOT NULL")
+
+        copy_sql = (
+            f"COPY device_import_staging ({', '.join(IMPORT_COLUMNS + ['status'])}) "
+            "FROM STDIN WITH (FORMAT csv)"
+        )
+        for buffer in _copy_chunks(rows):
+            cursor.copy_expert(copy_sql, buffer)
+
+        cursor.execute("CREATE INDEX ON device_import_staging (ip_address)")
+        cursor.execute("ANALYZE device_import_staging")
+
+        cursor.execute(UPDATE_SQL)
+        updated = cursor.rowcount
+        cursor.execute(INSERT_SQL)
+        inserted = cursor.rowcount
+
+        connection.commit()
+        return inserted, updated
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def import_devices(body: bytes, fmt: str) -> Dict[str, Any]:
+    """Parse, validate and upsert a device inventory; blocking, run it in a thread"""
+    start = time.perf_counter()
+    received, rows, errors = validate_rows(parse_rows(body, fmt))
+
+    inserted = updated = 0
+    if rows:
+        inserted, updated = copy_upsert(rows)
+
+    errors.sort(key=lambda error: error['row'])
+    result = {
+        'received': received,
+        'valid': len(rows),
+        'inserted': inserted,
+        'updated': updated,
+        'failed': len(errors),
+        'errors': errors[:MAX_REPORTED_ERRORS],
+        'errors_truncated': len(errors) > MAX_REPORTED_ERRORS,
+        'duration_seconds': round(time.perf_counter() - start, 3)
+    }
+
+    logger.info(
+        "Bulk device import completed",
+        received=received,
+        inserted=inserted,
+        updated=updated,
+        failed=len(errors),
+        duration_seconds=result['duration_seconds']
+    )
+    return result
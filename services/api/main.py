@@ -3,17 +3,21 @@ API Gateway Service - SCNMS Central API
 Aggregates all microservices and provides unified RESTful API
 """
 import asyncio
+import json
 import httpx
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException, Depends, Query, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, Query, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, desc, func, select
 import redis.asyncio as aioredis
 
-from shared.database import get_db, get_redis
+from shared.database import get_db, get_async_db, get_redis, render_pool_metrics
 from shared.models import (
     Device, Alarm, Metric, AlarmRule, PollingJob,
     DeviceStatus, AlarmStatus, AlarmSeverity, ProtocolType
@@ -28,6 +32,8 @@ from shared.schemas import (
 )
 from shared.logger import configure_logging, get_logger
 from shared.config import settings
+from services.api import device_import
+from services.api.device_import import ImportFormatError, detect_format
 
 # Configure logging
 configure_logging()
@@ -132,6 +138,12 @@ async def health_check():
     )
 
 
+@app.get("/db-pool/metrics")
+async def db_pool_metrics():
+    """Database connection pool metrics in Prometheus text format"""
+    return Response(content=render_pool_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/api/v1/health/services")
 async def check_all_services():
     """Check health of all microservices"""
@@ -163,16 +175,17 @@ async def list_devices(
     status: Optional[DeviceStatus] = None,
     limit: int = 100,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List all network devices"""
     try:
-        query = db.query(Device)
+        query = select(Device)
         
         if status:
-            query = query.filter(Device.status == status)
+            query = query.where(Device.status == status)
         
-        devices = query.limit(limit).offset(offset).all()
+        result = await db.execute(query.limit(limit).offset(offset))
+        devices = result.scalars().all()
         return devices
         
     except Exception as e:
@@ -205,10 +218,25 @@ async def create_device(device: DeviceCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail="Failed to create device")
 
 
+@app.post("/api/v1/devices/import")
+async def import_devices(request: Request, format: Optional[str] = None):
+    """Bulk import/upsert devices from CSV, JSON or NDJSON"""
+    try:
+        fmt = detect_format(request.headers.get('content-type'), format)
+        body = await request.body()
+        return await run_in_threadpool(device_import.import_devices, body, fmt)
+        
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("Bulk device import failed", error=str(e))
+        raise HTTPException(status_code=500, detail="Failed to import devices")
+
+
 @app.get("/api/v1/devices/{device_id}", response_model=DeviceSchema)
-async def get_device(device_id: int, db: Session = Depends(get_db)):
+async def get_device(device_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get device details by ID"""
-    device = db.query(Device).filter(Device.id == device_id).first()
+    device = await db.get(Device, device_id)
     if not device:
         raise HTTPException(status_code=404, detail="Device not found")
     return device
@@ -291,22 +319,23 @@ async def get_metrics(
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
     limit: int = 1000,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Query metrics data"""
     try:
-        query = db.query(Metric)
+        query = select(Metric)
         
         if device_ids:
-            query = query.filter(Metric.device_id.in_(device_ids))
+            query = query.where(Metric.device_id.in_(device_ids))
         if metric_names:
-            query = query.filter(Metric.metric_name.in_(metric_names))
+            query = query.where(Metric.metric_name.in_(metric_names))
         if start_time:
-            query = query.filter(Metric.timestamp >= start_time)
+            query = query.where(Metric.timestamp >= start_time)
         if end_time:
-            query = query.filter(Metric.timestamp <= end_time)
+            query = query.where(Metric.timestamp <= end_time)
         
-        metrics = query.order_by(desc(Metric.timestamp)).limit(limit).all()
+        result = await db.execute(query.order_by(desc(Metric.timestamp)).limit(limit))
+        metrics = result.scalars().all()
         
         return {
             "metrics": metrics,
@@ -322,30 +351,33 @@ async def get_metrics(
 @app.get("/api/v1/metrics/latest")
 async def get_latest_metrics(
     device_id: Optional[int] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get latest metrics for devices"""
     try:
         # Get latest metric for each device/metric_name combination
-        subquery = db.query(
+        subquery = select(
             Metric.device_id,
             Metric.metric_name,
             func.max(Metric.timestamp).label('max_timestamp')
         )
         
         if device_id:
-            subquery = subquery.filter(Metric.device_id == device_id)
+            subquery = subquery.where(Metric.device_id == device_id)
         
         subquery = subquery.group_by(Metric.device_id, Metric.metric_name).subquery()
         
-        metrics = db.query(Metric).join(
-            subquery,
-            and_(
-                Metric.device_id == subquery.c.device_id,
-                Metric.metric_name == subquery.c.metric_name,
-                Metric.timestamp == subquery.c.max_timestamp
+        result = await db.execute(
+            select(Metric).join(
+                subquery,
+                and_(
+                    Metric.device_id == subquery.c.device_id,
+                    Metric.metric_name == subquery.c.metric_name,
+                    Metric.timestamp == subquery.c.max_timestamp
+                )
             )
-        ).all()
+        )
+        metrics = result.scalars().all()
         
         return {"metrics": metrics, "count": len(metrics)}
         
@@ -359,18 +391,18 @@ async def get_device_metrics(
     device_id: int,
     metric_name: Optional[str] = None,
     hours: int = 24,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get metrics for a specific device"""
     try:
         # Check device exists
-        device = db.query(Device).filter(Device.id == device_id).first()
+        device = await db.get(Device, device_id)
         if not device:
             raise HTTPException(status_code=404, detail="Device not found")
         
         # Query metrics
         start_time = datetime.utcnow() - timedelta(hours=hours)
-        query = db.query(Metric).filter(
+        query = select(Metric).where(
             and_(
                 Metric.device_id == device_id,
                 Metric.timestamp >= start_time
@@ -378,9 +410,10 @@ async def get_device_metrics(
         )
         
         if metric_name:
-            query = query.filter(Metric.metric_name == metric_name)
+            query = query.where(Metric.metric_name == metric_name)
         
-        metrics = query.order_by(Metric.timestamp).all()
+        result = await db.execute(query.order_by(Metric.timestamp))
+        metrics = result.scalars().all()
         
         return {
             "device_id": device_id,
@@ -406,20 +439,23 @@ async def list_alarms(
     device_id: Optional[int] = None,
     limit: int = 100,
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """List alarms with filters"""
     try:
-        query = db.query(Alarm)
+        query = select(Alarm)
         
         if status:
-            query = query.filter(Alarm.status == status)
+            query = query.where(Alarm.status == status)
         if severity:
-            query = query.filter(Alarm.severity == severity)
+            query = query.where(Alarm.severity == severity)
         if device_id:
-            query = query.filter(Alarm.device_id == device_id)
+            query = query.where(Alarm.device_id == device_id)
         
-        alarms = query.order_by(desc(Alarm.raised_at)).limit(limit).offset(offset).all()
+        result = await db.execute(
+            query.order_by(desc(Alarm.raised_at)).limit(limit).offset(offset)
+        )
+        alarms = result.scalars().all()
         return alarms
         
     except Exception as e:
@@ -428,9 +464,10 @@ async def list_alarms(
 
 
 @app.get("/api/v1/alarms/{alarm_id}", response_model=AlarmSchema)
-async def get_alarm(alarm_id: str, db: Session = Depends(get_db)):
+async def get_alarm(alarm_id: str, db: AsyncSession = Depends(get_async_db)):
     """Get alarm details"""
-    alarm = db.query(Alarm).filter(Alarm.alarm_id == alarm_id).first()
+    result = await db.execute(select(Alarm).where(Alarm.alarm_id == alarm_id))
+    alarm = result.scalars().first()
     if not alarm:
         raise HTTPException(status_code=404, detail="Alarm not found")
     return alarm
@@ -484,6 +521,17 @@ async def get_alarm_statistics():
 
 # Alarm Rules Management
 
+async def notify_rule_change(action: str, rule_id: int):
+    """Publish a rule change so alarm managers patch their in-memory rule index"""
+    try:
+        if api_gateway.redis_client:
+            await api_gateway.redis_client.publish(
+                'alarm_rules', json.dumps({'action': action, 'rule_id': rule_id})
+            )
+    except Exception as e:
+        logger.error("Failed to publish rule change", error=str(e), rule_id=rule_id)
+
+
 @app.get("/api/v1/alarm-rules", response_model=List[AlarmRuleSchema])
 async def list_alarm_rules(db: Session = Depends(get_db)):
     """List all alarm rules"""
@@ -500,6 +548,8 @@ async def create_alarm_rule(rule: AlarmRuleCreate, db: Session = Depends(get_db)
         db.commit()
         db.refresh(db_rule)
         
+        await notify_rule_change('upsert', db_rule.id)
+        
         logger.info("Alarm rule created", rule_id=db_rule.id, name=rule.name)
         return db_rule
         
@@ -519,6 +569,8 @@ async def delete_alarm_rule(rule_id: int, db: Session = Depends(get_db)):
     db.delete(rule)
     db.commit()
     
+    await notify_rule_change('delete', rule_id)
+    
     logger.info("Alarm rule deleted", rule_id=rule_id)
     return {"message": "Alarm rule deleted successfully"}
 
@@ -583,29 +635,39 @@ async def delete_polling_job(job_id: int, db: Session = Depends(get_db)):
 # Dashboard Summary Endpoints
 
 @app.get("/api/v1/dashboard/summary")
-async def get_dashboard_summary(db: Session = Depends(get_db)):
+async def get_dashboard_summary(db: AsyncSession = Depends(get_async_db)):
     """Get overall dashboard summary"""
     try:
         # Device statistics
-        total_devices = db.query(Device).count()
-        devices_up = db.query(Device).filter(Device.status == DeviceStatus.UP).count()
-        devices_down = db.query(Device).filter(Device.status == DeviceStatus.DOWN).count()
+        total_devices = await db.scalar(select(func.count(Device.id)))
+        devices_up = await db.scalar(
+            select(func.count(Device.id)).where(Device.status == DeviceStatus.UP)
+        )
+        devices_down = await db.scalar(
+            select(func.count(Device.id)).where(Device.status == DeviceStatus.DOWN)
+        )
         
         # Alarm statistics
-        active_alarms = db.query(Alarm).filter(
-            Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
-        ).count()
-        
-        critical_alarms = db.query(Alarm).filter(
-            and_(
-                Alarm.severity == AlarmSeverity.CRITICAL,
+        active_alarms = await db.scalar(
+            select(func.count(Alarm.id)).where(
                 Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
             )
-        ).count()
+        )
+        
+        critical_alarms = await db.scalar(
+            select(func.count(Alarm.id)).where(
+                and_(
+                    Alarm.severity == AlarmSeverity.CRITICAL,
+                    Alarm.status.in_([AlarmStatus.RAISED, AlarmStatus.ACKNOWLEDGED])
+                )
+            )
+        )
         
         # Recent metrics count
         one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        recent_metrics = db.query(Metric).filter(Metric.timestamp >= one_hour_ago).count()
+        recent_metrics = await db.scalar(
+            select(func.count(Metric.id)).where(Metric.timestamp >= one_hour_ago)
+        )
         
         return {
             "timestamp": datetime.utcnow().isoformat(),
@@ -631,27 +693,32 @@ async def get_dashboard_summary(db: Session = Depends(get_db)):
 
 
 @app.get("/api/v1/dashboard/device-health")
-async def get_device_health_summary(db: Session = Depends(get_db)):
+async def get_device_health_summary(db: AsyncSession = Depends(get_async_db)):
     """Get device health summary with latest metrics"""
     try:
-        devices = db.query(Device).filter(Device.status == DeviceStatus.UP).all()
+        result = await db.execute(select(Device).where(Device.status == DeviceStatus.UP))
+        devices = result.scalars().all()
         
         device_health = []
         for device in devices:
             # Get latest CPU and memory metrics
-            cpu_metric = db.query(Metric).filter(
-                and_(
-                    Metric.device_id == device.id,
-                    Metric.metric_name == 'cpu_utilization'
-                )
-            ).order_by(desc(Metric.timestamp)).first()
+            cpu_metric = await db.scalar(
+                select(Metric).where(
+                    and_(
+                        Metric.device_id == device.id,
+                        Metric.metric_name == 'cpu_utilization'
+                    )
+                ).order_by(desc(Metric.timestamp)).limit(1)
+            )
             
-            memory_metric = db.query(Metric).filter(
-                and_(
-                    Metric.device_id == device.id,
-                    Metric.metric_name == 'memory_utilization'
-                )
-            ).order_by(desc(Metric.timestamp)).first()
+            memory_metric = await db.scalar(
+                select(Metric).where(
+                    and_(
+                        Metric.device_id == device.id,
+                        Metric.metric_name == 'memory_utilization'
+                    )
+                ).order_by(desc(Metric.timestamp)).limit(1)
+            )
             
             device_health.append({
                 "device_id": device.id,
@@ -0,0 +1,185 @@
+"""
+Batched metric writer for the Data Ingestion Service
+Bulk ingestion paths hand over chunks of rows; a single flusher drains them
+every INGEST_WRITER_FLUSH_INTERVAL or INGEST_WRITER_BATCH_ROWS rows and
+writes each batch with one COPY into a staging table plus one INSERT ... SELECT.
+The queue is bounded by row count so callers can answer 429 when it is full.
+"""
+import asyncio
+import csv
+import io
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from shared.database import engine
+from shared.logger import get_logger
+from shared.config import settings
+
+logger = get_logger("data_ingestion")
+
+# (device_id, metric_name, value, unit or None, epoch seconds)
+MetricRow = Tuple[int, str, float, Optional[str], float]
+
+STAGING_SQL = """
+    CREATE TEMP TABLE metric_ingest_staging (
+        device_id integer,
+        metric_name varchar(100),
+        metric_value double precision,
+        metric_unit varchar(20),
+        ts double precision
+    ) ON COMMIT DROP
+"""
+
+COPY_SQL = "COPY metric_ingest_staging (device_id, metric_name, metric_value, metric_unit, ts) FROM STDIN WITH (FORMAT csv)"
+
+INSERT_SQL = """
+    INSERT INTO metrics (device_id, metric_name, metric_value, metric_unit, timestamp)
+    SELECT device_id, metric_name, metric_value, metric_unit, to_timestamp(ts)
+    FROM metric_ingest_staging
+"""
+
+
+def copy_rows(rows: List[MetricRow]) -> int:
+    """COPY rows into metrics in one transaction; blocking, run it in a thread"""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(STAGING_SQL)
+        cursor.copy_expert(COPY_SQL, buffer)
+        cursor.execute(INSERT_SQL)
+        inserted = cursor.rowcount
+        connection.commit()
+        return inserted
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+class MetricBatchWriter:
+    """Bounded in-memory queue of metric rows with a single COPY flusher"""
+
+    def __init__(self):
+        self.max_rows = settings.ingest_queue_max_rows
+        self._chunks: Deque[List[MetricRow]] = deque()
+        self._queued = 0
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+        self.running = False
+
+        self.rows_accepted = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.last_flush_seconds = 0.0
+        self.last_error: Optional[str] = None
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def has_room(self, rows: int = 1) -> bool:
+        return self._queued + rows <= self.max_rows
+
+    def submit_nowait(self, rows: List[MetricRow]) -> bool:
+        """Queue rows if they all fit; False means the caller should back off"""
+        if not rows:
+            return True
+        if not self.has_room(len(rows)):
+            return False
+        self._chunks.append(rows)
+        self._queued += len(rows)
+        self.rows_accepted += len(rows)
+        if self._queued >= settings.ingest_writer_batch_rows:
+            self._wakeup.set()
+        return True
+
+    async def submit(self, rows: List[MetricRow], timeout: float) -> bool:
+        """Queue rows, waiting up to timeout for the flusher to make room"""
+        if self.submit_nowait(rows):
+            return True
+        deadline = time.monotonic() + timeout
+        async with self._space:
+            while not self.has_room(len(rows)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._wakeup.set()
+                try:
+                    await asyncio.wait_for(self._space.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+        return self.submit_nowait(rows)
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._flush_loop())
+        logger.info("Metric batch writer started", max_rows=self.max_rows)
+
+    async def stop(self):
+        """Stop the flusher after writing what is still queued"""
+        if not self.running:
+            return
+        self.running = False
+        self._wakeup.set()
+        if self._task:
+            await self._task
+        logger.info("Metric batch writer stopped", rows_written=self.rows_written)
+
+    def _take_batch(self) -> List[MetricRow]:
+        batch: List[MetricRow] = []
+        while self._chunks and len(batch) < settings.ingest_writer_batch_rows:
+            batch.extend(self._chunks.popleft())
+        self._queued -= len(batch)
+        return batch
+
+    async def _flush_loop(self):
+        while self.running or self._chunks:
+            if self.running and self._queued < settings.ingest_writer_batch_rows:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.ingest_writer_flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+
+            batch = self._take_batch()
+            if not batch:
+                continue
+            async with self._space:
+                self._space.notify_all()
+            await self._write(batch)
+
+    async def _write(self, batch: List[MetricRow]):
+        start = time.perf_counter()
+        try:
+            self.rows_written += await run_in_threadpool(copy_rows, batch)
+            self.flushes += 1
+        except Exception as e:
+            self.rows_dropped += len(batch)
+            self.last_error = str(e)
+            logger.error("Failed to write metric batch", rows=len(batch), error=str(e))
+        self.last_flush_seconds = round(time.perf_counter() - start, 4)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'running': self.running,
+            'queued_rows': self._queued,
+            'max_rows': self.max_rows,
+            'rows_accepted': self.rows_accepted,
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'flushes': self.flushes,
+            'last_flush_seconds': self.last_flush_seconds,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,221 @@
+"""
+Bulk sample ingestion for the Data Ingestion Service
+Validates NDJSON or columnar JSON samples for many devices, resolves devices
+through the cached DeviceIndex and hands rows to the MetricBatchWriter in
+chunks. NDJSON bodies are consumed as a stream, so a full writer queue stops
+reading and the client gets 429 with the counts accepted so far.
+"""
+import json
+import math
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Dict, List
+
+from shared.models import Metric
+from shared.config import settings
+from services.data_ingestion.batch_writer import MetricBatchWriter, MetricRow
+from services.data_ingestion.device_index import DeviceIndex
+
+MAX_METRIC_NAME_LENGTH = Metric.__table__.c.metric_name.type.length
+MAX_UNIT_LENGTH = Metric.__table__.c.metric_unit.type.length
+MAX_REPORTED_ERRORS = 100
+
+# Millisecond timestamps are accepted and detected by magnitude
+MS_TIMESTAMP_THRESHOLD = 1e11
+
+
+class RejectedSample(ValueError):
+    """A sample failed validation; args[0] is a short machine-readable reason"""
+
+
+class BulkIngestResult:
+    """Accepted / rejected counts for one request"""
+
+    def __init__(self):
+        self.accepted = 0
+        self.rejected = 0
+        self.reasons: Counter = Counter()
+        self.errors: List[Dict[str, Any]] = []
+        self.backpressure = False
+
+    def reject(self, line: int, reason: str, count: int = 1):
+        self.rejected += count
+        self.reasons[reason] += count
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'reason': reason})
+
+    def as_dict(self, writer: MetricBatchWriter) -> Dict[str, Any]:
+        return {
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'rejected_by_reason': dict(self.reasons),
+            'errors': self.errors,
+            'queued_rows': writer.queued
+        }
+
+
+class SampleValidator:
+    """Validates single samples against the device index and time window"""
+
+    def __init__(self, device_index: DeviceIndex):
+        self.device_index = device_index
+        self.now = time.time()
+        self.min_ts = self.now - settings.metric_retention_days * 86400
+        self.max_ts = self.now + settings.ingest_max_future_seconds
+
+    def row(self, device_id: Any, device_ip: Any, device_name: Any,
+            metric_name: Any, value: Any, timestamp: Any, unit: Any) -> MetricRow:
+        resolved = self.device_index.resolve(device_id, device_ip, device_name)
+        if resolved is None:
+            raise RejectedSample('unknown_device')
+
+        if not isinstance(metric_name, str) or not metric_name:
+            raise RejectedSample('missing_metric_name')
+        if len(metric_name) > MAX_METRIC_NAME_LENGTH:
+            raise RejectedSample('metric_name_too_long')
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise RejectedSample('invalid_value')
+        value = float(value)
+        if not math.isfinite(value):
+            raise RejectedSample('invalid_value')
+
+        if timestamp is None:
+            ts = self.now
+        else:
+            try:
+                ts = float(timestamp)
+            except (TypeError, ValueError):
+                raise RejectedSample('invalid_timestamp')
+            if ts > MS_TIMESTAMP_THRESHOLD:
+                ts /= 1000.0
+            if not self.min_ts <= ts <= self.max_ts:
+                raise RejectedSample('timestamp_out_of_range')
+
+        if unit is not None and (not isinstance(unit, str) or len(unit) > MAX_UNIT_LENGTH):
+            raise RejectedSample('invalid_unit')
+
+        return resolved, metric_name, value, unit, ts
+
+
+async def _resolve_with_refresh(validator: SampleValidator, state: Dict[str, bool], **sample) -> MetricRow:
+    """Validate a sample; on the first unknown device per request, reload the index once"""
+    try:
+        return validator.row(**sample)
+    except RejectedSample as e:
+        if e.args[0] != 'unknown_device' or state['refreshed']:
+            raise
+        state['refreshed'] = True
+        await validator.device_index.refresh(force=True)
+        return validator.row(**sample)
+
+
+async def _lines(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines without buffering the whole body"""
+    pending = b''
+    async for chunk in stream:
+        pending += chunk
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line
+    if pending:
+        yield pending
+
+
+async def ingest_ndjson(stream: AsyncIterator[bytes], device_index: DeviceIndex,
+                        writer: MetricBatchWriter) -> BulkIngestResult:
+    """Consume an NDJSON body; stops early (backpressure) if the writer stays full"""
+    result = BulkIngestResult()
+    validator = SampleValidator(device_index)
+    state = {'refreshed': False}
+    chunk: List[MetricRow] = []
+    line_number = 0
+
+    async for line in _lines(stream):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            sample = json.loads(line)
+            if not isinstance(sample, dict):
+                raise RejectedSample('not_an_object')
+            chunk.append(await _resolve_with_refresh(
+                validator, state,
+                device_id=sample.get('device_id'),
+                device_ip=sample.get('device_ip'),
+                device_name=sample.get('device_name'),
+                metric_name=sample.get('metric_name'),
+                value=sample.get('value'),
+                timestamp=sample.get('timestamp'),
+                unit=sample.get('unit')
+            ))
+        except RejectedSample as e:
+            result.reject(line_number, e.args[0])
+            continue
+        except ValueError:
+            result.reject(line_number, 'invalid_json')
+            continue
+
+        if len(chunk) >= settings.ingest_chunk_rows:
+            if not await writer.submit(chunk, settings.ingest_backpressure_timeout):
+                result.backpressure = True
+                return result
+            result.accepted += len(chunk)
+            chunk = []
+
+    if chunk:
+        if await writer.submit(chunk, settings.ingest_backpressure_timeout):
+            result.accepted += len(chunk)
+        else:
+            result.backpressure = True
+    return result
+
+
+def _column(payload: Dict[str, Any], name: str, length: int) -> List[Any]:
+    """A column as a list; scalars are broadcast, missing columns are None"""
+    values = payload.get(name)
+    if isinstance(values, list):
+        if len(values) != length:
+            raise ValueError(f"Column '{name}' has {len(values)} entries, expected {length}")
+        return values
+    return [values] * length
+
+
+async def ingest_columnar(payload: Any, device_index: DeviceIndex,
+                          writer: MetricBatchWriter) -> BulkIngestResult:
+    """Ingest {"device_id": [...], "metric_name": [...], "value": [...], "timestamp": [...]}"""
+    if not isinstance(payload, dict) or not isinstance(payload.get('value'), list):
+        raise ValueError("Columnar payload must be an object with a 'value' array")
+
+    length = len(payload['value'])
+    columns = {
+        name: _column(payload, name, length)
+        for name in ('device_id', 'device_ip', 'device_name', 'metric_name', 'value', 'timestamp', 'unit')
+    }
+
+    result = BulkIngestResult()
+    validator = SampleValidator(device_index)
+    state = {'refreshed': False}
+    rows: List[MetricRow] = []
+    for index, sample in enumerate(zip(*columns.values())):
+        try:
+            rows.append(await _resolve_with_refresh(validator, state, **dict(zip(columns.keys(), sample))))
+        except RejectedSample as e:
+            result.reject(index, e.args[0])
+
+    await submit_rows(rows, writer, result)
+    return result
+
+
+async def submit_rows(rows: List[MetricRow], writer: MetricBatchWriter, result: BulkIngestResult) -> bool:
+    """Hand rows to the writer in chunks; stops at the first chunk that does not fit in time"""
+    for start in range(0, len(rows), settings.ingest_chunk_rows):
+        chunk = rows[start:start + settings.ingest_chunk_rows]
+        if not await writer.submit(chunk, settings.ingest_backpressure_timeout):
+            result.backpressure = True
+            return False
+        result.accepted += len(chunk)
+    return True
@@ -0,0 +1,576 @@
+"""
+Vectorized ingestion cycle for the Data Ingestion Service
+A cycle's metric rows become columnar arrays (series idx, ts, value) and the
+latest sample per series is picked with NumPy. Unit conversion, counter
+deltas, interface utilization and the alarm-rule threshold pre-check then run
+as array operations over every series of the cycle at once. Results go to
+numbered output slots; only slots whose value changed are written to the
+exposition state, and unchanged ones are touched just often enough to survive
+the stale-series sweep (one the sweep removed anyway is written back). Series
+not seen for a TTL are pruned, along with the interfaces, devices and slots
+only they used.
+
+What a raw (device, metric) pair feeds and with which labels is worked out
+once, when the pair is first seen or when the device or interface name changes.
+"""
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from shared.models import Device, DeviceStatus
+from shared.config import settings
+from services.data_ingestion.exposition import MetricFamilyState
+from services.data_ingestion.interfaces import SYS_UPTIME_OID, parse_interface_metric
+
+# Series kinds
+KIND_NONE = 0        # only checked against alarm rules
+KIND_GAUGE = 1       # device-level gauge, exported as scaled
+KIND_IF_STATUS = 2   # ifOperStatus -> 1 when up
+KIND_IF_SPEED = 3
+KIND_IF_OCTETS = 4   # counter plus derived utilization
+KIND_IF_COUNTER = 5  # errors / packets
+KIND_IF_OTHER = 6    # interface column without an exported series
+
+# Device-level metric (without the snmp_ prefix) -> (family key, extra labels, scale)
+DEVICE_FIELDS = {
+    'cpu_utilization': ('cpu_utilization', ('0',), 1.0),
+    'memory_utilization': ('memory_utilization', (), 1.0),
+    'sysUpTime': ('device_uptime', None, 0.01),  # TimeTicks are hundredths of a second
+    SYS_UPTIME_OID: ('device_uptime', None, 0.01),
+}
+
+# Interface field -> (kind, family key, direction / error_type)
+INTERFACE_FIELDS = {
+    'ifOperStatus': (KIND_IF_STATUS, 'interface_status', None),
+    'ifSpeed': (KIND_IF_SPEED, 'interface_speed', None),
+    'ifInOctets': (KIND_IF_OCTETS, 'interface_bytes', 'in'),
+    'ifOutOctets': (KIND_IF_OCTETS, 'interface_bytes', 'out'),
+    'ifInErrors': (KIND_IF_COUNTER, 'interface_errors', 'in'),
+    'ifOutErrors': (KIND_IF_COUNTER, 'interface_errors', 'out'),
+    'ifInUcastPkts': (KIND_IF_COUNTER, 'interface_packets', 'in'),
+    'ifOutUcastPkts': (KIND_IF_COUNTER, 'interface_packets', 'out'),
+}
+
+RULE_OPERATORS = ('>', '<', '>=', '<=', '==', '!=')
+_RULE_UFUNCS = (np.greater, np.less, np.greater_equal, np.less_equal, np.equal, np.not_equal)
+
+# (rule id, metric name, threshold, comparison operator, device id or None for every device)
+RuleSpec = Tuple[int, str, float, str, Optional[int]]
+# (metric id, device id, metric name, value, timestamp)
+MetricRowTuple = Tuple[int, int, str, float, Any]
+
+
+def _grow(array: np.ndarray, size: int, fill) -> np.ndarray:
+    """Return array with room for at least size entries, new entries set to fill"""
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, len(array) * 2, 64), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+def classify_metric(metric_name: str) -> Tuple[int, Optional[str], str, float]:
+    """(kind, ifIndex, field, scale) for a raw metric name"""
+    parsed = parse_interface_metric(metric_name)
+    if parsed:
+        field_name, if_index, scale = parsed
+        kind = INTERFACE_FIELDS[field_name][0] if field_name in INTERFACE_FIELDS else KIND_IF_OTHER
+        return kind, if_index, field_name, float(scale)
+    name = metric_name[5:] if metric_name.startswith('snmp_') else metric_name
+    if name in DEVICE_FIELDS:
+        return KIND_GAUGE, None, name, DEVICE_FIELDS[name][2]
+    return KIND_NONE, None, metric_name, 1.0
+
+
+class CycleColumns:
+    """One cycle's samples as columns, reduced to the latest sample per series"""
+
+    def __init__(self, series: np.ndarray, values: np.ndarray, timestamps: np.ndarray, device_ids: List[int]):
+        self.series = series
+        self.values = values
+        self.timestamps = timestamps
+        self.device_ids = device_ids
+
+
+class CyclePipeline:
+    """Series registry plus array state for deltas, utilization and change detection"""
+
+    def __init__(self, families: Dict[str, MetricFamilyState]):
+        self.families = families
+        self.family_keys: List[str] = list(families)
+        self.family_codes = {key: code for code, key in enumerate(self.family_keys)}
+
+        # Raw series, indexed by series idx
+        self.series_index: Dict[Tuple[int, str], int] = {}
+        self.series_device: List[int] = []
+        self.series_field: List[Tuple[str, Optional[str]]] = []
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.scale = np.ones(0)
+        self.iface = np.full(0, -1, dtype=np.int64)
+        self.prev_value = np.full(0, np.nan)
+        self.prev_ts = np.full(0, np.nan)
+        self.primary_out = np.full(0, -1, dtype=np.int64)
+        self.util_out = np.full(0, -1, dtype=np.int64)
+        self.bound = np.zeros(0, dtype=bool)
+        self.series_seen = np.zeros(0)
+
+        # Interfaces, indexed by interface idx
+        self.iface_index: Dict[Tuple[int, str], int] = {}
+        self.iface_names: List[Optional[Tuple[str, str]]] = []
+        self.iface_info_out: List[int] = []
+        self.iface_speed = np.full(0, np.nan)
+
+        # Devices
+        self.device_series: Dict[int, List[int]] = {}
+        self.device_interfaces: Dict[int, Dict[str, int]] = {}
+        self.device_signature: Dict[int, Tuple[str, ...]] = {}
+        self.device_status_out: Dict[int, int] = {}
+
+        # Output slots: one exposition series each
+        self.out_family = np.zeros(0, dtype=np.int16)
+        self.out_last = np.full(0, np.nan)
+        self.out_touched = np.zeros(0)
+        self.out_labels: List[Tuple[str, ...]] = []
+
+        # Alarm-rule pre-check, flattened to one entry per (rule, series)
+        self.rules: List[RuleSpec] = []
+        self.rules_by_metric: Dict[str, List[RuleSpec]] = {}
+        self.rule_series = np.zeros(0, dtype=np.int64)
+        self.rule_threshold = np.zeros(0)
+        self.rule_op = np.zeros(0, dtype=np.int8)
+        self.rule_out = np.zeros(0, dtype=np.int64)
+        self._rule_slots: Dict[Tuple[int, int], int] = {}
+        self._rules_dirty = False
+
+        self.cycles = 0
+        self.samples = 0
+        self.writes = 0
+        self.touches = 0
+        self.restored = 0
+        self.pruned = 0
+        self.pruned_at = time.time()
+        self.breaches_raised = 0
+        self.breaches_cleared = 0
+        self.last_cycle_seconds = 0.0
+
+    # Registration
+
+    def _new_output(self, family_key: str) -> int:
+        slot = len(self.out_labels)
+        self.out_labels.append(())
+        self.out_family = _grow(self.out_family, slot + 1, 0)
+        self.out_last = _grow(self.out_last, slot + 1, np.nan)
+        self.out_touched = _grow(self.out_touched, slot + 1, 0.0)
+        self.out_family[slot] = self.family_codes[family_key]
+        return slot
+
+    def _relabel(self, slot: int, labels: Tuple[Any, ...]):
+        labels = tuple(str(value) for value in labels)
+        if labels != self.out_labels[slot]:
+            self.out_labels[slot] = labels
+            self.out_last[slot] = np.nan
+
+    def _interface(self, device_id: int, if_index: str) -> int:
+        key = (device_id, if_index)
+        idx = self.iface_index.get(key)
+        if idx is None:
+            idx = self.iface_index[key] = len(self.iface_names)
+            self.iface_names.append(None)
+            self.iface_info_out.append(self._new_output('interface_info'))
+            self.iface_speed = _grow(self.iface_speed, idx + 1, np.nan)
+            self.device_interfaces.setdefault(device_id, {})[if_index] = idx
+        return idx
+
+    def _register(self, device_id: int, metric_name: str) -> int:
+        idx = len(self.series_device)
+        self.series_index[(device_id, metric_name)] = idx
+        kind, if_index, field_name, scale = classify_metric(metric_name)
+
+        size = idx + 1
+        self.kind = _grow(self.kind, size, KIND_NONE)
+        self.scale = _grow(self.scale, size, 1.0)
+        self.iface = _grow(self.iface, size, -1)
+        self.prev_value = _grow(self.prev_value, size, np.nan)
+        self.prev_ts = _grow(self.prev_ts, size, np.nan)
+        self.primary_out = _grow(self.primary_out, size, -1)
+        self.util_out = _grow(self.util_out, size, -1)
+        self.bound = _grow(self.bound, size, False)
+        self.series_seen = _grow(self.series_seen, size, 0.0)
+
+        self.series_device.append(device_id)
+        self.series_field.append((field_name, if_index))
+        self.kind[idx] = kind
+        self.scale[idx] = scale
+        if if_index is not None:
+            self.iface[idx] = self._interface(device_id, if_index)
+        if kind == KIND_GAUGE:
+            self.primary_out[idx] = self._new_output(DEVICE_FIELDS[field_name][0])
+        elif kind in (KIND_IF_STATUS, KIND_IF_SPEED, KIND_IF_OCTETS, KIND_IF_COUNTER):
+            self.primary_out[idx] = self._new_output(INTERFACE_FIELDS[field_name][1])
+            if kind == KIND_IF_OCTETS:
+                self.util_out[idx] = self._new_output('interface_utilization')
+
+        self.device_series.setdefault(device_id, []).append(idx)
+        if metric_name in self.rules_by_metric:
+            self._rules_dirty = True
+        return idx
+
+    def columns(self, rows: Sequence[MetricRowTuple]) -> CycleColumns:
+        """Columnar view of a batch, keeping the last sample of each series (rows are in id order)"""
+        lookup = self.series_index
+        series_ids = []
+        for _, device_id, metric_name, _, _ in rows:
+            idx = lookup.get((device_id, metric_name))
+            series_ids.append(idx if idx is not None else self._register(device_id, metric_name))
+
+        count = len(rows)
+        series = np.fromiter(series_ids, dtype=np.int64, count=count)
+        values = np.fromiter((row[3] for row in rows), dtype=np.float64, count=count)
+        timestamps = np.fromiter(
+            (ts if isinstance(ts, (int, float)) else ts.timestamp() for ts in (row[4] for row in rows)),
+            dtype=np.float64, count=count
+        )
+
+        # Last occurrence per series: first occurrence in the reversed column
+        unique, first = np.unique(series[::-1], return_index=True)
+        last = count - 1 - first
+        device_ids = sorted({self.series_device[idx] for idx in unique.tolist()})
+        return CycleColumns(unique, values[last], timestamps[last], device_ids)
+
+    def interfaces_of(self, device_ids: Iterable[int]) -> Dict[int, List[str]]:
+        """ifIndexes seen so far for each device"""
+        return {
+            device_id: list(self.device_interfaces[device_id])
+            for device_id in device_ids if device_id in self.device_interfaces
+        }
+
+    def _bind(self, columns: CycleColumns, devices: Dict[int, Device],
+              interface_names: Dict[int, Dict[str, Tuple[str, str]]]):
+        """(Re)compute output labels for new series and for devices or interfaces whose names changed"""
+        unbound = columns.series[~self.bound[columns.series]]
+        rebind = set(unbound.tolist())
+
+        for device_id in columns.device_ids:
+            device = devices.get(device_id)
+            if device is None:
+                continue
+            signature = (device.name, device.ip_address, device.vendor or 'unknown', device.model or 'unknown')
+            if self.device_signature.get(device_id) != signature:
+                self.device_signature[device_id] = signature
+                rebind.update(self.device_series.get(device_id, ()))
+                if device_id not in self.device_status_out:
+                    self.device_status_out[device_id] = self._new_output('device_status')
+                self._relabel(self.device_status_out[device_id], (device_id,) + signature)
+
+            names = interface_names.get(device_id, {})
+            for if_index, iface in self.device_interfaces.get(device_id, {}).items():
+                name = names.get(if_index, (f"ifIndex-{if_index}", ''))
+                if self.iface_names[iface] != name:
+                    self.iface_names[iface] = name
+                    self._relabel(self.iface_info_out[iface], (device_id, device.name, name[0], if_index, name[1]))
+                    rebind.update(idx for idx in self.device_series[device_id] if self.iface[idx] == iface)
+
+        for idx in rebind:
+            device = devices.get(self.series_device[idx])
+            if device is None:
+                continue
+            self._bind_series(idx, device)
+            self.bound[idx] = True
+
+    def _bind_series(self, idx: int, device: Device):
+        field_name, if_index = self.series_field[idx]
+        kind = self.kind[idx]
+        if kind == KIND_GAUGE:
+            extra = DEVICE_FIELDS[field_name][1]
+            if extra is None:
+                labels = (device.id, device.name, device.ip_address)
+            else:
+                labels = (device.id, device.name) + extra
+            self._relabel(self.primary_out[idx], labels)
+        elif self.primary_out[idx] >= 0:
+            descr = self.iface_names[self.iface[idx]][0]
+            base = (device.id, device.name, descr, if_index)
+            qualifier = INTERFACE_FIELDS[field_name][2]
+            self._relabel(self.primary_out[idx], base if qualifier is None else base + (qualifier,))
+            if self.util_out[idx] >= 0:
+                self._relabel(self.util_out[idx], base + (qualifier,))
+
+    def set_rules(self, rules: Iterable[RuleSpec]):
+        """Replace the alarm rules used for the threshold pre-check"""
+        self.rules = [rule for rule in rules if rule[3] in RULE_OPERATORS]
+        self.rules_by_metric = {}
+        for rule in self.rules:
+            self.rules_by_metric.setdefault(rule[1], []).append(rule)
+        self._rules_dirty = True
+
+    def _rebuild_rules(self):
+        """Flatten (rule, series) pairs; output slots are reused so breach state survives reloads"""
+        series, thresholds, ops, outs = [], [], [], []
+        for (device_id, metric_name), idx in self.series_index.items():
+            for rule_id, _, threshold, comparison, scope in self.rules_by_metric.get(metric_name, ()):
+                if scope is not None and scope != device_id:
+                    continue
+                slot = self._rule_slots.get((rule_id, idx))
+                if slot is None:
+                    slot = self._rule_slots[(rule_id, idx)] = self._new_output('threshold_breach')
+                self._relabel(slot, (device_id, rule_id, metric_name))
+                series.append(idx)
+                thresholds.append(threshold)
+                ops.append(RULE_OPERATORS.index(comparison))
+                outs.append(slot)
+        self.rule_series = np.array(series, dtype=np.int64)
+        self.rule_threshold = np.array(thresholds, dtype=np.float64)
+        self.rule_op = np.array(ops, dtype=np.int8)
+        self.rule_out = np.array(outs, dtype=np.int64)
+        self._rules_dirty = False
+
+    # Per-cycle computation
+
+    def process(self, columns: CycleColumns, devices: Dict[int, Device],
+                interface_names: Dict[int, Dict[str, Tuple[str, str]]], now: Optional[float] = None) -> Dict[str, int]:
+        """Compute every output of the cycle and write the ones that changed"""
+        start = time.perf_counter()
+        now = now if now is not None else time.time()
+        self._bind(columns, devices, interface_names)
+        if self._rules_dirty:
+            self._rebuild_rules()
+
+        # Series of devices that no longer exist are left out
+        known = np.fromiter((self.series_device[idx] in devices for idx in columns.series.tolist()),
+                            dtype=bool, count=len(columns.series))
+        series = columns.series[known]
+        raw = columns.values[known]
+        ts = columns.timestamps[known]
+
+        kind = self.kind[series]
+        value = raw * self.scale[series]
+
+        # Speeds first, so octets of the same cycle use them
+        is_speed = kind == KIND_IF_SPEED
+        self.iface_speed[self.iface[series[is_speed]]] = value[is_speed]
+
+        primary = np.where(kind == KIND_IF_STATUS, (raw == 1).astype(np.float64), value)
+
+        # Utilization from counter deltas; a negative delta is a wrap or reset and is skipped
+        is_octets = kind == KIND_IF_OCTETS
+        octet_series = series[is_octets]
+        delta = value[is_octets] - self.prev_value[octet_series]
+        elapsed = ts[is_octets] - self.prev_ts[octet_series]
+        speed = self.iface_speed[self.iface[octet_series]]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            valid = (delta >= 0) & (elapsed > 0) & (speed > 0)
+            utilization = delta[valid] * 8 / elapsed[valid] / speed[valid] * 100
+        util_slots = self.util_out[octet_series[valid]]
+
+        self.prev_value[series] = value
+        self.prev_ts[series] = ts
+        self.series_seen[series] = now
+
+        has_primary = self.primary_out[series] >= 0
+        slots = [self.primary_out[series[has_primary]], util_slots]
+        values = [primary[has_primary], utilization]
+
+        # Threshold pre-check on the raw values, as the alarm manager compares them
+        breaches = self._check_rules(series, raw)
+        if breaches is not None:
+            slots.append(breaches[0])
+            values.append(breaches[1])
+
+        device_slots = [self.device_status_out[device_id] for device_id in columns.device_ids
+                        if device_id in devices and device_id in self.device_status_out]
+        slots.append(np.array(device_slots, dtype=np.int64))
+        values.append(np.array([
+            1.0 if devices[device_id].status == DeviceStatus.UP else 0.0
+            for device_id in columns.device_ids if device_id in devices and device_id in self.device_status_out
+        ], dtype=np.float64))
+
+        interface_slots = np.array(sorted({self.iface_info_out[iface] for iface in self.iface[series].tolist()
+                                           if iface >= 0}), dtype=np.int64)
+        slots.append(interface_slots)
+        values.append(np.ones(len(interface_slots)))
+
+        written = self._write(np.concatenate(slots), np.concatenate(values), now)
+
+        self.cycles += 1
+        self.samples += len(series)
+        self.last_cycle_seconds = round(time.perf_counter() - start, 4)
+        return {'series': int(len(series)), 'written': written}
+
+    def _check_rules(self, series: np.ndarray, raw: np.ndarray) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if not len(self.rule_series):
+            return None
+        current = np.full(len(self.kind), np.nan)
+        current[series] = raw
+        values = current[self.rule_series]
+        present = ~np.isnan(values)
+        breach = np.zeros(len(values), dtype=bool)
+        for code, ufunc in enumerate(_RULE_UFUNCS):
+            selected = present & (self.rule_op == code)
+            if selected.any():
+                breach[selected] = ufunc(values[selected], self.rule_threshold[selected])
+
+        slots = self.rule_out[present]
+        state = breach[present].astype(np.float64)
+        previous = self.out_last[slots]
+        self.breaches_raised += int(np.count_nonzero((state == 1) & (previous != 1)))
+        self.breaches_cleared += int(np.count_nonzero((state == 0) & (previous == 1)))
+        return slots, state
+
+    def _write(self, slots: np.ndarray, values: np.ndarray, now: float) -> int:
+        """Write changed slots to their families, and touch unchanged ones before the TTL sweep"""
+        if not len(slots):
+            return 0
+        changed = self.out_last[slots] != values  # NaN (never written) compares unequal
+        touch_due = ~changed & (now - self.out_touched[slots] >= settings.prometheus_series_ttl_seconds / 4)
+
+        changed_slots = slots[changed]
+        changed_values = values[changed]
+        families = self.out_family[changed_slots]
+        for code in np.unique(families).tolist():
+            selected = families == code
+            family_slots = changed_slots[selected]
+            state = self.families[self.family_keys[code]]
+            keys = [self.out_labels[slot] for slot in family_slots.tolist()]
+            if state.set_many(keys, changed_values[selected].tolist(), now):
+                # Slots refused by the cardinality cap are retried next cycle
+                admitted = np.fromiter((key in state.series for key in keys), dtype=bool, count=len(keys))
+                changed_values[selected] = np.where(admitted, changed_values[selected], np.nan)
+
+        self.out_last[changed_slots] = changed_values
+        self.out_touched[changed_slots] = now
+
+        touch_slots = slots[touch_due]
+        touch_families = self.out_family[touch_slots]
+        for code in np.unique(touch_families).tolist():
+            family_slots = touch_slots[touch_families == code]
+            state = self.families[self.family_keys[code]]
+            keys = [self.out_labels[slot] for slot in family_slots.tolist()]
+            missing = state.touch(keys, now)
+            if missing:
+                # Swept while the value stood still (e.g. the device was quiet past the TTL): set it again
+                lost = family_slots[missing]
+                lost_keys = [keys[position] for position in missing]
+                if state.set_many(lost_keys, self.out_last[lost].tolist(), now):
+                    admitted = np.fromiter((key in state.series for key in lost_keys), dtype=bool, count=len(lost_keys))
+                    self.out_last[lost[~admitted]] = np.nan
+                self.restored += len(lost)
+        self.out_touched[touch_slots] = now
+
+        self.writes += len(changed_slots)
+        self.touches += len(touch_slots)
+        return int(len(changed_slots))
+
+    def prune(self, cutoff: float) -> int:
+        """
+        Forget series not seen since cutoff, and the interfaces, devices and output
+        slots only they used; their exposition series have expired as well. A series
+        that comes back is registered afresh. Call between cycles only: indexes change.
+        """
+        self.pruned_at = time.time()
+        count = len(self.series_device)
+        keep = self.series_seen[:count] >= cutoff
+        kept = np.flatnonzero(keep)
+        if len(kept) == count:
+            return 0
+
+        series_map = np.full(count, -1, dtype=np.int64)
+        series_map[kept] = np.arange(len(kept))
+        iface = self.iface[kept]
+        kept_ifaces = np.unique(iface[iface >= 0])
+        iface_map = np.full(len(self.iface_names), -1, dtype=np.int64)
+        iface_map[kept_ifaces] = np.arange(len(kept_ifaces))
+        kept_devices = {self.series_device[idx] for idx in kept.tolist()}
+        rule_slots = {key: slot for key, slot in self._rule_slots.items() if keep[key[1]]}
+
+        kept_slots = np.unique(np.concatenate([
+            self.primary_out[kept],
+            self.util_out[kept],
+            np.array([self.iface_info_out[i] for i in kept_ifaces.tolist()], dtype=np.int64),
+            np.array([slot for device_id, slot in self.device_status_out.items() if device_id in kept_devices],
+                     dtype=np.int64),
+            np.array(list(rule_slots.values()), dtype=np.int64)
+        ]))
+        kept_slots = kept_slots[kept_slots >= 0]
+        slot_map = np.full(len(self.out_labels), -1, dtype=np.int64)
+        slot_map[kept_slots] = np.arange(len(kept_slots))
+
+        def remap(mapping: np.ndarray, values: np.ndarray) -> np.ndarray:
+            # -1 (none) indexes the appended -1
+            return np.append(mapping, -1)[values]
+
+        # Series
+        metric_names: List[str] = [''] * count
+        for (_, metric_name), idx in self.series_index.items():
+            metric_names[idx] = metric_name
+        kept_list = kept.tolist()
+        self.series_device = [self.series_device[idx] for idx in kept_list]
+        self.series_field = [self.series_field[idx] for idx in kept_list]
+        self.series_index = {
+            (self.series_device[new], metric_names[idx]): new for new, idx in enumerate(kept_list)
+        }
+        self.kind = self.kind[kept]
+        self.scale = self.scale[kept]
+        self.iface = remap(iface_map, iface)
+        self.prev_value = self.prev_value[kept]
+        self.prev_ts = self.prev_ts[kept]
+        self.primary_out = remap(slot_map, self.primary_out[kept])
+        self.util_out = remap(slot_map, self.util_out[kept])
+        self.bound = self.bound[kept]
+        self.series_seen = self.series_seen[kept]
+
+        # Interfaces
+        iface_keys = {idx: key for key, idx in self.iface_index.items()}
+        kept_iface_list = kept_ifaces.tolist()
+        self.iface_index = {iface_keys[idx]: new for new, idx in enumerate(kept_iface_list)}
+        self.iface_names = [self.iface_names[idx] for idx in kept_iface_list]
+        self.iface_info_out = [int(slot_map[self.iface_info_out[idx]]) for idx in kept_iface_list]
+        self.iface_speed = self.iface_speed[kept_ifaces]
+        self.device_interfaces = {}
+        for (device_id, if_index), idx in self.iface_index.items():
+            self.device_interfaces.setdefault(device_id, {})[if_index] = idx
+
+        # Devices
+        self.device_series = {}
+        for idx, device_id in enumerate(self.series_device):
+            self.device_series.setdefault(device_id, []).append(idx)
+        self.device_signature = {
+            device_id: signature for device_id, signature in self.device_signature.items() if device_id in kept_devices
+        }
+        self.device_status_out = {
+            device_id: int(slot_map[slot]) for device_id, slot in self.device_status_out.items()
+            if device_id in kept_devices
+        }
+
+        # Output slots and rule checks
+        self.out_family = self.out_family[kept_slots]
+        self.out_last = self.out_last[kept_slots]
+        self.out_touched = self.out_touched[kept_slots]
+        self.out_labels = [self.out_labels[slot] for slot in kept_slots.tolist()]
+        self._rule_slots = {
+            (rule_id, int(series_map[idx])): int(slot_map[slot]) for (rule_id, idx), slot in rule_slots.items()
+        }
+        self._rebuild_rules()
+
+        removed = count - len(kept)
+        self.pruned += removed
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'series': len(self.series_device),
+            'interfaces': len(self.iface_names),
+            'outputs': len(self.out_labels),
+            'rules': len(self.rules),
+            'rule_checks': int(len(self.rule_series)),
+            'breaching': int(np.count_nonzero(self.out_last[self.rule_out] == 1)) if len(self.rule_out) else 0,
+            'breaches_raised': self.breaches_raised,
+            'breaches_cleared': self.breaches_cleared,
+            'cycles': self.cycles,
+            'samples': self.samples,
+            'writes': self.writes,
+            'touches': self.touches,
+            'restored': self.restored,
+            'pruned': self.pruned,
+            'last_cycle_seconds': self.last_cycle_seconds
+        }
@@ -0,0 +1,71 @@
+"""
+Cached device lookup for bulk ingestion paths
+Resolves the identifiers external collectors send (device id, IP address,
+device name or hostname) to device ids without a query per sample.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select
+
+from shared.database import AsyncSessionLocal
+from shared.models import Device
+from shared.logger import get_logger
+from shared.config import settings
+
+logger = get_logger("data_ingestion")
+
+
+class DeviceIndex:
+    """In-memory id / ip / name -> device id maps, reloaded periodically"""
+
+    def __init__(self):
+        self.ids: Dict[int, str] = {}
+        self.by_ip: Dict[str, int] = {}
+        self.by_name: Dict[str, int] = {}
+        self.loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, force: bool = False):
+        """Reload when stale; a forced reload is still throttled to absorb bursts of unknown devices"""
+        age = time.time() - self.loaded_at
+        if age < settings.device_index_min_refresh_interval:
+            return
+        if not force and age < settings.device_index_refresh_interval:
+            return
+
+        async with self._lock:
+            if time.time() - self.loaded_at < settings.device_index_min_refresh_interval:
+                return
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(select(Device.id, Device.name, Device.ip_address, Device.hostname))
+                rows = result.all()
+
+            ids, by_ip, by_name = {}, {}, {}
+            for device_id, name, ip_address, hostname in rows:
+                ids[device_id] = name
+                by_ip[ip_address] = device_id
+                by_name[name] = device_id
+                if hostname:
+                    by_name.setdefault(hostname, device_id)
+            self.ids, self.by_ip, self.by_name = ids, by_ip, by_name
+            self.loaded_at = time.time()
+            logger.info("Device index loaded", devices=len(ids))
+
+    def resolve(self, device_id=None, ip_address: str = None, name: str = None) -> Optional[int]:
+        """Device id for whichever identifier is given, or None"""
+        if device_id is not None:
+            try:
+                device_id = int(device_id)
+            except (TypeError, ValueError):
+                return None
+            return device_id if device_id in self.ids else None
+        if ip_address is not None:
+            return self.by_ip.get(ip_address)
+        if name is not None:
+            return self.by_name.get(name)
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        return {'devices': len(self.ids), 'loaded_at': self.loaded_at}
@@ -0,0 +1,199 @@
+"""
+Latest-value metric state and Prometheus exposition for the Data Ingestion Service
+Series are plain dict entries keyed by label values; metric families are built
+from that state when Prometheus scrapes, and the rendered text is cached until
+the state changes. Each family caps its series count and drops series that
+have not been updated within a TTL.
+"""
+import bisect
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from prometheus_client import CollectorRegistry, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 7.5, 10.0, math.inf)
+
+
+class MetricFamilyState:
+    """Latest values for every series of one metric family"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], kind: str = 'gauge',
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: Optional[int] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self.buckets = tuple(buckets)
+        self.max_series = max_series
+        # gauge/counter: value; histogram: [bucket counts..., sum]
+        self.series: Dict[LabelValues, object] = {}
+        self.updated: Dict[LabelValues, float] = {}
+        self.version = 0
+        self.rejected = 0
+        self.evicted = 0
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _admit(self, key: LabelValues) -> bool:
+        """Track the update time; refuse new series once the family is at its cap"""
+        if key not in self.series and self.max_series is not None and len(self.series) >= self.max_series:
+            self.rejected += 1
+            self.version += 1
+            return False
+        self.updated[key] = time.time()
+        self.version += 1
+        return True
+
+    def set(self, labels: Dict[str, object], value: float) -> bool:
+        """Set a gauge, or a counter to the cumulative value reported by the device"""
+        key = self._key(labels)
+        if not self._admit(key):
+            return False
+        self.series[key] = float(value)
+        return True
+
+    def set_many(self, keys: Sequence[LabelValues], values: Sequence[float], now: Optional[float] = None) -> int:
+        """Set many series by label-value tuple with one version bump; returns how many the cap refused"""
+        now = now if now is not None else time.time()
+        series = self.series
+        updated = self.updated
+        refused = 0
+        for key, value in zip(keys, values):
+            if key not in series and self.max_series is not None and len(series) >= self.max_series:
+                refused += 1
+                continue
+            series[key] = float(value)
+            updated[key] = now
+        self.rejected += refused
+        self.version += 1
+        return refused
+
+    def touch(self, keys: Sequence[LabelValues], now: Optional[float] = None) -> List[int]:
+        """Mark unchanged series as current so the stale sweep keeps them; the rendered text stays valid.
+        Returns the positions of keys that are gone (swept), which the caller has to set again."""
+        now = now if now is not None else time.time()
+        missing = []
+        for position, key in enumerate(keys):
+            if key in self.series:
+                self.updated[key] = now
+            else:
+                missing.append(position)
+        return missing
+
+    def observe(self, labels: Dict[str, object], value: float) -> bool:
+        key = self._key(labels)
+        if not self._admit(key):
+            return False
+        state = self.series.get(key)
+        if state is None:
+            state = self.series[key] = [0] * len(self.buckets) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+        return True
+
+    def sweep(self, cutoff: float) -> int:
+        """Remove series last updated before cutoff; returns the number removed"""
+        stale = [key for key, updated in self.updated.items() if updated < cutoff]
+        for key in stale:
+            del self.series[key]
+            del self.updated[key]
+        if stale:
+            self.evicted += len(stale)
+            self.version += 1
+        return len(stale)
+
+    def family(self):
+        """Build the metric family for a scrape"""
+        if self.kind == 'counter':
+            family = CounterMetricFamily(self.name, self.documentation, labels=self.labelnames)
+            for key, value in self.series.items():
+                family.add_metric(key, value)
+        elif self.kind == 'histogram':
+            family = HistogramMetricFamily(self.name, self.documentation, labels=self.labelnames)
+            for key, state in self.series.items():
+                cumulative = 0
+                buckets = []
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    buckets.append(('+Inf' if bound == math.inf else str(bound), cumulative))
+                family.add_metric(key, buckets, state[-1])
+        else:
+            family = GaugeMetricFamily(self.name, self.documentation, labels=self.labelnames)
+            for key, value in self.series.items():
+                family.add_metric(key, value)
+        return family
+
+
+class LatestValueCollector:
+    """Custom collector that yields families straight from MetricFamilyState"""
+
+    def __init__(self):
+        self.families: Dict[str, MetricFamilyState] = {}
+
+    def add_family(self, key: str, state: MetricFamilyState) -> MetricFamilyState:
+        self.families[key] = state
+        return state
+
+    @property
+    def version(self) -> int:
+        """Changes whenever any family changes"""
+        return sum(state.version for state in self.families.values())
+
+    def sweep(self, ttl_seconds: float, now: Optional[float] = None) -> Dict[str, int]:
+        """Drop series not updated within ttl_seconds from every family"""
+        cutoff = (now if now is not None else time.time()) - ttl_seconds
+        removed = {}
+        for state in self.families.values():
+            count = state.sweep(cutoff)
+            if count:
+                removed[state.name] = count
+        return removed
+
+    def collect(self):
+        for state in self.families.values():
+            yield state.family()
+
+        # Exporter self-monitoring
+        series = GaugeMetricFamily(
+            'scnms_exporter_series', 'Series currently exposed per metric', labels=['metric']
+        )
+        rejected = CounterMetricFamily(
+            'scnms_exporter_series_rejected', 'New series rejected by the per-metric cardinality cap',
+            labels=['metric']
+        )
+        evicted = CounterMetricFamily(
+            'scnms_exporter_series_evicted', 'Series removed after their TTL expired', labels=['metric']
+        )
+        for state in self.families.values():
+            series.add_metric([state.name], len(state.series))
+            rejected.add_metric([state.name], state.rejected)
+            evicted.add_metric([state.name], state.evicted)
+        yield series
+        yield rejected
+        yield evicted
+
+    def describe(self):
+        # Avoid a collect() at registration time
+        return []
+
+
+class CachedExposition:
+    """Renders a registry and reuses the text until the collector state changes"""
+
+    def __init__(self, registry: CollectorRegistry, collector: LatestValueCollector):
+        self.registry = registry
+        self.collector = collector
+        self._cached: bytes = b''
+        self._version = -1
+
+    def render(self) -> bytes:
+        version = self.collector.version
+        if version != self._version:
+            self._cached = generate_latest(self.registry)
+            self._version = version
+        return self._cached
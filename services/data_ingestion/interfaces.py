@@ -0,0 +1,212 @@
+"""
+Interface index resolution for the Data Ingestion Service
+Metric names carry the IF-MIB column OID plus the ifIndex instance suffix
+(e.g. snmp_1.3.6.1.2.1.2.2.1.10.3). This module splits them into field and
+ifIndex, and keeps a per-device ifIndex -> (ifDescr, ifAlias) cache that is
+only re-walked when ifTableLastChange moves or sysUpTime goes backwards.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from shared.models import Device
+from shared.logger import get_logger
+from shared.config import settings
+
+logger = get_logger("data_ingestion")
+
+# IF-MIB / IF-MIB ifXTable columns -> (field, scale)
+INTERFACE_COLUMNS = {
+    '1.3.6.1.2.1.2.2.1.5': ('ifSpeed', 1),
+    '1.3.6.1.2.1.2.2.1.7': ('ifAdminStatus', 1),
+    '1.3.6.1.2.1.2.2.1.8': ('ifOperStatus', 1),
+    '1.3.6.1.2.1.2.2.1.10': ('ifInOctets', 1),
+    '1.3.6.1.2.1.2.2.1.11': ('ifInUcastPkts', 1),
+    '1.3.6.1.2.1.2.2.1.13': ('ifInDiscards', 1),
+    '1.3.6.1.2.1.2.2.1.14': ('ifInErrors', 1),
+    '1.3.6.1.2.1.2.2.1.16': ('ifOutOctets', 1),
+    '1.3.6.1.2.1.2.2.1.17': ('ifOutUcastPkts', 1),
+    '1.3.6.1.2.1.2.2.1.19': ('ifOutDiscards', 1),
+    '1.3.6.1.2.1.2.2.1.20': ('ifOutErrors', 1),
+    '1.3.6.1.2.1.31.1.1.1.6': ('ifInOctets', 1),  # ifHCInOctets
+    '1.3.6.1.2.1.31.1.1.1.10': ('ifOutOctets', 1),  # ifHCOutOctets
+    '1.3.6.1.2.1.31.1.1.1.15': ('ifSpeed', 1000000),  # ifHighSpeed, Mbit/s
+}
+
+# Symbolic names accepted as "<field>.<ifIndex>" from /ingest
+INTERFACE_FIELDS = {name for name, _ in INTERFACE_COLUMNS.values()}
+
+IF_DESCR_OID = '1.3.6.1.2.1.2.2.1.2'
+IF_ALIAS_OID = '1.3.6.1.2.1.31.1.1.1.18'
+SYS_UPTIME_OID = '1.3.6.1.2.1.1.3.0'
+IF_TABLE_LAST_CHANGE_OID = '1.3.6.1.2.1.31.1.5.0'
+
+
+def parse_interface_metric(metric_name: str) -> Optional[Tuple[str, str, int]]:
+    """Return (field, ifIndex, scale) for an interface metric name, else None"""
+    name = metric_name[5:] if metric_name.startswith('snmp_') else metric_name
+    column, _, if_index = name.rpartition('.')
+    if not if_index.isdigit():
+        return None
+    if column in INTERFACE_COLUMNS:
+        field_name, scale = INTERFACE_COLUMNS[column]
+        return field_name, if_index, scale
+    if column in INTERFACE_FIELDS:
+        return column, if_index, 1
+    return None
+
+
+def group_interface_metrics(metrics_data: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """Group interface samples by ifIndex: {ifIndex: {field: value}}"""
+    interfaces: Dict[str, Dict[str, float]] = {}
+    for metric_name, value in metrics_data.items():
+        parsed = parse_interface_metric(metric_name)
+        if not parsed:
+            continue
+        field_name, if_index, scale = parsed
+        try:
+            interfaces.setdefault(if_index, {})[field_name] = float(value) * scale
+        except (TypeError, ValueError):
+            continue
+    return interfaces
+
+
+@dataclass
+class DeviceInterfaces:
+    """Cached interface names of one device"""
+    names: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    last_change: Optional[int] = None
+    sys_uptime: Optional[int] = None
+    walked_at: float = 0.0
+    checked_at: float = 0.0
+
+
+class InterfaceIndexCache:
+    """Per-device ifIndex -> (ifDescr, ifAlias) map with change-driven refresh"""
+
+    def __init__(self):
+        self.devices: Dict[int, DeviceInterfaces] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self.walks = 0
+        self.checks = 0
+
+    async def resolve(self, device: Device, if_indexes: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+        """Names for the given ifIndexes, refreshing the device's table only when it changed"""
+        wanted = set(if_indexes)
+        lock = self._locks.setdefault(device.id, asyncio.Lock())
+        async with lock:
+            entry = self.devices.get(device.id)
+            now = time.time()
+            try:
+                if entry is None:
+                    entry = self.devices[device.id] = DeviceInterfaces()
+                    await self._walk(device, entry)
+                elif now - entry.checked_at >= settings.interface_cache_check_interval:
+                    if await self._table_changed(device, entry):
+                        await self._walk(device, entry)
+                    elif (wanted - entry.names.keys()
+                          and now - entry.walked_at >= settings.interface_cache_min_walk_interval):
+                        # Agents without ifTableLastChange: fall back to a throttled walk
+                        await self._walk(device, entry)
+            except Exception as e:
+                logger.warning("Interface table refresh failed", device_id=device.id, error=str(e))
+
+        return {if_index: entry.names[if_index] for if_index in wanted if if_index in entry.names}
+
+    def invalidate(self, device_id: int):
+        self.devices.pop(device_id, None)
+
+    async def _table_changed(self, device: Device, entry: DeviceInterfaces) -> bool:
+        values = await asyncio.get_running_loop().run_in_executor(
+            None, _snmp_get, device.ip_address, device.snmp_community, [SYS_UPTIME_OID, IF_TABLE_LAST_CHANGE_OID]
+        )
+        self.checks += 1
+        entry.checked_at = time.time()
+
+        uptime = _as_int(values.get(SYS_UPTIME_OID))
+        last_change = _as_int(values.get(IF_TABLE_LAST_CHANGE_OID))
+        rebooted = uptime is not None and entry.sys_uptime is not None and uptime < entry.sys_uptime
+        changed = last_change is not None and last_change != entry.last_change
+
+        entry.sys_uptime = uptime if uptime is not None else entry.sys_uptime
+        return rebooted or changed
+
+    async def _walk(self, device: Device, entry: DeviceInterfaces):
+        loop = asyncio.get_running_loop()
+        community = device.snmp_community
+        descrs, aliases, status = await asyncio.gather(
+            loop.run_in_executor(None, _snmp_walk, device.ip_address, community, IF_DESCR_OID),
+            loop.run_in_executor(None, _snmp_walk, device.ip_address, community, IF_ALIAS_OID),
+            loop.run_in_executor(None, _snmp_get, device.ip_address, community, [SYS_UPTIME_OID, IF_TABLE_LAST_CHANGE_OID])
+        )
+        self.walks += 1
+
+        entry.names = {if_index: (descr, aliases.get(if_index, '')) for if_index, descr in descrs.items()}
+        entry.sys_uptime = _as_int(status.get(SYS_UPTIME_OID))
+        entry.last_change = _as_int(status.get(IF_TABLE_LAST_CHANGE_OID))
+        entry.walked_at = entry.checked_at = time.time()
+        logger.info("Interface table refreshed", device_id=device.id, interfaces=len(entry.names))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'devices': len(self.devices),
+            'interfaces': sum(len(entry.names) for entry in self.devices.values()),
+            'walks': self.walks,
+            'checks': self.checks
+        }
+
+
+def _as_int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _snmp_target(ip_address: str, community: Optional[str]):
+    from pysnmp.hlapi import SnmpEngine, CommunityData, UdpTransportTarget, ContextData
+    return (
+        SnmpEngine(),
+        CommunityData(community or settings.snmp_community),
+        UdpTransportTarget((ip_address, 161), timeout=settings.snmp_timeout, retries=settings.snmp_retries),
+        ContextData()
+    )
+
+
+def _snmp_get(ip_address: str, community: Optional[str], oids: Iterable[str]) -> Dict[str, str]:
+    """Blocking SNMP GET; missing objects are left out of the result"""
+    from pysnmp.hlapi import getCmd, ObjectType, ObjectIdentity
+    from pysnmp.proto.rfc1905 import NoSuchObject, NoSuchInstance
+
+    results = {}
+    error_indication, error_status, _, var_binds = next(getCmd(
+        *_snmp_target(ip_address, community),
+        *[ObjectType(ObjectIdentity(oid)) for oid in oids]
+    ))
+    if error_indication or error_status:
+        raise RuntimeError(str(error_indication or error_status.prettyPrint()))
+    for name, value in var_binds:
+        if not isinstance(value, (NoSuchObject, NoSuchInstance)):
+            results[str(name)] = str(value)
+    return results
+
+
+def _snmp_walk(ip_address: str, community: Optional[str], column_oid: str) -> Dict[str, str]:
+    """Blocking walk of one table column: {ifIndex: value}"""
+    from pysnmp.hlapi import nextCmd, ObjectType, ObjectIdentity
+
+    results = {}
+    prefix = column_oid + '.'
+    for error_indication, error_status, _, var_binds in nextCmd(
+        *_snmp_target(ip_address, community),
+        ObjectType(ObjectIdentity(column_oid)),
+        lexicographicMode=False
+    ):
+        if error_indication or error_status:
+            break
+        for name, value in var_binds:
+            oid = str(name)
+            if oid.startswith(prefix):
+                results[oid[len(prefix):]] = str(value)
+    return results
@@ -3,21 +3,38 @@ Data Ingestion Service - SCNMS Microservice
 Handles data formatting and pushing to Prometheus
 """
 import asyncio
+import gzip
 import json
 import time
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc
-from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, desc, select
+from datetime import datetime
 import httpx
-from prometheus_client import CollectorRegistry, Gauge, Counter, Histogram, push_to_gateway
+from prometheus_client import CollectorRegistry, push_to_gateway
 
-from shared.database import get_db, get_redis
-from shared.models import Device, Metric, DeviceStatus
-from shared.schemas import Metric as MetricSchema, HealthCheck
+from shared.database import AsyncSessionLocal, get_async_db, get_redis, render_pool_metrics
+from shared.models import AlarmRule, Device, Metric, RetentionPolicy
+from shared.schemas import (
+    Metric as MetricSchema, HealthCheck,
+    RetentionPolicy as RetentionPolicySchema, RetentionPolicyCreate
+)
 from shared.logger import configure_logging, get_logger
 from shared.config import settings
+from services.data_ingestion.retention import RetentionPolicyEngine
+from services.data_ingestion.watermark import MetricWatermarkReader
+from services.data_ingestion.exposition import CachedExposition, LatestValueCollector, MetricFamilyState
+from services.data_ingestion.remote_write import RemoteSample, RemoteWriteSender, sanitize_metric_name
+from services.data_ingestion.interfaces import InterfaceIndexCache
+from services.data_ingestion.cycle import CycleColumns, CyclePipeline
+from services.data_ingestion.device_index import DeviceIndex
+from services.data_ingestion.batch_writer import MetricBatchWriter
+from services.data_ingestion.bulk import BulkIngestResult, ingest_columnar, ingest_ndjson, submit_rows
+from services.data_ingestion.receivers import SeriesResolver, TimeWindow, parse_line_protocol, parse_remote_write
 
 # Configure logging
 configure_logging()
@@ -31,281 +48,188 @@ app = FastAPI(
 
 
 class PrometheusMetrics:
-    """Prometheus metrics collector and pusher"""
+    """Latest-value metric state, exposed on scrape and optionally pushed"""
     
     def __init__(self):
         self.registry = CollectorRegistry()
-        self.metrics = {}
+        self.collector = LatestValueCollector()
+        self.registry.register(self.collector)
+        self.exposition = CachedExposition(self.registry, self.collector)
+        self.metrics = self.collector.families
         self._initialize_metrics()
     
     def _initialize_metrics(self):
-        """Initialize Prometheus metrics"""
+        """Initialize Prometheus metric families"""
         # Device metrics
-        self.metrics['device_status'] = Gauge(
+        self.collector.add_family('device_status', MetricFamilyState(
             'scnms_device_status',
             'Device status (1=up, 0=down)',
             ['device_id', 'device_name', 'ip_address', 'vendor', 'model'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['device_uptime'] = Gauge(
+        self.collector.add_family('device_uptime', MetricFamilyState(
             'scnms_device_uptime_seconds',
             'Device uptime in seconds',
             ['device_id', 'device_name', 'ip_address'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
         # Interface metrics
-        self.metrics['interface_status'] = Gauge(
+        self.collector.add_family('interface_status', MetricFamilyState(
             'scnms_interface_status',
             'Interface status (1=up, 0=down)',
             ['device_id', 'device_name', 'interface_name', 'interface_index'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
+        
+        self.collector.add_family('interface_info', MetricFamilyState(
+            'scnms_interface_info',
+            'Interface descriptor and alias by ifIndex',
+            ['device_id', 'device_name', 'interface_name', 'interface_index', 'interface_alias'],
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['interface_speed'] = Gauge(
+        self.collector.add_family('interface_speed', MetricFamilyState(
             'scnms_interface_speed_bps',
             'Interface speed in bits per second',
             ['device_id', 'device_name', 'interface_name', 'interface_index'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['interface_utilization'] = Gauge(
+        self.collector.add_family('interface_utilization', MetricFamilyState(
             'scnms_interface_utilization_percent',
             'Interface utilization percentage',
             ['device_id', 'device_name', 'interface_name', 'interface_index', 'direction'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['interface_bytes'] = Counter(
+        self.collector.add_family('interface_bytes', MetricFamilyState(
             'scnms_interface_bytes_total',
             'Total bytes transmitted/received',
             ['device_id', 'device_name', 'interface_name', 'interface_index', 'direction'],
-            registry=self.registry
-        )
+            kind='counter',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['interface_packets'] = Counter(
+        self.collector.add_family('interface_packets', MetricFamilyState(
             'scnms_interface_packets_total',
             'Total packets transmitted/received',
             ['device_id', 'device_name', 'interface_name', 'interface_index', 'direction'],
-            registry=self.registry
-        )
+            kind='counter',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['interface_errors'] = Counter(
+        self.collector.add_family('interface_errors', MetricFamilyState(
             'scnms_interface_errors_total',
             'Total interface errors',
             ['device_id', 'device_name', 'interface_name', 'interface_index', 'error_type'],
-            registry=self.registry
-        )
+            kind='counter',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
         # System metrics
-        self.metrics['cpu_utilization'] = Gauge(
+        self.collector.add_family('cpu_utilization', MetricFamilyState(
             'scnms_cpu_utilization_percent',
             'CPU utilization percentage',
             ['device_id', 'device_name', 'cpu_index'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['memory_utilization'] = Gauge(
+        self.collector.add_family('memory_utilization', MetricFamilyState(
             'scnms_memory_utilization_percent',
             'Memory utilization percentage',
             ['device_id', 'device_name'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['temperature'] = Gauge(
+        self.collector.add_family('temperature', MetricFamilyState(
             'scnms_temperature_celsius',
             'Device temperature in Celsius',
             ['device_id', 'device_name', 'sensor_name'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
         # Network metrics
-        self.metrics['latency'] = Histogram(
+        self.collector.add_family('latency', MetricFamilyState(
             'scnms_latency_seconds',
             'Network latency in seconds',
             ['device_id', 'device_name', 'target'],
-            registry=self.registry
-        )
+            kind='histogram',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['packet_loss'] = Gauge(
+        self.collector.add_family('packet_loss', MetricFamilyState(
             'scnms_packet_loss_percent',
             'Packet loss percentage',
             ['device_id', 'device_name', 'target'],
-            registry=self.registry
-        )
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
         # Service metrics
-        self.metrics['polling_duration'] = Histogram(
+        self.collector.add_family('polling_duration', MetricFamilyState(
             'scnms_polling_duration_seconds',
             'Polling duration in seconds',
             ['device_id', 'device_name', 'protocol'],
-            registry=self.registry
-        )
+            kind='histogram',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
         
-        self.metrics['polling_errors'] = Counter(
+        self.collector.add_family('polling_errors', MetricFamilyState(
             'scnms_polling_errors_total',
             'Total polling errors',
             ['device_id', 'device_name', 'protocol', 'error_type'],
-            registry=self.registry
-        )
+            kind='counter',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
+        
+        # Alarm-rule pre-check (1 while the latest value meets the rule condition)
+        self.collector.add_family('threshold_breach', MetricFamilyState(
+            'scnms_threshold_breached',
+            'Latest value meets the alarm rule threshold (1=breached)',
+            ['device_id', 'rule_id', 'metric_name'],
+            kind='gauge',
+            max_series=settings.prometheus_max_series_per_metric
+        ))
     
-    def update_device_metrics(self, device: Device, metrics_data: Dict[str, Any]):
-        """Update device-level metrics"""
-        try:
-            # Device status
-            status_value = 1 if device.status == DeviceStatus.UP else 0
-            self.metrics['device_status'].labels(
-                device_id=device.id,
-                device_name=device.name,
-                ip_address=device.ip_address,
-                vendor=device.vendor or 'unknown',
-                model=device.model or 'unknown'
-            ).set(status_value)
-            
-            # Device uptime
-            if 'sysUpTime' in metrics_data:
-                uptime = self._parse_uptime(metrics_data['sysUpTime'])
-                self.metrics['device_uptime'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    ip_address=device.ip_address
-                ).set(uptime)
-            
-            # System metrics
-            if 'cpu_utilization' in metrics_data:
-                cpu_value = float(metrics_data['cpu_utilization'])
-                self.metrics['cpu_utilization'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    cpu_index='0'
-                ).set(cpu_value)
-            
-            if 'memory_utilization' in metrics_data:
-                memory_value = float(metrics_data['memory_utilization'])
-                self.metrics['memory_utilization'].labels(
-                    device_id=device.id,
-                    device_name=device.name
-                ).set(memory_value)
-            
-        except Exception as e:
-            logger.error("Failed to update device metrics", device_id=device.id, error=str(e))
+    def sweep_stale_series(self) -> int:
+        """Remove series that have not been updated within the TTL"""
+        removed = self.collector.sweep(settings.prometheus_series_ttl_seconds)
+        if removed:
+            logger.info("Evicted stale series", evicted=removed)
+        return sum(removed.values())
     
-    def update_interface_metrics(self, device: Device, interface_data: Dict[str, Any]):
-        """Update interface-level metrics"""
-        try:
-            interface_name = interface_data.get('interface_name', 'unknown')
-            interface_index = interface_data.get('interface_index', '0')
-            
-            # Interface status
-            if 'ifOperStatus' in interface_data:
-                status_value = 1 if interface_data['ifOperStatus'] == '1' else 0
-                self.metrics['interface_status'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    interface_name=interface_name,
-                    interface_index=interface_index
-                ).set(status_value)
-            
-            # Interface speed
-            if 'ifSpeed' in interface_data:
-                speed = float(interface_data['ifSpeed'])
-                self.metrics['interface_speed'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    interface_name=interface_name,
-                    interface_index=interface_index
-                ).set(speed)
-            
-            # Interface utilization (calculated from octets and speed)
-            if 'ifInOctets' in interface_data and 'ifSpeed' in interface_data:
-                in_octets = float(interface_data['ifInOctets'])
-                speed = float(interface_data['ifSpeed'])
-                if speed > 0:
-                    utilization = (in_octets * 8) / speed * 100
-                    self.metrics['interface_utilization'].labels(
-                        device_id=device.id,
-                        device_name=device.name,
-                        interface_name=interface_name,
-                        interface_index=interface_index,
-                        direction='in'
-                    ).set(utilization)
-            
-            if 'ifOutOctets' in interface_data and 'ifSpeed' in interface_data:
-                out_octets = float(interface_data['ifOutOctets'])
-                speed = float(interface_data['ifSpeed'])
-                if speed > 0:
-                    utilization = (out_octets * 8) / speed * 100
-                    self.metrics['interface_utilization'].labels(
-                        device_id=device.id,
-                        device_name=device.name,
-                        interface_name=interface_name,
-                        interface_index=interface_index,
-                        direction='out'
-                    ).set(utilization)
-            
-            # Interface counters
-            if 'ifInOctets' in interface_data:
-                in_octets = float(interface_data['ifInOctets'])
-                self.metrics['interface_bytes'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    interface_name=interface_name,
-                    interface_index=interface_index,
-                    direction='in'
-                ).inc(in_octets)
-            
-            if 'ifOutOctets' in interface_data:
-                out_octets = float(interface_data['ifOutOctets'])
-                self.metrics['interface_bytes'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    interface_name=interface_name,
-                    interface_index=interface_index,
-                    direction='out'
-                ).inc(out_octets)
-            
-            # Interface errors
-            if 'ifInErrors' in interface_data:
-                in_errors = float(interface_data['ifInErrors'])
-                self.metrics['interface_errors'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    interface_name=interface_name,
-                    interface_index=interface_index,
-                    error_type='in'
-                ).inc(in_errors)
-            
-            if 'ifOutErrors' in interface_data:
-                out_errors = float(interface_data['ifOutErrors'])
-                self.metrics['interface_errors'].labels(
-                    device_id=device.id,
-                    device_name=device.name,
-                    interface_name=interface_name,
-                    interface_index=interface_index,
-                    error_type='out'
-                ).inc(out_errors)
-            
-        except Exception as e:
-            logger.error("Failed to update interface metrics", device_id=device.id, error=str(e))
+    def cardinality(self) -> Dict[str, Dict[str, int]]:
+        """Series, rejected and evicted counts per metric family"""
+        return {
+            state.name: {
+                'series': len(state.series),
+                'max_series': state.max_series,
+                'rejected': state.rejected,
+                'evicted': state.evicted
+            }
+            for state in self.collector.families.values()
+        }
     
-    def _parse_uptime(self, uptime_str: str) -> float:
-        """Parse SNMP uptime string to seconds"""
-        try:
-            # SNMP uptime format: "123456:12:34:56.78"
-            parts = uptime_str.split(':')
-            if len(parts) >= 4:
-                days = int(parts[0])
-                hours = int(parts[1])
-                minutes = int(parts[2])
-                seconds = float(parts[3])
-                return days * 86400 + hours * 3600 + minutes * 60 + seconds
-            return 0.0
-        except (ValueError, IndexError):
-            return 0.0
+    def render(self) -> bytes:
+        """Exposition text, re-rendered only after the state changed"""
+        return self.exposition.render()
     
     async def push_metrics(self):
-        """Push metrics to Prometheus Pushgateway"""
+        """Push metrics to Prometheus Pushgateway, if enabled"""
+        if not settings.prometheus_pushgateway_enabled:
+            return
+        
         try:
             push_to_gateway(
                 settings.prometheus_pushgateway_url,
@@ -322,6 +246,11 @@ class DataIngestionService:
     
     def __init__(self):
         self.prometheus_metrics = PrometheusMetrics()
+        self.metric_reader = MetricWatermarkReader("prometheus_exporter")
+        self.remote_write = RemoteWriteSender()
+        self.interface_cache = InterfaceIndexCache()
+        self.cycle = CyclePipeline(self.prometheus_metrics.metrics)
+        self.rules_loaded_at = 0.0
         self.redis = get_redis()
         self.running = False
     
@@ -333,7 +262,7 @@ class DataIngestionService:
         while self.running:
             try:
                 # Process metrics from database
-                await self._process_metrics()
+                processed = await self._process_metrics()
                 
                 # Process Redis messages
                 await self._process_redis_messages()
@@ -341,8 +270,9 @@ class DataIngestionService:
                 # Push metrics to Prometheus
                 await self.prometheus_metrics.push_metrics()
                 
-                # Wait before next iteration
-                await asyncio.sleep(30)  # Process every 30 seconds
+                # Wait before next iteration unless a backlog is still being drained
+                if processed < settings.ingestion_max_rows_per_cycle:
+                    await asyncio.sleep(30)  # Process every 30 seconds
                 
             except Exception as e:
                 logger.error("Data ingestion error", error=str(e))
@@ -353,77 +283,91 @@ class DataIngestionService:
         self.running = False
         logger.info("Data ingestion service stopped")
     
-    async def _process_metrics(self, db: Session = None):
-        """Process metrics from database"""
-        if not db:
-            return
-        
+    async def _process_metrics(self) -> int:
+        """Process metrics written since the last checkpoint; returns rows processed"""
+        processed = 0
         try:
-            # Get recent metrics (last 5 minutes)
-            cutoff_time = datetime.now() - timedelta(minutes=5)
-            metrics = db.query(Metric).filter(
-                Metric.timestamp >= cutoff_time
-            ).order_by(Metric.timestamp.desc()).all()
-            
-            # Group metrics by device
-            device_metrics = {}
-            for metric in metrics:
-                if metric.device_id not in device_metrics:
-                    device_metrics[metric.device_id] = []
-                device_metrics[metric.device_id].append(metric)
-            
-            # Process metrics for each device
-            for device_id, device_metric_list in device_metrics.items():
-                device = db.query(Device).filter(Device.id == device_id).first()
-                if not device:
-                    continue
+            await self._refresh_rules()
+            self._prune_series()
+            async for batch in self.metric_reader.batches():
+                columns = self.cycle.columns(batch)
                 
-                # Convert metrics to dictionary
-                metrics_data = {}
-                for metric in device_metric_list:
-                    metrics_data[metric.metric_name] = metric.metric_value
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(select(Device).where(Device.id.in_(columns.device_ids)))
+                    devices = {device.id: device for device in result.scalars().all()}
                 
-                # Update Prometheus metrics
-                self.prometheus_metrics.update_device_metrics(device, metrics_data)
+                # Update Prometheus metrics for the whole batch at once
+                interface_names = await self._interface_names(columns, devices)
+                self.cycle.process(columns, devices, interface_names)
                 
-                # Process interface metrics
-                await self._process_interface_metrics(device, metrics_data)
+                # Forward every raw sample, not just the latest, to remote storage
+                if self.remote_write.running:
+                    await self.remote_write.submit(self._remote_samples(batch, devices))
+                
+                processed += len(batch)
+            
+            if processed:
+                logger.info("Processed new metrics", count=processed, last_metric_id=self.metric_reader.watermark)
             
         except Exception as e:
             logger.error("Failed to process metrics", error=str(e))
+        
+        return processed
     
-    async def _process_interface_metrics(self, device: Device, metrics_data: Dict[str, Any]):
-        """Process interface-specific metrics"""
-        try:
-            # Group interface metrics by interface index
-            interface_metrics = {}
-            
-            for metric_name, value in metrics_data.items():
-                if 'interface' in metric_name.lower():
-                    # Extract interface index from metric name
-                    # This is a simplified approach - in production, you'd have better parsing
-                    if 'ifInOctets' in metric_name or 'ifOutOctets' in metric_name:
-                        interface_index = '1'  # Simplified - would extract from OID
-                        if interface_index not in interface_metrics:
-                            interface_metrics[interface_index] = {}
-                        
-                        if 'ifInOctets' in metric_name:
-                            interface_metrics[interface_index]['ifInOctets'] = value
-                        elif 'ifOutOctets' in metric_name:
-                            interface_metrics[interface_index]['ifOutOctets'] = value
-                        elif 'ifSpeed' in metric_name:
-                            interface_metrics[interface_index]['ifSpeed'] = value
-                        elif 'ifOperStatus' in metric_name:
-                            interface_metrics[interface_index]['ifOperStatus'] = value
-            
-            # Update interface metrics
-            for interface_index, interface_data in interface_metrics.items():
-                interface_data['interface_index'] = interface_index
-                interface_data['interface_name'] = f"interface-{interface_index}"
-                self.prometheus_metrics.update_interface_metrics(device, interface_data)
-            
-        except Exception as e:
-            logger.error("Failed to process interface metrics", device_id=device.id, error=str(e))
+    def _prune_series(self):
+        """Between cycles, drop pipeline state of series the TTL sweep has expired"""
+        now = time.time()
+        if now - self.cycle.pruned_at < settings.prometheus_sweep_interval:
+            return
+        pruned = self.cycle.prune(now - settings.prometheus_series_ttl_seconds)
+        if pruned:
+            logger.info("Pruned stale series from the ingestion cycle", series=pruned)
+    
+    async def _refresh_rules(self, force: bool = False):
+        """Reload enabled alarm rules for the threshold pre-check"""
+        if not force and time.time() - self.rules_loaded_at < settings.ingestion_rule_refresh_interval:
+            return
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(
+                    AlarmRule.id, AlarmRule.metric_name, AlarmRule.threshold_value,
+                    AlarmRule.comparison_operator, AlarmRule.device_id
+                )
+                .where(AlarmRule.enabled == True)
+            )
+            self.cycle.set_rules(result.all())
+        self.rules_loaded_at = time.time()
+    
+    def _remote_samples(self, batch: List[tuple], devices: Dict[int, Device]) -> List[RemoteSample]:
+        """Convert metric rows into remote_write samples"""
+        samples = []
+        for _, device_id, metric_name, metric_value, timestamp in batch:
+            device = devices.get(device_id)
+            if not device:
+                continue
+            labels = (
+                ('__name__', f"scnms_{sanitize_metric_name(metric_name)}"),
+                ('device_id', str(device_id)),
+                ('device_name', device.name),
+                ('instance', device.ip_address),
+                ('job', 'scnms-data-ingestion'),
+            )
+            samples.append((labels, float(metric_value), int(timestamp.timestamp() * 1000)))
+        return samples
+    
+    async def _interface_names(self, columns: CycleColumns,
+                               devices: Dict[int, Device]) -> Dict[int, Dict[str, Tuple[str, str]]]:
+        """ifIndex -> (ifDescr, ifAlias) for the interfaces of the devices in this cycle"""
+        names = {}
+        for device_id, if_indexes in self.cycle.interfaces_of(columns.device_ids).items():
+            device = devices.get(device_id)
+            if not device or not device.snmp_enabled:
+                continue
+            try:
+                names[device_id] = await self.interface_cache.resolve(device, if_indexes)
+            except Exception as e:
+                logger.error("Failed to resolve interface names", device_id=device_id, error=str(e))
+        return names
     
     async def _process_redis_messages(self):
         """Process messages from Redis"""
@@ -464,6 +408,27 @@ class DataIngestionService:
 
 # Initialize service
 ingestion_service = DataIngestionService()
+retention_engine = RetentionPolicyEngine()
+device_index = DeviceIndex()
+metric_writer = MetricBatchWriter()
+series_resolver = SeriesResolver(device_index)
+receiver_stats: Dict[str, Dict[str, Any]] = {}
+
+
+@app.on_event("startup")
+async def startup_event():
+    """Start background tasks"""
+    asyncio.create_task(retention_task())
+    asyncio.create_task(series_sweep_task())
+    await ingestion_service.remote_write.start()
+    await metric_writer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Write queued bulk samples and spill queued remote_write samples"""
+    await metric_writer.stop()
+    await ingestion_service.remote_write.stop()
 
 
 @app.get("/health", response_model=HealthCheck)
@@ -476,23 +441,37 @@ async def health_check():
     )
 
 
+@app.get("/db-pool/metrics")
+async def db_pool_metrics():
+    """Database connection pool metrics in Prometheus text format"""
+    return Response(content=render_pool_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/ingest")
 async def ingest_metrics(
     device_id: int,
     metrics_data: Dict[str, Any],
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Manually ingest metrics for a device"""
     try:
-        device = db.query(Device).filter(Device.id == device_id).first()
+        device = await db.get(Device, device_id)
         if not device:
             raise HTTPException(status_code=404, detail="Device not found")
         
-        # Update Prometheus metrics
-        ingestion_service.prometheus_metrics.update_device_metrics(device, metrics_data)
-        
-        # Process interface metrics if present
-        await ingestion_service._process_interface_metrics(device, metrics_data)
+        # Same path as the ingestion cycle, as a one-device batch
+        now = time.time()
+        rows = []
+        for metric_name, value in metrics_data.items():
+            try:
+                rows.append((0, device_id, metric_name, float(value), now))
+            except (TypeError, ValueError):
+                continue
+        if rows:
+            columns = ingestion_service.cycle.columns(rows)
+            devices = {device.id: device}
+            interface_names = await ingestion_service._interface_names(columns, devices)
+            ingestion_service.cycle.process(columns, devices, interface_names)
         
         logger.info("Metrics ingested", device_id=device_id, metric_count=len(metrics_data))
         
@@ -503,24 +482,141 @@ async def ingest_metrics(
         raise HTTPException(status_code=500, detail=f"Failed to ingest metrics: {str(e)}")
 
 
+@app.post("/ingest/bulk")
+async def ingest_bulk(request: Request):
+    """
+    Ingest samples for many devices as NDJSON (streamed, one
+    {"device_id"|"device_ip"|"device_name", "metric_name", "value", "timestamp", "unit"}
+    object per line) or as one columnar JSON object of equal-length arrays.
+    Returns 429 with the counts accepted so far when the writer queue stays full.
+    """
+    if not metric_writer.has_room():
+        return _queue_full_response()
+    
+    await device_index.refresh()
+    media_type = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    
+    try:
+        if media_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonlines'):
+            result = await ingest_ndjson(request.stream(), device_index, metric_writer)
+        else:
+            try:
+                payload = json.loads(await request.body())
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+            result = await ingest_columnar(payload, device_index, metric_writer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body = result.as_dict(metric_writer)
+    if result.backpressure:
+        logger.warning("Bulk ingest hit backpressure", accepted=result.accepted, queued_rows=metric_writer.queued)
+        return _queue_full_response(body)
+    return body
+
+
+def _queue_full_response(body: Dict[str, Any] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=429,
+        headers={"Retry-After": "1"},
+        content={"detail": "Ingest queue full", **(body or metric_writer.stats())}
+    )
+
+
+def _receiver_window() -> TimeWindow:
+    now = time.time()
+    return TimeWindow(now - settings.metric_retention_days * 86400, now + settings.ingest_max_future_seconds)
+
+
+def _record_receiver(name: str, result: BulkIngestResult):
+    """Accumulate per-receiver counters; agents do not read response bodies"""
+    stats = receiver_stats.setdefault(name, {'requests': 0, 'accepted': 0, 'rejected': 0, 'rejected_by_reason': {}})
+    stats['requests'] += 1
+    stats['accepted'] += result.accepted
+    stats['rejected'] += result.rejected
+    for reason, count in result.reasons.items():
+        stats['rejected_by_reason'][reason] = stats['rejected_by_reason'].get(reason, 0) + count
+
+
+@app.post("/api/v1/write")
+async def receive_remote_write(request: Request):
+    """Prometheus remote_write receiver (snappy-compressed protobuf)"""
+    if not metric_writer.has_room():
+        return _queue_full_response()
+    
+    await device_index.refresh()
+    body = await request.body()
+    result = BulkIngestResult()
+    try:
+        rows = await run_in_threadpool(parse_remote_write, body, series_resolver, _receiver_window(), result)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await submit_rows(rows, metric_writer, result)
+    _record_receiver('remote_write', result)
+    if result.backpressure:
+        return _queue_full_response(result.as_dict(metric_writer))
+    return Response(status_code=204)
+
+
+@app.post("/write")
+@app.post("/api/v2/write")
+async def receive_line_protocol(request: Request, precision: str = "ns"):
+    """InfluxDB line protocol receiver (v1 /write and v2 /api/v2/write)"""
+    if not metric_writer.has_room():
+        return _queue_full_response()
+    
+    await device_index.refresh()
+    body = await request.body()
+    if request.headers.get('content-encoding', '').lower() == 'gzip':
+        body = await run_in_threadpool(gzip.decompress, body)
+    
+    result = BulkIngestResult()
+    try:
+        text = body.decode('utf-8')
+        rows = await run_in_threadpool(
+            parse_line_protocol, text, precision, series_resolver, _receiver_window(), time.time(), result
+        )
+    except (ValueError, OSError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    await submit_rows(rows, metric_writer, result)
+    _record_receiver('line_protocol', result)
+    if result.backpressure:
+        return _queue_full_response(result.as_dict(metric_writer))
+    return Response(status_code=204)
+
+
+@app.get("/ingest/stats")
+async def get_ingest_stats():
+    """Batched writer queue, throughput and receiver counters"""
+    return {
+        "writer": metric_writer.stats(),
+        "device_index": device_index.stats(),
+        "receivers": receiver_stats,
+        "cached_series": len(series_resolver.cache)
+    }
+
+
 @app.get("/metrics/{device_id}")
 async def get_device_metrics(
     device_id: int,
     start_time: datetime = None,
     end_time: datetime = None,
     limit: int = 1000,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get metrics for a specific device"""
     try:
-        query = db.query(Metric).filter(Metric.device_id == device_id)
+        query = select(Metric).where(Metric.device_id == device_id)
         
         if start_time:
-            query = query.filter(Metric.timestamp >= start_time)
+            query = query.where(Metric.timestamp >= start_time)
         if end_time:
-            query = query.filter(Metric.timestamp <= end_time)
+            query = query.where(Metric.timestamp <= end_time)
         
-        metrics = query.order_by(desc(Metric.timestamp)).limit(limit).all()
+        result = await db.execute(query.order_by(desc(Metric.timestamp)).limit(limit))
+        metrics = result.scalars().all()
         
         return {
             "device_id": device_id,
@@ -547,15 +643,134 @@ async def stop_ingestion():
     return {"message": "Data ingestion stopped"}
 
 
+@app.get("/ingestion/checkpoint")
+async def get_ingestion_checkpoint():
+    """Current watermark of the incremental metrics reader"""
+    return ingestion_service.metric_reader.stats()
+
+
+@app.get("/ingestion/pipeline")
+async def get_ingestion_pipeline_stats():
+    """Series, output and threshold pre-check counters of the vectorized cycle"""
+    return ingestion_service.cycle.stats()
+
+
+# Retention Policies
+
+@app.get("/retention/policies", response_model=List[RetentionPolicySchema])
+async def list_retention_policies(db: AsyncSession = Depends(get_async_db)):
+    """List retention policies in evaluation order"""
+    result = await db.execute(
+        select(RetentionPolicy).order_by(RetentionPolicy.priority, RetentionPolicy.id)
+    )
+    return result.scalars().all()
+
+
+@app.post("/retention/policies", response_model=RetentionPolicySchema)
+async def create_retention_policy(policy: RetentionPolicyCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create new retention policy"""
+    try:
+        values = policy.model_dump()
+        values['rollup_ttls'] = json.dumps({str(res): ttl for res, ttl in policy.rollup_ttls.items()})
+        db_policy = RetentionPolicy(**values)
+        db.add(db_policy)
+        await db.commit()
+        await db.refresh(db_policy)
+        
+        logger.info("Retention policy created", policy_name=policy.name, pattern=policy.metric_pattern)
+        return db_policy
+        
+    except Exception as e:
+        logger.error("Failed to create retention policy", error=str(e))
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Failed to create retention policy")
+
+
+@app.delete("/retention/policies/{policy_id}")
+async def delete_retention_policy(policy_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Delete retention policy"""
+    policy = await db.get(RetentionPolicy, policy_id)
+    if not policy:
+        raise HTTPException(status_code=404, detail="Retention policy not found")
+    
+    await db.delete(policy)
+    await db.commit()
+    
+    logger.info("Retention policy deleted", policy_id=policy_id)
+    return {"message": "Retention policy deleted successfully"}
+
+
+@app.post("/retention/run")
+async def run_retention():
+    """Enforce retention policies now and return the report"""
+    try:
+        return await retention_engine.enforce()
+    except Exception as e:
+        logger.error("Retention run failed", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Retention run failed: {str(e)}")
+
+
+@app.get("/retention/report")
+async def get_retention_report():
+    """Report from the most recent retention run"""
+    return retention_engine.last_report or {"message": "Retention has not run yet"}
+
+
+# Background Tasks
+
+async def retention_task():
+    """Background task to enforce metric retention policies"""
+    while True:
+        try:
+            await asyncio.sleep(settings.retention_interval)
+            await retention_engine.enforce()
+        except Exception as e:
+            logger.error("Retention task failed", error=str(e))
+
+
+async def series_sweep_task():
+    """Background task to evict series that stopped being updated"""
+    while True:
+        try:
+            await asyncio.sleep(settings.prometheus_sweep_interval)
+            ingestion_service.prometheus_metrics.sweep_stale_series()
+        except Exception as e:
+            logger.error("Series sweep task failed", error=str(e))
+
+
+@app.get("/remote-write/stats")
+async def get_remote_write_stats():
+    """Queue depth, throughput and spill state of the remote_write sender"""
+    return ingestion_service.remote_write.stats()
+
+
+@app.get("/interfaces/cache")
+async def get_interface_cache_stats():
+    """ifIndex name cache size and how often tables were checked or walked"""
+    return ingestion_service.interface_cache.stats()
+
+
+@app.post("/interfaces/cache/{device_id}/invalidate")
+async def invalidate_interface_cache(device_id: int):
+    """Force the next cycle to re-walk a device's interface table"""
+    ingestion_service.interface_cache.invalidate(device_id)
+    return {"message": "Interface cache invalidated", "device_id": device_id}
+
+
+@app.get("/prometheus/cardinality")
+async def get_prometheus_cardinality():
+    """Series counts, cap rejections and TTL evictions per metric"""
+    return ingestion_service.prometheus_metrics.cardinality()
+
+
 @app.get("/prometheus/metrics")
 async def get_prometheus_metrics():
     """Get Prometheus metrics in text format"""
     try:
-        from prometheus_client import generate_latest
-        
-        # Generate metrics in Prometheus format
-        metrics_text = generate_latest(ingestion_service.prometheus_metrics.registry)
-        return metrics_text
+        return Response(
+            content=ingestion_service.prometheus_metrics.render(),
+            media_type=CONTENT_TYPE_LATEST
+        )
         
     except Exception as e:
         logger.error("Failed to generate Prometheus metrics", error=str(e))
@@ -0,0 +1,152 @@
+"""
+Minimal Prometheus remote_write protobuf codec
+Hand-rolled encoder/decoder for prometheus.WriteRequest so the ingestion
+service does not need generated protobuf classes:
+
+    WriteRequest { repeated TimeSeries timeseries = 1; }
+    TimeSeries   { repeated Label labels = 1; repeated Sample samples = 2; }
+    Label        { string name = 1; string value = 2; }
+    Sample       { double value = 1; int64 timestamp = 2; }
+
+Metadata (field 3) and exemplars/histograms are skipped on decode.
+"""
+import struct
+from typing import Iterable, List, Sequence, Tuple
+
+Labels = Sequence[Tuple[str, str]]
+Samples = Sequence[Tuple[float, int]]
+TimeSeries = Tuple[Labels, Samples]
+
+_DOUBLE = struct.Struct('<d')
+
+
+class ProtobufDecodeError(ValueError):
+    """Raised for truncated or malformed protobuf payloads"""
+
+
+def _varint(value: int) -> bytes:
+    if value < 0:
+        value += 1 << 64
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _field(number: int, payload: bytes) -> bytes:
+    """Length-delimited field"""
+    return _varint((number << 3) | 2) + _varint(len(payload)) + payload
+
+
+def encode_label(name: str, value: str) -> bytes:
+    return _field(1, _field(1, name.encode()) + _field(2, value.encode()))
+
+
+def encode_timeseries(labels: Labels, samples: Samples, encoded_labels: bytes = None) -> bytes:
+    """Encode one TimeSeries; pass encoded_labels to reuse a cached label block"""
+    body = bytearray(encoded_labels if encoded_labels is not None else b''.join(
+        encode_label(name, value) for name, value in labels
+    ))
+    for value, timestamp in samples:
+        sample = b'\x09' + _DOUBLE.pack(value) + b'\x10' + _varint(timestamp)
+        body += b'\x12' + _varint(len(sample)) + sample
+    return _field(1, bytes(body))
+
+
+def encode_write_request(series: Iterable[TimeSeries]) -> bytes:
+    return b''.join(encode_timeseries(labels, samples) for labels, samples in series)
+
+
+def read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = 0
+    shift = 0
+    while True:
+        try:
+            byte = data[pos]
+        except IndexError:
+            raise ProtobufDecodeError("Truncated varint")
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+        if shift > 63:
+            raise ProtobufDecodeError("Varint too long")
+
+
+def skip_field(data: bytes, pos: int, wire_type: int) -> int:
+    if wire_type == 0:
+        return read_varint(data, pos)[1]
+    if wire_type == 1:
+        return pos + 8
+    if wire_type == 2:
+        length, pos = read_varint(data, pos)
+        return pos + length
+    if wire_type == 5:
+        return pos + 4
+    raise ProtobufDecodeError(f"Unsupported wire type {wire_type}")
+
+
+def decode_label(data: bytes, pos: int, end: int) -> Tuple[str, str]:
+    name = value = ''
+    while pos < end:
+        key, pos = read_varint(data, pos)
+        length, pos = read_varint(data, pos)
+        if key == 0x0A:
+            name = data[pos:pos + length].decode()
+        elif key == 0x12:
+            value = data[pos:pos + length].decode()
+        pos += length
+    return name, value
+
+
+def decode_sample(data: bytes, pos: int, end: int) -> Tuple[float, int]:
+    value = 0.0
+    timestamp = 0
+    while pos < end:
+        key, pos = read_varint(data, pos)
+        if key == 0x09:
+            value = _DOUBLE.unpack_from(data, pos)[0]
+            pos += 8
+        elif key == 0x10:
+            timestamp, pos = read_varint(data, pos)
+            if timestamp >= 1 << 63:
+                timestamp -= 1 << 64
+        else:
+            pos = skip_field(data, pos, key & 0x07)
+    return value, timestamp
+
+
+def decode_write_request(data: bytes) -> List[Tuple[List[Tuple[str, str]], List[Tuple[float, int]]]]:
+    """Decode an uncompressed WriteRequest into [(labels, samples), ...]"""
+    series = []
+    pos = 0
+    size = len(data)
+    while pos < size:
+        key, pos = read_varint(data, pos)
+        if key != 0x0A:
+            pos = skip_field(data, pos, key & 0x07)
+            continue
+        length, pos = read_varint(data, pos)
+        end = pos + length
+        if end > size:
+            raise ProtobufDecodeError("Truncated TimeSeries")
+
+        labels = []
+        samples = []
+        while pos < end:
+            field_key, pos = read_varint(data, pos)
+            if field_key & 0x07 != 2:
+                pos = skip_field(data, pos, field_key & 0x07)
+                continue
+            field_length, pos = read_varint(data, pos)
+            field_end = pos + field_length
+            if field_key == 0x0A:
+                labels.append(decode_label(data, pos, field_end))
+            elif field_key == 0x12:
+                samples.append(decode_sample(data, pos, field_end))
+            pos = field_end
+        series.append((labels, samples))
+    return series
@@ -0,0 +1,325 @@
+"""
+Third-party receivers for the Data Ingestion Service
+Parses Prometheus remote_write (snappy protobuf) and InfluxDB line protocol
+into metric rows for the bulk writer. Series identity is resolved once per
+distinct label set / series key and cached, so the per-sample work is a
+dict lookup plus the value and timestamp decode.
+
+Device mapping: remote_write labels device_id, device, instance (port
+stripped), host or hostname; line protocol tags device_id, device, host,
+agent_host or source. Identity labels are dropped from the stored metric
+name; the remaining labels are kept as name{key="value",...}.
+"""
+import math
+import struct
+from typing import Dict, List, Optional, Tuple
+
+import snappy
+
+from services.data_ingestion.batch_writer import MetricRow
+from services.data_ingestion.bulk import BulkIngestResult, MAX_METRIC_NAME_LENGTH
+from services.data_ingestion.device_index import DeviceIndex
+from services.data_ingestion.prompb import ProtobufDecodeError, decode_label, read_varint, skip_field
+
+REMOTE_WRITE_DEVICE_LABELS = ('device_id', 'device', 'instance', 'host', 'hostname')
+LINE_PROTOCOL_DEVICE_TAGS = ('device_id', 'device', 'host', 'agent_host', 'source')
+# Labels that describe where the sample came from rather than what it measures
+DROPPED_LABELS = frozenset(('__name__', 'job', 'device_id', 'device', 'instance', 'host', 'hostname',
+                            'agent_host', 'source'))
+
+PRECISION_TO_SECONDS = {'ns': 1e-9, 'n': 1e-9, 'us': 1e-6, 'u': 1e-6, 'ms': 1e-3, 's': 1.0}
+
+MAX_CACHED_SERIES = 200000
+
+_DOUBLE = struct.Struct('<d')
+
+# Resolved series: (device_id, metric_name) or a rejection reason
+ResolvedSeries = Tuple[Optional[int], str]
+
+
+def _strip_port(instance: str) -> str:
+    if instance.startswith('['):
+        return instance[1:instance.find(']')]
+    host, sep, port = instance.rpartition(':')
+    return host if sep and port.isdigit() and ':' not in host else instance
+
+
+def _metric_name(name: str, labels: Dict[str, str]) -> str:
+    extra = sorted((key, value) for key, value in labels.items() if key not in DROPPED_LABELS)
+    if not extra:
+        return name
+    return name + '{' + ','.join(f'{key}="{value}"' for key, value in extra) + '}'
+
+
+class SeriesResolver:
+    """Caches series key -> (device_id, metric_name); cleared when the device index reloads"""
+
+    def __init__(self, device_index: DeviceIndex):
+        self.device_index = device_index
+        self.cache: Dict[object, ResolvedSeries] = {}
+        self._index_version = device_index.loaded_at
+
+    def sync_with_index(self):
+        """Drop cached resolutions after the device index reloaded"""
+        if self.device_index.loaded_at != self._index_version or len(self.cache) > MAX_CACHED_SERIES:
+            self.cache.clear()
+            self._index_version = self.device_index.loaded_at
+
+    def _device(self, labels: Dict[str, str], keys: Tuple[str, ...]) -> Optional[int]:
+        index = self.device_index
+        for key in keys:
+            value = labels.get(key)
+            if not value:
+                continue
+            if key == 'device_id':
+                device_id = index.resolve(device_id=value)
+            else:
+                host = _strip_port(value) if key == 'instance' else value
+                device_id = index.by_ip.get(host) or index.by_name.get(host)
+            if device_id is not None:
+                return device_id
+        return None
+
+    def resolve(self, key: object, name: str, labels: Dict[str, str], device_keys: Tuple[str, ...]) -> ResolvedSeries:
+        device_id = self._device(labels, device_keys)
+        if device_id is None:
+            resolved = (None, 'unknown_device')
+        else:
+            metric_name = _metric_name(name, labels)
+            if not name:
+                resolved = (None, 'missing_metric_name')
+            elif len(metric_name) > MAX_METRIC_NAME_LENGTH:
+                resolved = (None, 'metric_name_too_long')
+            else:
+                resolved = (device_id, metric_name)
+        self.cache[key] = resolved
+        return resolved
+
+
+class TimeWindow:
+    """Accepted timestamp range for one request"""
+
+    def __init__(self, min_ts: float, max_ts: float):
+        self.min_ts = min_ts
+        self.max_ts = max_ts
+
+
+def parse_remote_write(body: bytes, resolver: SeriesResolver, window: TimeWindow,
+                       result: BulkIngestResult) -> List[MetricRow]:
+    """Decode a snappy WriteRequest straight into metric rows"""
+    try:
+        data = snappy.uncompress(body)
+    except Exception as e:
+        raise ValueError(f"Invalid snappy payload: {e}")
+
+    resolver.sync_with_index()
+    cache = resolver.cache
+    rows: List[MetricRow] = []
+    append = rows.append
+    unpack_double = _DOUBLE.unpack_from
+    min_ts, max_ts = window.min_ts, window.max_ts
+    pos = 0
+    size = len(data)
+    series_number = 0
+
+    try:
+        while pos < size:
+            key, pos = read_varint(data, pos)
+            if key != 0x0A:
+                pos = skip_field(data, pos, key & 0x07)
+                continue
+            length, pos = read_varint(data, pos)
+            end = pos + length
+            if end > size:
+                raise ProtobufDecodeError("Truncated TimeSeries")
+            series_number += 1
+
+            # First pass: locate label and sample fields (all length-delimited)
+            label_spans = []
+            sample_spans = []
+            while pos < end:
+                # Tags and label/sample lengths are almost always single-byte varints
+                field_key = data[pos]
+                field_length = data[pos + 1]
+                if field_key < 0x80 and field_length < 0x80:
+                    pos += 2
+                else:
+                    field_key, pos = read_varint(data, pos)
+                    field_length, pos = read_varint(data, pos)
+                if field_key == 0x0A:
+                    label_spans.append((pos, pos + field_length))
+                elif field_key == 0x12:
+                    sample_spans.append((pos, pos + field_length))
+                pos += field_length
+
+            # The raw label bytes are the cache key; senders put labels first and contiguous
+            if label_spans and not sample_spans or label_spans and label_spans[-1][1] < sample_spans[0][0]:
+                series_key = data[label_spans[0][0]:label_spans[-1][1]]
+            else:
+                series_key = b''.join(data[start:stop] for start, stop in label_spans)
+            resolved = cache.get(series_key)
+            if resolved is None:
+                labels = dict(decode_label(data, start, stop) for start, stop in label_spans)
+                resolved = resolver.resolve(series_key, labels.pop('__name__', ''), labels,
+                                            REMOTE_WRITE_DEVICE_LABELS)
+
+            device_id, metric_name = resolved
+            if device_id is None:
+                result.reject(series_number, metric_name, len(sample_spans))
+                continue
+
+            for sample_pos, sample_end in sample_spans:
+                value = 0.0
+                timestamp = 0
+                while sample_pos < sample_end:
+                    tag = data[sample_pos]
+                    if tag == 0x09:
+                        value = unpack_double(data, sample_pos + 1)[0]
+                        sample_pos += 9
+                    elif tag == 0x10:
+                        timestamp, sample_pos = read_varint(data, sample_pos + 1)
+                    else:
+                        sample_tag, sample_pos = read_varint(data, sample_pos)
+                        sample_pos = skip_field(data, sample_pos, sample_tag & 0x07)
+                ts = timestamp / 1000.0
+                if value != value or value in (math.inf, -math.inf):
+                    # NaN is also how Prometheus marks stale series
+                    result.reject(series_number, 'non_finite_value')
+                elif not min_ts <= ts <= max_ts:
+                    result.reject(series_number, 'timestamp_out_of_range')
+                else:
+                    append((device_id, metric_name, value, None, ts))
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ProtobufDecodeError(f"Malformed WriteRequest: {e}")
+
+    return rows
+
+
+def _split_unescaped(text: str, separator: str) -> List[str]:
+    """Split on separators not preceded by a backslash and not inside double quotes"""
+    parts = []
+    current = []
+    quoted = False
+    escaped = False
+    for char in text:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == '\\':
+            current.append(char)
+            escaped = True
+        elif char == '"':
+            current.append(char)
+            quoted = not quoted
+        elif char == separator and not quoted:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    parts.append(''.join(current))
+    return parts
+
+
+def _unescape(text: str) -> str:
+    return text.replace('\\,', ',').replace('\\=', '=').replace('\\ ', ' ').replace('\\"', '"') \
+        if '\\' in text else text
+
+
+def _field_value(raw: str) -> Optional[float]:
+    """Numeric line-protocol field value; strings return None"""
+    last = raw[-1]
+    if last == 'i' or last == 'u':
+        return float(int(raw[:-1]))
+    if raw[0] == '"':
+        return None
+    if raw in ('t', 'T', 'true', 'True', 'TRUE'):
+        return 1.0
+    if raw in ('f', 'F', 'false', 'False', 'FALSE'):
+        return 0.0
+    return float(raw)
+
+
+def parse_line_protocol(text: str, precision: str, resolver: SeriesResolver, window: TimeWindow,
+                        now: float, result: BulkIngestResult) -> List[MetricRow]:
+    """Parse InfluxDB line protocol; one row per numeric field"""
+    scale = PRECISION_TO_SECONDS.get(precision)
+    if scale is None:
+        raise ValueError(f"Unsupported precision: {precision}")
+
+    resolver.sync_with_index()
+    cache = resolver.cache
+    rows: List[MetricRow] = []
+    append = rows.append
+    min_ts, max_ts = window.min_ts, window.max_ts
+
+    for line_number, line in enumerate(text.split('\n'), start=1):
+        if not line or line[0] == '#':
+            continue
+        line = line.rstrip('\r')
+
+        # Fast path: no escapes or quoted strings
+        if '\\' not in line and '"' not in line:
+            parts = line.split(' ')
+        else:
+            parts = _split_unescaped(line, ' ')
+        if len(parts) == 2:
+            series, fields = parts
+            ts = now
+        elif len(parts) == 3:
+            series, fields, raw_ts = parts
+            try:
+                ts = int(raw_ts) * scale
+            except ValueError:
+                result.reject(line_number, 'invalid_timestamp')
+                continue
+        else:
+            result.reject(line_number, 'invalid_line')
+            continue
+
+        if not min_ts <= ts <= max_ts:
+            result.reject(line_number, 'timestamp_out_of_range')
+            continue
+
+        if '\\' in fields or '"' in fields:
+            field_items = _split_unescaped(fields, ',')
+        else:
+            field_items = fields.split(',')
+
+        for item in field_items:
+            field_name, sep, raw_value = item.partition('=')
+            if not sep or not raw_value:
+                result.reject(line_number, 'invalid_field')
+                continue
+            try:
+                value = _field_value(raw_value)
+            except ValueError:
+                result.reject(line_number, 'invalid_value')
+                continue
+            if value is None:
+                result.reject(line_number, 'string_field')
+                continue
+            if value != value or value in (math.inf, -math.inf):
+                result.reject(line_number, 'non_finite_value')
+                continue
+
+            cache_key = (series, field_name)
+            resolved = cache.get(cache_key)
+            if resolved is None:
+                if '\\' in series:
+                    pieces = _split_unescaped(series, ',')
+                else:
+                    pieces = series.split(',')
+                tags = {}
+                for tag in pieces[1:]:
+                    tag_key, _, tag_value = tag.partition('=')
+                    tags[_unescape(tag_key)] = _unescape(tag_value)
+                name = f"{_unescape(pieces[0])}_{_unescape(field_name)}"
+                resolved = resolver.resolve(cache_key, name, tags, LINE_PROTOCOL_DEVICE_TAGS)
+
+            device_id, metric_name = resolved
+            if device_id is None:
+                result.reject(line_number, metric_name)
+                continue
+            append((device_id, metric_name, value, None, ts))
+
+    return rows
@@ -0,0 +1,377 @@
+"""
+Prometheus remote_write sender for the Data Ingestion Service
+Samples are hashed by series onto a fixed number of shards. Each shard drains
+its queue into batches (max samples or deadline, whichever comes first),
+encodes them as snappy-compressed protobuf and POSTs them with retries and
+exponential backoff. When a queue is full, or a batch still fails after its
+retries, the encoded batch is spilled to disk and replayed once the receiver
+keeps up again. The receiver rejects a sample older than its series' newest as
+out of order, so each shard sends in submission order: spill files are named
+by the time their samples left the queue, a shard replays its own backlog
+oldest first, and sends live batches only once that backlog has drained
+(until then they are spilled behind it).
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+import snappy
+
+from services.data_ingestion.prompb import encode_timeseries
+from shared.logger import get_logger
+from shared.config import settings
+
+logger = get_logger("data_ingestion")
+
+# (sorted label pairs, value, timestamp in milliseconds)
+RemoteSample = Tuple[Tuple[Tuple[str, str], ...], float, int]
+
+REMOTE_WRITE_HEADERS = {
+    'Content-Encoding': 'snappy',
+    'Content-Type': 'application/x-protobuf',
+    'User-Agent': 'scnms-data-ingestion',
+    'X-Prometheus-Remote-Write-Version': '0.1.0',
+}
+
+_INVALID_NAME_CHARS = re.compile(r'[^a-zA-Z0-9_:]')
+
+
+def sanitize_metric_name(name: str) -> str:
+    """Map SCNMS metric names (which may contain OIDs) onto the Prometheus charset"""
+    name = _INVALID_NAME_CHARS.sub('_', name)
+    return name if not name[:1].isdigit() else f"_{name}"
+
+
+class RetryableSendError(Exception):
+    """Receiver asked us to retry (5xx, 429) or could not be reached"""
+
+
+def encode_batch(samples: List[RemoteSample]) -> bytes:
+    """Group samples by series and return a snappy-compressed WriteRequest"""
+    by_series: Dict[Tuple[Tuple[str, str], ...], List[Tuple[float, int]]] = defaultdict(list)
+    for labels, value, timestamp in samples:
+        by_series[labels].append((value, timestamp))
+    payload = b''.join(encode_timeseries(labels, points) for labels, points in by_series.items())
+    return snappy.compress(payload)
+
+
+def _spill_shard(name: str) -> int:
+    """Shard of a spill file named <stamp>-<shard>.bin"""
+    return int(name[:-len('.bin')].rpartition('-')[2])
+
+
+class SpillStore:
+    """Encoded batches waiting on disk under a byte budget, ordered by stamp"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.files_dropped = 0
+        # File name -> size, listed from disk on first use; writers run in threads
+        self._sizes: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def _files(self) -> Dict[str, int]:
+        if self._sizes is None:
+            names = os.listdir(self.directory) if os.path.isdir(self.directory) else []
+            self._sizes = {
+                name: os.path.getsize(os.path.join(self.directory, name)) for name in names if name.endswith('.bin')
+            }
+        return self._sizes
+
+    def size(self) -> int:
+        with self._lock:
+            return sum(self._files().values())
+
+    def write(self, body: bytes, shard: int, stamp: int):
+        """Store a batch whose samples left the queue at stamp (ns); replay follows stamp order"""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{stamp:020d}-{shard}.bin"
+        path = os.path.join(self.directory, name)
+        with open(path + '.tmp', 'wb') as spill_file:
+            spill_file.write(body)
+        os.replace(path + '.tmp', path)
+
+        with self._lock:
+            files = self._files()
+            files[name] = len(body)
+            # Stay within budget by dropping the oldest spilled batches
+            total = sum(files.values())
+            for oldest in sorted(files):
+                if total <= self.max_bytes or len(files) == 1:
+                    break
+                total -= files.pop(oldest)
+                self._remove(oldest)
+                self.files_dropped += 1
+
+    def oldest(self, shard: int, shard_count: int) -> Optional[Tuple[str, bytes]]:
+        """Oldest batch of a shard; files of a run with more shards are folded onto the current ones"""
+        with self._lock:
+            names = [name for name in self._files() if _spill_shard(name) % shard_count == shard]
+        if not names:
+            return None
+        name = min(names)
+        with open(os.path.join(self.directory, name), 'rb') as spill_file:
+            return name, spill_file.read()
+
+    def remove(self, name: str):
+        with self._lock:
+            self._files().pop(name, None)
+            self._remove(name)
+
+    def _remove(self, name: str):
+        path = os.path.join(self.directory, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def pending(self, shard: Optional[int] = None, shard_count: int = 1) -> int:
+        with self._lock:
+            names = list(self._files())
+        if shard is None:
+            return len(names)
+        return sum(1 for name in names if _spill_shard(name) % shard_count == shard)
+
+    def pending_before(self, stamp: int) -> bool:
+        """Whether any batch older than stamp is still waiting"""
+        with self._lock:
+            return any(name < f"{stamp:020d}" for name in self._files())
+
+
+class RemoteWriteSender:
+    """Sharded, batching remote_write client"""
+
+    def __init__(self):
+        self.url = settings.remote_write_url
+        self.shard_count = settings.remote_write_shards
+        self.batch_size = settings.remote_write_max_samples_per_send
+        self.batch_deadline = settings.remote_write_batch_send_deadline
+        self.queues: List[asyncio.Queue] = []
+        self.spill = SpillStore(settings.remote_write_spill_dir, settings.remote_write_spill_max_bytes)
+        self.client: Optional[httpx.AsyncClient] = None
+        self._tasks: List[asyncio.Task] = []
+        self.running = False
+        self.started_ns = 0
+        # Per shard: overflow spills still being written, and when a failed replay may be retried
+        self._spilling: List[int] = []
+        self._replay_after: List[float] = []
+        # Spill files of an earlier run hold until they are gone: shard placement changes between runs
+        self._earlier_spill = True
+
+        self.samples_sent = 0
+        self.samples_spilled = 0
+        self.samples_dropped = 0
+        self.batches_failed = 0
+        self.retries = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    async def start(self):
+        if not self.enabled or self.running:
+            return
+        self.running = True
+        self.started_ns = time.time_ns()
+        self.client = httpx.AsyncClient(timeout=settings.remote_write_timeout)
+        self.queues = [asyncio.Queue(maxsize=settings.remote_write_queue_capacity) for _ in range(self.shard_count)]
+        self._spilling = [0] * self.shard_count
+        self._replay_after = [0.0] * self.shard_count
+        self._earlier_spill = True
+        self._tasks = [asyncio.create_task(self._shard_worker(shard)) for shard in range(self.shard_count)]
+        logger.info("Remote write sender started", url=self.url, shards=self.shard_count)
+
+    async def stop(self):
+        """Stop workers and spill whatever is still queued"""
+        if not self.running:
+            return
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        stamp = time.time_ns()
+        for shard, queue in enumerate(self.queues):
+            pending = []
+            while not queue.empty():
+                pending.append(queue.get_nowait())
+            if pending:
+                await self._spill(pending, shard, stamp)
+        await self.client.aclose()
+        logger.info("Remote write sender stopped")
+
+    async def submit(self, samples: Iterable[RemoteSample]):
+        """Queue samples for sending; overflow goes straight to the spill directory"""
+        if not self.running:
+            return
+        overflow: Dict[int, List[RemoteSample]] = {}
+        for sample in samples:
+            shard = hash(sample[0]) % self.shard_count
+            if shard in overflow:
+                overflow[shard].append(sample)
+                continue
+            queue = self.queues[shard]
+            try:
+                queue.put_nowait(sample)
+            except asyncio.QueueFull:
+                # The queued samples are older: they go to disk first, in order
+                pending = overflow[shard] = []
+                while not queue.empty():
+                    pending.append(queue.get_nowait())
+                pending.append(sample)
+        if not overflow:
+            return
+        stamp = time.time_ns()
+        for shard in overflow:
+            self._spilling[shard] += 1
+        for shard, batch in overflow.items():
+            try:
+                await self._spill(batch, shard, stamp)
+            finally:
+                self._spilling[shard] -= 1
+
+    async def _shard_worker(self, shard: int):
+        """Replay the shard's backlog, then send live batches, or spill them behind a backlog that is left"""
+        queue = self.queues[shard]
+        while self.running:
+            batch: List[RemoteSample] = []
+            try:
+                drained = await self._replay_shard(shard)
+                # While a backlog is left, wake up to retry it even when nothing new arrives
+                batch, stamp = await self._next_batch(
+                    queue, None if drained else settings.remote_write_spill_replay_interval
+                )
+                if not batch:
+                    continue
+                body = encode_batch(batch)
+                if not self._live(shard):
+                    await self._spill_body(body, len(batch), shard, stamp)
+                    continue
+
+                try:
+                    outcome = await self._send_with_retries(body)
+                except asyncio.CancelledError:
+                    # Shutting down mid-send; keep the batch for the next start
+                    await self._spill_body(body, len(batch), shard, stamp)
+                    raise
+
+                if outcome == 'sent':
+                    self.samples_sent += len(batch)
+                elif outcome == 'rejected':
+                    self.samples_dropped += len(batch)
+                else:
+                    self.batches_failed += 1
+                    self._replay_after[shard] = time.monotonic() + settings.remote_write_spill_replay_interval
+                    await self._spill_body(body, len(batch), shard, stamp)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.samples_dropped += len(batch)
+                self.last_error = str(e)
+                logger.error("Remote write shard worker error", shard=shard, error=str(e), samples=len(batch))
+                await asyncio.sleep(settings.remote_write_min_backoff)
+
+    async def _next_batch(self, queue: asyncio.Queue, timeout: Optional[float]) -> Tuple[List[RemoteSample], int]:
+        """Up to batch_size samples or whatever arrived by the deadline, and when they left the queue"""
+        try:
+            batch = [await asyncio.wait_for(queue.get(), timeout)]
+        except asyncio.TimeoutError:
+            return [], 0
+        stamp = time.time_ns()
+        deadline = time.monotonic() + self.batch_deadline
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch, stamp
+
+    def _live(self, shard: int) -> bool:
+        """Whether live batches of a shard may be sent: nothing older is waiting on disk"""
+        if self._earlier_spill:
+            self._earlier_spill = self.spill.pending_before(self.started_ns)
+        return (not self._earlier_spill and not self._spilling[shard]
+                and not self.spill.pending(shard, self.shard_count))
+
+    async def _replay_shard(self, shard: int) -> bool:
+        """Resend a shard's spilled batches, oldest first; True once none are left"""
+        if time.monotonic() < self._replay_after[shard]:
+            return False
+        while self.running:
+            entry = await asyncio.to_thread(self.spill.oldest, shard, self.shard_count)
+            if entry is None:
+                return not self._spilling[shard]
+            name, body = entry
+            if await self._send_with_retries(body) == 'failed':
+                self._replay_after[shard] = time.monotonic() + settings.remote_write_spill_replay_interval
+                return False
+            await asyncio.to_thread(self.spill.remove, name)
+        return False
+
+    async def _send_with_retries(self, body: bytes) -> str:
+        """Returns 'sent', 'rejected' (permanent 4xx) or 'failed' (retries exhausted)"""
+        backoff = settings.remote_write_min_backoff
+        for attempt in range(settings.remote_write_max_retries + 1):
+            try:
+                await self._send(body)
+                return 'sent'
+            except RetryableSendError as e:
+                self.last_error = str(e)
+                if attempt == settings.remote_write_max_retries or not self.running:
+                    break
+                self.retries += 1
+                await asyncio.sleep(backoff * (1 + random.random() * 0.2))
+                backoff = min(backoff * 2, settings.remote_write_max_backoff)
+            except ValueError as e:
+                # Non-retryable rejection (4xx): the data itself is bad
+                self.last_error = str(e)
+                logger.error("Remote write batch rejected", error=str(e))
+                return 'rejected'
+        return 'failed'
+
+    async def _send(self, body: bytes):
+        try:
+            response = await self.client.post(self.url, content=body, headers=REMOTE_WRITE_HEADERS)
+        except httpx.HTTPError as e:
+            raise RetryableSendError(f"{type(e).__name__}: {e}")
+        if response.status_code == 429 or response.status_code >= 500:
+            raise RetryableSendError(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise ValueError(f"HTTP {response.status_code}: {response.text[:200]}")
+
+    async def _spill(self, samples: List[RemoteSample], shard: int, stamp: int):
+        await self._spill_body(encode_batch(samples), len(samples), shard, stamp)
+
+    async def _spill_body(self, body: bytes, sample_count: int, shard: int, stamp: int):
+        try:
+            await asyncio.to_thread(self.spill.write, body, shard, stamp)
+            self.samples_spilled += sample_count
+        except OSError as e:
+            self.samples_dropped += sample_count
+            logger.error("Failed to spill remote write batch", error=str(e), samples=sample_count)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'enabled': self.enabled,
+            'running': self.running,
+            'url': self.url,
+            'shards': self.shard_count,
+            'queued': [queue.qsize() for queue in self.queues],
+            'samples_sent': self.samples_sent,
+            'samples_spilled': self.samples_spilled,
+            'samples_dropped': self.samples_dropped,
+            'batches_failed': self.batches_failed,
+            'retries': self.retries,
+            'spill_files': self.spill.pending(),
+            'spill_files_dropped': self.spill.files_dropped,
+            'last_error': self.last_error
+        }
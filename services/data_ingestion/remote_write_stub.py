@@ -0,0 +1,71 @@
+"""
+Local remote_write receiver stub
+Accepts snappy-compressed WriteRequests, decodes them and keeps counters so
+the sender can be exercised without a real TSDB. Set STUB_FAIL_RATE (0-1) to
+answer a share of requests with 503 and STUB_LATENCY_SECONDS to slow it down.
+
+    REMOTE_WRITE_URL=http://localhost:9201/api/v1/write
+    python -m services.data_ingestion.remote_write_stub
+"""
+import asyncio
+import os
+import random
+import time
+
+import snappy
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+from services.data_ingestion.prompb import ProtobufDecodeError, decode_write_request
+
+FAIL_RATE = float(os.getenv("STUB_FAIL_RATE", "0"))
+LATENCY_SECONDS = float(os.getenv("STUB_LATENCY_SECONDS", "0"))
+
+app = FastAPI(title="SCNMS remote_write receiver stub")
+
+stats = {
+    'requests': 0,
+    'failed_on_purpose': 0,
+    'bad_requests': 0,
+    'series': 0,
+    'samples': 0,
+    'bytes_received': 0,
+    'last_request_at': None,
+    'last_series': None,
+}
+
+
+@app.post("/api/v1/write")
+async def receive(request: Request):
+    body = await request.body()
+    stats['requests'] += 1
+    stats['bytes_received'] += len(body)
+
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        stats['failed_on_purpose'] += 1
+        return Response(status_code=503)
+
+    try:
+        series = decode_write_request(snappy.uncompress(body))
+    except (ProtobufDecodeError, snappy.UncompressError, UnicodeDecodeError) as e:
+        stats['bad_requests'] += 1
+        return Response(content=str(e), status_code=400)
+
+    stats['series'] += len(series)
+    stats['samples'] += sum(len(samples) for _, samples in series)
+    stats['last_request_at'] = time.time()
+    if series:
+        stats['last_series'] = dict(series[-1][0])
+    return Response(status_code=204)
+
+
+@app.get("/stats")
+async def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("STUB_PORT", "9201")))
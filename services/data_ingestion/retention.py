@@ -0,0 +1,236 @@
+"""
+Metric retention policy engine for the Data Ingestion Service
+Matches metric names against retention policies, then walks the expired part
+of each policy's metrics one day slice at a time: archive (optional),
+roll up into coarser resolutions, delete raw rows. Rollups expire on their
+own per-resolution TTLs.
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select, text
+
+from shared.database import AsyncSessionLocal
+from shared.models import RetentionPolicy
+from shared.logger import get_logger
+from shared.config import settings
+
+logger = get_logger("data_ingestion")
+
+SLICE_SECONDS = 86400
+
+ARCHIVE_SQL = text("""
+    INSERT INTO metrics_archive (id, device_id, metric_name, metric_value, metric_unit, timestamp)
+    SELECT id, device_id, metric_name, metric_value, metric_unit, timestamp
+    FROM metrics
+    WHERE metric_name = ANY(:names)
+      AND timestamp >= to_timestamp(CAST(:lo AS double precision))
+      AND timestamp < to_timestamp(CAST(:hi AS double precision))
+    ON CONFLICT (id) DO NOTHING
+""")
+
+ROLLUP_SQL = text("""
+    INSERT INTO metric_rollups
+        (device_id, metric_name, resolution_seconds, bucket_start, min_value, max_value, sum_value, sample_count)
+    SELECT device_id, metric_name, CAST(:resolution AS integer),
+           date_bin(CAST(:resolution AS integer) * INTERVAL '1 second', timestamp, '2000-01-01') AS bucket,
+           min(metric_value), max(metric_value), sum(metric_value), count(*)
+    FROM metrics
+    WHERE metric_name = ANY(:names)
+      AND timestamp >= to_timestamp(CAST(:lo AS double precision))
+      AND timestamp < to_timestamp(CAST(:hi AS double precision))
+    GROUP BY device_id, metric_name, bucket
+    ON CONFLICT (device_id, metric_name, resolution_seconds, bucket_start) DO UPDATE SET
+        min_value = LEAST(metric_rollups.min_value, EXCLUDED.min_value),
+        max_value = GREATEST(metric_rollups.max_value, EXCLUDED.max_value),
+        sum_value = metric_rollups.sum_value + EXCLUDED.sum_value,
+        sample_count = metric_rollups.sample_count + EXCLUDED.sample_count
+""")
+
+DELETE_RAW_SQL = text("""
+    DELETE FROM metrics
+    WHERE metric_name = ANY(:names)
+      AND timestamp >= to_timestamp(CAST(:lo AS double precision))
+      AND timestamp < to_timestamp(CAST(:hi AS double precision))
+""")
+
+EXPIRE_ROLLUPS_SQL = text("""
+    DELETE FROM metric_rollups
+    WHERE metric_name = ANY(:names)
+      AND resolution_seconds = CAST(:resolution AS integer)
+      AND bucket_start < now() - CAST(:ttl_days AS integer) * INTERVAL '1 day'
+""")
+
+METRIC_NAMES_SQL = text("""
+    SELECT metric_name, extract(epoch FROM min(timestamp)) AS oldest
+    FROM metrics
+    GROUP BY metric_name
+""")
+
+ROW_SIZE_SQL = text("""
+    SELECT pg_total_relation_size(c.oid) / GREATEST(c.reltuples, 1)
+    FROM pg_class c
+    WHERE c.oid = CAST(:table AS regclass)
+""")
+
+
+@dataclass
+class PolicySpec:
+    """Resolved policy used by the engine"""
+    name: str
+    metric_pattern: str
+    raw_ttl_days: int
+    rollup_ttls: Dict[int, int] = field(default_factory=dict)
+    archive: bool = False
+
+    @classmethod
+    def from_model(cls, policy: RetentionPolicy) -> 'PolicySpec':
+        rollups = json.loads(policy.rollup_ttls) if policy.rollup_ttls else {}
+        return cls(
+            name=policy.name,
+            metric_pattern=policy.metric_pattern,
+            raw_ttl_days=policy.raw_ttl_days,
+            rollup_ttls={int(resolution): int(ttl) for resolution, ttl in rollups.items()},
+            archive=bool(policy.archive)
+        )
+
+
+@dataclass
+class PolicyReport:
+    """Outcome of enforcing one policy"""
+    policy: str
+    metric_names: int = 0
+    slices: int = 0
+    raw_rows_deleted: int = 0
+    rows_archived: int = 0
+    rollup_rows_written: int = 0
+    rollup_rows_expired: int = 0
+    estimated_bytes_reclaimed: int = 0
+
+
+class RetentionPolicyEngine:
+    """Applies retention policies to the metrics and metric_rollups tables"""
+
+    def __init__(self):
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+
+    def default_policy(self) -> PolicySpec:
+        """Fallback for metrics no policy matches; keeps the old single cutoff"""
+        return PolicySpec(
+            name="default",
+            metric_pattern="*",
+            raw_ttl_days=settings.metric_retention_days
+        )
+
+    async def load_policies(self) -> List[PolicySpec]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(RetentionPolicy)
+                .where(RetentionPolicy.enabled == True)
+                .order_by(RetentionPolicy.priority, RetentionPolicy.id)
+            )
+            return [PolicySpec.from_model(policy) for policy in result.scalars().all()]
+
+    @staticmethod
+    def match(metric_name: str, policies: List[PolicySpec]) -> Optional[PolicySpec]:
+        """First policy (by priority) whose pattern matches the metric name"""
+        for policy in policies:
+            if fnmatchcase(metric_name, policy.metric_pattern):
+                return policy
+        return None
+
+    async def enforce(self) -> Dict[str, Any]:
+        """Run every policy once and return a report"""
+        async with self._lock:
+            started = time.time()
+            policies = await self.load_policies()
+            default = self.default_policy()
+
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(METRIC_NAMES_SQL)).all()
+                metric_row_bytes = float(await db.scalar(ROW_SIZE_SQL, {'table': 'metrics'}) or 0)
+
+            # Group metric names by the policy that governs them
+            groups: Dict[str, Dict[str, Any]] = {}
+            for metric_name, oldest in rows:
+                policy = self.match(metric_name, policies) or default
+                group = groups.setdefault(policy.name, {'policy': policy, 'names': [], 'oldest': None})
+                group['names'].append(metric_name)
+                if oldest is not None:
+                    oldest = float(oldest)
+                    group['oldest'] = oldest if group['oldest'] is None else min(group['oldest'], oldest)
+
+            reports = []
+            for group in groups.values():
+                report = await self._enforce_policy(group['policy'], group['names'], group['oldest'])
+                report.estimated_bytes_reclaimed = int(report.raw_rows_deleted * metric_row_bytes)
+                reports.append(report)
+
+            self.last_report = {
+                'started_at': started,
+                'duration_seconds': round(time.time() - started, 3),
+                'raw_rows_deleted': sum(r.raw_rows_deleted for r in reports),
+                'estimated_bytes_reclaimed': sum(r.estimated_bytes_reclaimed for r in reports),
+                'policies': [r.__dict__ for r in reports]
+            }
+            logger.info(
+                "Retention policies enforced",
+                raw_rows_deleted=self.last_report['raw_rows_deleted'],
+                estimated_bytes_reclaimed=self.last_report['estimated_bytes_reclaimed'],
+                duration_seconds=self.last_report['duration_seconds']
+            )
+            return self.last_report
+
+    async def _enforce_policy(self, policy: PolicySpec, names: List[str], oldest: Optional[float]) -> PolicyReport:
+        report = PolicyReport(policy=policy.name, metric_names=len(names))
+        cutoff = time.time() - policy.raw_ttl_days * SLICE_SECONDS
+        # Rollups that would expire before the raw data are pointless
+        rollups = {res: ttl for res, ttl in policy.rollup_ttls.items() if ttl > policy.raw_ttl_days}
+
+        if oldest is not None and oldest < cutoff:
+            lo = oldest - (oldest % SLICE_SECONDS)
+            while lo < cutoff:
+                hi = min(lo + SLICE_SECONDS, cutoff)
+                await self._expire_slice(policy, names, rollups, lo, hi, report)
+                report.slices += 1
+                lo = hi
+                await asyncio.sleep(settings.retention_slice_pause_seconds)
+
+        if rollups:
+            async with AsyncSessionLocal() as db:
+                for resolution, ttl_days in rollups.items():
+                    result = await db.execute(
+                        EXPIRE_ROLLUPS_SQL,
+                        {'names': names, 'resolution': resolution, 'ttl_days': ttl_days}
+                    )
+                    report.rollup_rows_expired += result.rowcount
+                await db.commit()
+
+        return report
+
+    async def _expire_slice(
+        self,
+        policy: PolicySpec,
+        names: List[str],
+        rollups: Dict[int, int],
+        lo: float,
+        hi: float,
+        report: PolicyReport
+    ):
+        """Archive, roll up and delete one day slice in a single transaction"""
+        params = {'names': names, 'lo': lo, 'hi': hi}
+        async with AsyncSessionLocal() as db:
+            if policy.archive:
+                result = await db.execute(ARCHIVE_SQL, params)
+                report.rows_archived += result.rowcount
+            for resolution in rollups:
+                result = await db.execute(ROLLUP_SQL, {**params, 'resolution': resolution})
+                report.rollup_rows_written += result.rowcount
+            result = await db.execute(DELETE_RAW_SQL, params)
+            report.raw_rows_deleted += result.rowcount
+            await db.commit()
@@ -0,0 +1,124 @@
+"""
+Incremental metrics reader for the Data Ingestion Service
+Reads only rows above a durable watermark through a server-side cursor, in
+bounded batches, and persists the watermark after each batch so a restarted
+service resumes where it stopped. Ids are taken before commit, so a row can
+become visible after higher ids were read; the watermark is therefore
+(ingest_xid, id), the writing transaction first, and a read only takes rows of
+transactions below its snapshot's xmin. Those have all finished, so no row can
+appear behind the watermark later.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import BigInteger, Text, cast, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+
+from shared.database import AsyncSessionLocal
+from shared.models import Metric, IngestionCheckpoint
+from shared.logger import get_logger
+from shared.config import settings
+
+logger = get_logger("data_ingestion")
+
+# (id, device_id, metric_name, metric_value, timestamp) in (ingest_xid, id) order
+MetricRow = Tuple[int, int, str, float, datetime]
+
+# Oldest transaction still running as of the statement's snapshot
+SNAPSHOT_XMIN = cast(cast(func.pg_snapshot_xmin(func.pg_current_snapshot()), Text), BigInteger)
+
+
+class MetricWatermarkReader:
+    """Streams new metric rows for one named consumer"""
+
+    def __init__(self, consumer: str):
+        self.consumer = consumer
+        self.watermark_xid = 0
+        self.watermark: Optional[int] = None
+        self.rows_read = 0
+        self.last_batch_at: Optional[float] = None
+
+    async def load_checkpoint(self) -> int:
+        """Read the stored watermark; a new consumer starts five minutes back"""
+        async with AsyncSessionLocal() as db:
+            checkpoint = await db.get(IngestionCheckpoint, self.consumer)
+            if checkpoint:
+                self.watermark_xid, self.watermark = checkpoint.last_xid, checkpoint.last_metric_id
+            else:
+                # First run: start with the last few minutes, like the old rescan window
+                start = datetime.now(timezone.utc) - timedelta(minutes=5)
+                first_recent = (await db.execute(
+                    select(Metric.ingest_xid, Metric.id).where(Metric.timestamp >= start).order_by(Metric.id).limit(1)
+                )).first()
+                if first_recent is not None:
+                    self.watermark_xid, self.watermark = first_recent.ingest_xid, first_recent.id - 1
+                else:
+                    # Nothing recent: start at the transactions still running
+                    self.watermark_xid, self.watermark = await db.scalar(select(SNAPSHOT_XMIN)), 0
+                await self._save(db, self.watermark_xid, self.watermark)
+                await db.commit()
+
+        logger.info("Ingestion checkpoint loaded", consumer=self.consumer,
+                    last_xid=self.watermark_xid, last_metric_id=self.watermark)
+        return self.watermark
+
+    async def batches(self) -> AsyncIterator[List[MetricRow]]:
+        """
+        Yield batches of rows above the watermark, up to the per-cycle limit.
+        The watermark is committed when the consumer asks for the next batch,
+        i.e. after the previous batch has been handled.
+        """
+        if self.watermark is None:
+            await self.load_checkpoint()
+
+        # One statement, so the gate and the rows it returns come from the same snapshot;
+        # transactions at or above its xmin may still commit rows, and wait for the next cycle
+        query = (
+            select(Metric.id, Metric.device_id, Metric.metric_name, Metric.metric_value, Metric.timestamp,
+                   Metric.ingest_xid)
+            .where(tuple_(Metric.ingest_xid, Metric.id) > tuple_(self.watermark_xid, self.watermark),
+                   Metric.ingest_xid < SNAPSHOT_XMIN)
+            .order_by(Metric.ingest_xid, Metric.id)
+            .limit(settings.ingestion_max_rows_per_cycle)
+            .execution_options(yield_per=settings.ingestion_batch_size)
+        )
+
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(query)
+            async for partition in result.partitions():
+                batch = [tuple(row[:5]) for row in partition]
+                yield batch
+                last = partition[-1]
+                await self.commit(last.ingest_xid, last.id)
+                self.rows_read += len(batch)
+
+    async def commit(self, last_xid: int, last_metric_id: int):
+        """Persist the watermark in its own transaction; the read cursor stays open"""
+        async with AsyncSessionLocal() as db:
+            await self._save(db, last_xid, last_metric_id)
+            await db.commit()
+        self.watermark_xid, self.watermark = last_xid, last_metric_id
+        self.last_batch_at = time.time()
+
+    async def _save(self, db, last_xid: int, last_metric_id: int):
+        stmt = insert(IngestionCheckpoint).values(
+            consumer=self.consumer, last_xid=last_xid, last_metric_id=last_metric_id
+        )
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=[IngestionCheckpoint.consumer],
+            set_={
+                'last_xid': stmt.excluded.last_xid,
+                'last_metric_id': stmt.excluded.last_metric_id,
+                'updated_at': datetime.now(timezone.utc)
+            }
+        ))
+
+    def stats(self) -> dict:
+        return {
+            'consumer': self.consumer,
+            'last_xid': self.watermark_xid,
+            'last_metric_id': self.watermark,
+            'rows_read': self.rows_read,
+            'last_batch_at': self.last_batch_at
+        }
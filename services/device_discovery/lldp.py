@@ -0,0 +1,86 @@
+"""
+LLDP-derived device dependencies
+Walks lldpRemSysName on every SNMP-enabled device, matches neighbour names to
+inventory devices, and orients the resulting undirected links away from the
+given core (root) devices: the end closer to a root is the parent. Links
+between devices at the same distance are left out, since neither depends on
+the other.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from shared.config import settings
+from shared.models import Device
+
+# LLDP-MIB lldpRemSysName, indexed by timeMark.localPortNum.remIndex
+LLDP_REM_SYS_NAME = '1.0.8802.1.1.2.1.4.1.1.9'
+
+
+def walk_neighbor_names(ip_address: str, community: Optional[str]) -> Set[str]:
+    """Blocking walk of the LLDP remote table: neighbour system names"""
+    from pysnmp.hlapi import nextCmd, SnmpEngine, CommunityData, UdpTransportTarget, ContextData, ObjectType, ObjectIdentity
+
+    names = set()
+    for error_indication, error_status, _, var_binds in nextCmd(
+        SnmpEngine(),
+        CommunityData(community or settings.snmp_community),
+        UdpTransportTarget((ip_address, 161), timeout=settings.snmp_timeout, retries=settings.snmp_retries),
+        ContextData(),
+        ObjectType(ObjectIdentity(LLDP_REM_SYS_NAME)),
+        lexicographicMode=False
+    ):
+        if error_indication or error_status:
+            break
+        for _, value in var_binds:
+            name = str(value).strip()
+            if name:
+                names.add(name)
+    return names
+
+
+def _name_keys(name: str) -> Tuple[str, ...]:
+    """Lookup keys for a system name: as-is and without the domain part"""
+    name = name.strip().lower()
+    short = name.split('.', 1)[0]
+    return (name, short) if short != name else (name,)
+
+
+def match_neighbors(devices: List[Device], neighbors: Dict[int, Set[str]]) -> Dict[int, Set[int]]:
+    """Undirected adjacency between inventory devices from per-device neighbour names"""
+    by_name: Dict[str, int] = {}
+    for device in devices:
+        for name in (device.name, device.hostname):
+            if name:
+                for key in _name_keys(name):
+                    by_name.setdefault(key, device.id)
+
+    adjacency: Dict[int, Set[int]] = {}
+    for device_id, names in neighbors.items():
+        for name in names:
+            neighbor_id = next((by_name[key] for key in _name_keys(name) if key in by_name), None)
+            if neighbor_id is not None and neighbor_id != device_id:
+                adjacency.setdefault(device_id, set()).add(neighbor_id)
+                adjacency.setdefault(neighbor_id, set()).add(device_id)
+    return adjacency
+
+
+def orient_links(adjacency: Dict[int, Set[int]], root_device_ids: Iterable[int]) -> List[Tuple[int, int]]:
+    """(parent, child) pairs by breadth-first distance from the root devices"""
+    distance: Dict[int, int] = {}
+    frontier = [device_id for device_id in root_device_ids if device_id in adjacency]
+    for device_id in frontier:
+        distance[device_id] = 0
+    while frontier:
+        next_frontier = []
+        for device_id in frontier:
+            for neighbor_id in adjacency[device_id]:
+                if neighbor_id not in distance:
+                    distance[neighbor_id] = distance[device_id] + 1
+                    next_frontier.append(neighbor_id)
+        frontier = next_frontier
+
+    links = []
+    for device_id, neighbor_ids in adjacency.items():
+        for neighbor_id in neighbor_ids:
+            if device_id in distance and neighbor_id in distance and distance[device_id] < distance[neighbor_id]:
+                links.append((device_id, neighbor_id))
+    return sorted(links)
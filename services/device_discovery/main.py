@@ -4,21 +4,26 @@ Handles network device discovery and inventory management
 """
 import asyncio
 import ipaddress
+import json
 from typing import List, Dict, Any
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 import concurrent.futures
 import time
 
-from shared.database import get_db, get_redis
-from shared.models import Device, DeviceStatus, ProtocolType
+from shared.database import get_db, get_redis, render_pool_metrics
+from shared.models import Device, DeviceDependency, DeviceStatus, ProtocolType
 from shared.schemas import (
     DeviceCreate, DeviceUpdate, Device as DeviceSchema,
-    DiscoveryRequest, DiscoveryResult, HealthCheck
+    DeviceDependency as DeviceDependencySchema,
+    DiscoveryRequest, DiscoveryResult, LldpTopologyRequest, HealthCheck
 )
 from shared.logger import configure_logging, get_logger
 from shared.config import settings
+from services.device_discovery.lldp import match_neighbors, orient_links, walk_neighbor_names
 
 # Configure logging
 configure_logging()
@@ -245,6 +250,12 @@ async def health_check():
     )
 
 
+@app.get("/db-pool/metrics")
+async def db_pool_metrics():
+    """Database connection pool metrics in Prometheus text format"""
+    return Response(content=render_pool_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/devices", response_model=List[DeviceSchema])
 async def get_devices(
     skip: int = 0,
@@ -410,6 +421,56 @@ async def discover_network(
         raise HTTPException(status_code=500, detail=f"Discovery failed: {str(e)}")
 
 
+@app.post("/topology/lldp", response_model=List[DeviceDependencySchema])
+async def discover_lldp_topology(request: LldpTopologyRequest, db: Session = Depends(get_db)):
+    """Rebuild the LLDP-sourced device dependencies; manual dependencies are kept"""
+    try:
+        devices = db.query(Device).all()
+        snmp_devices = [device for device in devices if device.snmp_enabled]
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=settings.max_concurrent_polls) as executor:
+            loop = asyncio.get_event_loop()
+            walks = await asyncio.gather(*[
+                loop.run_in_executor(executor, walk_neighbor_names, device.ip_address, device.snmp_community)
+                for device in snmp_devices
+            ], return_exceptions=True)
+        
+        neighbors = {}
+        for device, walk in zip(snmp_devices, walks):
+            if isinstance(walk, Exception):
+                logger.warning("LLDP walk failed", device_id=device.id, error=str(walk))
+            else:
+                neighbors[device.id] = walk
+        
+        links = orient_links(match_neighbors(devices, neighbors), request.root_device_ids)
+        manual = {
+            (dependency.parent_device_id, dependency.child_device_id)
+            for dependency in db.query(DeviceDependency).filter(DeviceDependency.source != "lldp")
+        }
+        
+        db.query(DeviceDependency).filter(DeviceDependency.source == "lldp").delete(synchronize_session=False)
+        dependencies = [
+            DeviceDependency(parent_device_id=parent_id, child_device_id=child_id, source="lldp")
+            for parent_id, child_id in links if (parent_id, child_id) not in manual
+        ]
+        db.add_all(dependencies)
+        db.commit()
+        for dependency in dependencies:
+            db.refresh(dependency)
+        
+        # Alarm managers reload their dependency index
+        redis_client = get_redis()
+        redis_client.publish('topology', json.dumps({'action': 'reload'}))
+        
+        logger.info("LLDP topology discovered", walked=len(neighbors), links=len(dependencies))
+        return dependencies
+        
+    except Exception as e:
+        logger.error("LLDP topology discovery failed", error=str(e))
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"LLDP topology discovery failed: {str(e)}")
+
+
 def _extract_vendor(self, description: str) -> str:
     """Extract vendor from device description"""
     description_lower = description.lower()
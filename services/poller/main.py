@@ -6,13 +6,15 @@ import asyncio
 import time
 from typing import List, Dict, Any, Optional
 from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi.responses import Response
+from prometheus_client import CONTENT_TYPE_LATEST
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 import concurrent.futures
 from datetime import datetime, timedelta
 import json
 
-from shared.database import get_db, get_redis
+from shared.database import get_db, get_redis, render_pool_metrics
 from shared.models import Device, PollingJob, Metric, DeviceStatus
 from shared.schemas import (
     PollingJobCreate, PollingJob as PollingJobSchema,
@@ -20,6 +22,7 @@ from shared.schemas import (
 )
 from shared.logger import configure_logging, get_logger
 from shared.config import settings
+from services.poller.series_buffer import CompressedSeriesStore
 
 # Configure logging
 configure_logging()
@@ -222,6 +225,11 @@ class MultiProtocolPoller:
         self.netconf_poller = NETCONFPoller()
         self.restconf_poller = RESTCONFPoller()
         self.redis = get_redis()
+        self.series_buffer = CompressedSeriesStore(
+            max_bytes=settings.series_buffer_max_bytes,
+            window_seconds=settings.series_buffer_window_seconds,
+            chunk_points=settings.series_buffer_chunk_points
+        )
     
     async def poll_job(self, job: PollingJob, device: Device) -> Dict[str, Any]:
         """Execute a single polling job"""
@@ -325,6 +333,9 @@ class MultiProtocolPoller:
     async def _store_metrics(self, device: Device, job: PollingJob, data: Dict[str, Any], db: Session):
         """Store collected metrics in database"""
         try:
+            timestamp = datetime.now()
+            samples = []
+            
             for key, value in data.items():
                 # Convert value to float if possible
                 try:
@@ -332,19 +343,27 @@ class MultiProtocolPoller:
                 except (ValueError, TypeError):
                     metric_value = 0.0
                 
+                metric_name = f"{job.protocol.value}_{key}"
+                
                 # Create metric record
                 metric = Metric(
                     device_id=device.id,
-                    metric_name=f"{job.protocol.value}_{key}",
+                    metric_name=metric_name,
                     metric_value=metric_value,
                     metric_unit=self._get_metric_unit(key),
-                    timestamp=datetime.now()
+                    timestamp=timestamp
                 )
                 
                 db.add(metric)
+                samples.append((metric_name, metric_value))
             
             db.commit()
             
+            # Keep the committed samples in memory for recent-range queries
+            epoch = timestamp.timestamp()
+            for metric_name, metric_value in samples:
+                self.series_buffer.append(device.id, metric_name, epoch, metric_value)
+            
         except Exception as e:
             logger.error("Failed to store metrics", device_id=device.id, job_id=job.id, error=str(e))
     
@@ -380,6 +399,22 @@ class MultiProtocolPoller:
 poller_service = MultiProtocolPoller()
 
 
+@app.on_event("startup")
+async def startup_event():
+    """Start background tasks"""
+    asyncio.create_task(series_buffer_sweep_task())
+
+
+async def series_buffer_sweep_task():
+    """Background task to drop series that stopped reporting"""
+    while True:
+        try:
+            await asyncio.sleep(300)
+            poller_service.series_buffer.sweep()
+        except Exception as e:
+            logger.error("Series buffer sweep failed", error=str(e))
+
+
 @app.get("/health", response_model=HealthCheck)
 async def health_check():
     """Health check endpoint"""
@@ -390,6 +425,12 @@ async def health_check():
     )
 
 
+@app.get("/db-pool/metrics")
+async def db_pool_metrics():
+    """Database connection pool metrics in Prometheus text format"""
+    return Response(content=render_pool_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/jobs", response_model=List[PollingJobSchema])
 async def get_polling_jobs(
     skip: int = 0,
@@ -509,6 +550,57 @@ async def get_device_metrics(
     return metrics
 
 
+
+@app.get("/internal/series/{device_id}")
+async def get_recent_series(
+    device_id: int,
+    metric_name: str,
+    start_time: datetime = None,
+    end_time: datetime = None,
+    db: Session = Depends(get_db)
+):
+    """Get one series for a time range, serving the recent part from the in-memory buffer"""
+    end_time = end_time or datetime.now()
+    start_time = start_time or end_time - timedelta(seconds=settings.series_buffer_window_seconds)
+    
+    points, buffered_from = poller_service.series_buffer.query(
+        device_id, metric_name, start_time.timestamp(), end_time.timestamp()
+    )
+    
+    # Anything older than the buffer still comes from the database
+    db_points = []
+    if buffered_from is None:
+        db_range = Metric.timestamp <= end_time
+        db_needed = True
+    else:
+        db_range = Metric.timestamp < datetime.fromtimestamp(buffered_from)
+        db_needed = start_time.timestamp() < buffered_from
+    
+    if db_needed:
+        rows = db.query(Metric.timestamp, Metric.metric_value).filter(
+            and_(
+                Metric.device_id == device_id,
+                Metric.metric_name == metric_name,
+                Metric.timestamp >= start_time,
+                db_range
+            )
+        ).order_by(Metric.timestamp).all()
+        db_points = [(row.timestamp.isoformat(), row.metric_value) for row in rows]
+    
+    return {
+        "device_id": device_id,
+        "metric_name": metric_name,
+        "points": db_points + [(datetime.fromtimestamp(ts).isoformat(), value) for ts, value in points],
+        "buffered_from": datetime.fromtimestamp(buffered_from).isoformat() if buffered_from is not None else None,
+        "sources": {"database": len(db_points), "buffer": len(points)}
+    }
+
+
+@app.get("/internal/series-buffer/stats")
+async def get_series_buffer_stats():
+    """In-memory series buffer usage"""
+    return poller_service.series_buffer.stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8002)
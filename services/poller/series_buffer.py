@@ -0,0 +1,354 @@
+"""
+In-process compressed buffer of recent samples for the poller
+Each (device_id, metric_name) series is stored in Gorilla-style chunks:
+timestamps as delta-of-delta and values as XOR against the previous value.
+The whole store is held under a fixed byte budget and a time window; older
+chunks are evicted first and callers fall back to PostgreSQL for them.
+"""
+import struct
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Approximate Python object overhead per sealed chunk, counted against the budget
+CHUNK_OVERHEAD_BYTES = 120
+
+_DOUBLE = struct.Struct('>d')
+_UINT64 = struct.Struct('>Q')
+
+
+def _float_to_bits(value: float) -> int:
+    return _UINT64.unpack(_DOUBLE.pack(value))[0]
+
+
+def _bits_to_float(bits: int) -> float:
+    return _DOUBLE.unpack(_UINT64.pack(bits))[0]
+
+
+class BitWriter:
+    """Append-only big-endian bit stream"""
+
+    __slots__ = ('buffer', '_acc', '_nbits')
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self._acc = 0
+        self._nbits = 0
+
+    def write(self, value: int, nbits: int):
+        self._acc = (self._acc << nbits) | (value & ((1 << nbits) - 1))
+        self._nbits += nbits
+        while self._nbits >= 8:
+            self._nbits -= 8
+            self.buffer.append((self._acc >> self._nbits) & 0xFF)
+        self._acc &= (1 << self._nbits) - 1
+
+    def getvalue(self) -> bytes:
+        if self._nbits:
+            return bytes(self.buffer) + bytes([(self._acc << (8 - self._nbits)) & 0xFF])
+        return bytes(self.buffer)
+
+    def __len__(self) -> int:
+        return len(self.buffer) + (1 if self._nbits else 0)
+
+
+class BitReader:
+    """Reads a big-endian bit stream produced by BitWriter"""
+
+    __slots__ = ('_value', '_remaining')
+
+    def __init__(self, data: bytes):
+        self._value = int.from_bytes(data, 'big')
+        self._remaining = len(data) * 8
+
+    def read(self, nbits: int) -> int:
+        self._remaining -= nbits
+        return (self._value >> self._remaining) & ((1 << nbits) - 1)
+
+
+def _signed(value: int, nbits: int) -> int:
+    if value >= 1 << (nbits - 1):
+        value -= 1 << nbits
+    return value
+
+
+# (prefix, prefix bits, payload bits) for delta-of-delta ranges
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+)
+
+
+class GorillaChunk:
+    """Open chunk being appended to"""
+
+    __slots__ = (
+        'writer', 'count', 'first_ts', 'last_ts',
+        '_prev_delta', '_prev_bits', '_leading', '_trailing'
+    )
+
+    def __init__(self):
+        self.writer = BitWriter()
+        self.count = 0
+        self.first_ts = 0
+        self.last_ts = 0
+        self._prev_delta = 0
+        self._prev_bits = 0
+        self._leading = -1
+        self._trailing = 0
+
+    def append(self, ts: int, value: float):
+        """Append a sample; ts is in whole seconds and must not go backwards"""
+        bits = _float_to_bits(value)
+        writer = self.writer
+
+        if self.count == 0:
+            writer.write(ts, 64)
+            writer.write(bits, 64)
+            self.first_ts = ts
+        else:
+            delta = ts - self.last_ts
+            dod = delta - self._prev_delta
+            if dod == 0:
+                writer.write(0, 1)
+            else:
+                for prefix, prefix_bits, payload_bits in _DOD_BUCKETS:
+                    limit = 1 << (payload_bits - 1)
+                    if -limit <= dod < limit:
+                        writer.write(prefix, prefix_bits)
+                        writer.write(dod, payload_bits)
+                        break
+                else:
+                    writer.write(0b1111, 4)
+                    writer.write(dod, 32)
+            self._prev_delta = delta
+
+            xor = bits ^ self._prev_bits
+            if xor == 0:
+                writer.write(0, 1)
+            else:
+                leading = min(64 - xor.bit_length(), 31)
+                trailing = (xor & -xor).bit_length() - 1
+                if self._leading >= 0 and leading >= self._leading and trailing >= self._trailing:
+                    writer.write(0b10, 2)
+                    writer.write(xor >> self._trailing, 64 - self._leading - self._trailing)
+                else:
+                    self._leading = leading
+                    self._trailing = trailing
+                    meaningful = 64 - leading - trailing
+                    writer.write(0b11, 2)
+                    writer.write(leading, 5)
+                    writer.write(meaningful - 1, 6)
+                    writer.write(xor >> trailing, meaningful)
+
+        self._prev_bits = bits
+        self.last_ts = ts
+        self.count += 1
+
+    def seal(self) -> 'SealedChunk':
+        return SealedChunk(self.first_ts, self.last_ts, self.count, self.writer.getvalue())
+
+
+class SealedChunk:
+    """Immutable encoded chunk"""
+
+    __slots__ = ('first_ts', 'last_ts', 'count', 'data')
+
+    def __init__(self, first_ts: int, last_ts: int, count: int, data: bytes):
+        self.first_ts = first_ts
+        self.last_ts = last_ts
+        self.count = count
+        self.data = data
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + CHUNK_OVERHEAD_BYTES
+
+
+def decode_chunk(data: bytes, count: int) -> List[Tuple[int, float]]:
+    """Decode `count` samples from an encoded chunk"""
+    if count == 0:
+        return []
+
+    reader = BitReader(data)
+    ts = reader.read(64)
+    bits = reader.read(64)
+    points = [(ts, _bits_to_float(bits))]
+
+    delta = 0
+    leading = 0
+    trailing = 0
+    for _ in range(count - 1):
+        if reader.read(1) == 0:
+            dod = 0
+        elif reader.read(1) == 0:
+            dod = _signed(reader.read(7), 7)
+        elif reader.read(1) == 0:
+            dod = _signed(reader.read(9), 9)
+        elif reader.read(1) == 0:
+            dod = _signed(reader.read(12), 12)
+        else:
+            dod = _signed(reader.read(32), 32)
+        delta += dod
+        ts += delta
+
+        if reader.read(1) == 1:
+            if reader.read(1) == 1:
+                leading = reader.read(5)
+                meaningful = reader.read(6) + 1
+                trailing = 64 - leading - meaningful
+            bits ^= reader.read(64 - leading - trailing) << trailing
+
+        points.append((ts, _bits_to_float(bits)))
+
+    return points
+
+
+class SeriesBuffer:
+    """Sealed chunks plus the open head chunk of one series"""
+
+    __slots__ = ('chunks', 'head')
+
+    def __init__(self):
+        self.chunks: Deque[SealedChunk] = deque()
+        self.head: Optional[GorillaChunk] = None
+
+    @property
+    def oldest_ts(self) -> Optional[int]:
+        if self.chunks:
+            return self.chunks[0].first_ts
+        if self.head and self.head.count:
+            return self.head.first_ts
+        return None
+
+    @property
+    def newest_ts(self) -> Optional[int]:
+        if self.head and self.head.count:
+            return self.head.last_ts
+        if self.chunks:
+            return self.chunks[-1].last_ts
+        return None
+
+
+SeriesKey = Tuple[int, str]
+
+
+class CompressedSeriesStore:
+    """Fixed-budget store of recent samples keyed by (device_id, metric_name)"""
+
+    def __init__(self, max_bytes: int, window_seconds: int, chunk_points: int = 120):
+        self.max_bytes = max_bytes
+        self.window_seconds = window_seconds
+        self.chunk_points = chunk_points
+
+        self._series: Dict[SeriesKey, SeriesBuffer] = {}
+        # Sealed chunks in seal order, used to evict the oldest data first
+        self._sealed: Deque[Tuple[SeriesKey, SealedChunk]] = deque()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.samples_appended = 0
+        self.samples_rejected = 0
+        self.chunks_evicted = 0
+
+    def append(self, device_id: int, metric_name: str, timestamp: float, value: float) -> bool:
+        """Add a sample; returns False for out-of-order samples"""
+        ts = int(timestamp)
+        key = (device_id, metric_name)
+
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = SeriesBuffer()
+
+            newest = series.newest_ts
+            if newest is not None and ts < newest:
+                self.samples_rejected += 1
+                return False
+
+            head = series.head
+            if head is None:
+                head = series.head = GorillaChunk()
+
+            before = len(head.writer)
+            head.append(ts, float(value))
+            self._bytes += len(head.writer) - before
+            self.samples_appended += 1
+
+            if head.count >= self.chunk_points:
+                sealed = head.seal()
+                self._bytes += sealed.nbytes - len(head.writer)
+                series.chunks.append(sealed)
+                series.head = None
+                self._sealed.append((key, sealed))
+
+            self._evict(ts)
+            return True
+
+    def query(self, device_id: int, metric_name: str, start: float, end: float) -> Tuple[List[Tuple[int, float]], Optional[int]]:
+        """Return (points in [start, end], oldest buffered timestamp) for one series"""
+        start_ts = int(start)
+        end_ts = int(end)
+
+        with self._lock:
+            series = self._series.get((device_id, metric_name))
+            if series is None:
+                return [], None
+
+            oldest = series.oldest_ts
+            encoded = [
+                (chunk.data, chunk.count) for chunk in series.chunks
+                if chunk.last_ts >= start_ts and chunk.first_ts <= end_ts
+            ]
+            head = series.head
+            if head and head.count and head.last_ts >= start_ts and head.first_ts <= end_ts:
+                encoded.append((head.writer.getvalue(), head.count))
+
+        # Decode outside the lock; chunk bytes are immutable snapshots
+        points = []
+        for data, count in encoded:
+            points.extend(point for point in decode_chunk(data, count) if start_ts <= point[0] <= end_ts)
+        return points, oldest
+
+    def sweep(self, now: Optional[float] = None):
+        """Drop series whose newest sample is outside the window"""
+        cutoff = int(now if now is not None else time.time()) - self.window_seconds
+        with self._lock:
+            stale = [key for key, series in self._series.items() if (series.newest_ts or 0) < cutoff]
+            for key in stale:
+                series = self._series.pop(key)
+                self._bytes -= sum(chunk.nbytes for chunk in series.chunks)
+                if series.head:
+                    self._bytes -= len(series.head.writer)
+            if stale:
+                self._sealed = deque(item for item in self._sealed if item[0] in self._series)
+
+    def _evict(self, now_ts: int):
+        """Evict sealed chunks that are over budget or older than the window"""
+        cutoff = now_ts - self.window_seconds
+        while self._sealed:
+            key, chunk = self._sealed[0]
+            if self._bytes <= self.max_bytes and chunk.last_ts >= cutoff:
+                break
+            self._sealed.popleft()
+            series = self._series.get(key)
+            if series is None or not series.chunks or series.chunks[0] is not chunk:
+                continue
+            series.chunks.popleft()
+            self._bytes -= chunk.nbytes
+            self.chunks_evicted += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'series': len(self._series),
+                'sealed_chunks': len(self._sealed),
+                'bytes_used': self._bytes,
+                'max_bytes': self.max_bytes,
+                'window_seconds': self.window_seconds,
+                'samples_appended': self.samples_appended,
+                'samples_rejected': self.samples_rejected,
+                'chunks_evicted': self.chunks_evicted
+            }
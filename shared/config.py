@@ -16,6 +16,18 @@ class Settings(BaseSettings):
     postgres_user: str = "scnms"
     postgres_password: str = "scnms"
     
+    # Database Connection Pool Configuration (set per service via environment)
+    # The sync and asyncpg engines pool separately; a process opens at most
+    # db_pool_size + db_max_overflow + db_async_pool_size + db_async_max_overflow
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_async_pool_size: int = 5
+    db_async_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 300
+    db_slow_checkout_ms: int = 100
+    db_pgbouncer_mode: bool = False
+    
     # Redis Configuration
     redis_host: str = "localhost"
     redis_port: int = 6379
@@ -24,6 +36,24 @@ class Settings(BaseSettings):
     # Prometheus Configuration
     prometheus_url: str = "http://localhost:9090"
     prometheus_pushgateway_url: str = "http://localhost:9091"
+    prometheus_pushgateway_enabled: bool = False
+    prometheus_series_ttl_seconds: int = 900
+    prometheus_max_series_per_metric: int = 10000
+    prometheus_sweep_interval: int = 60
+    
+    # Prometheus remote_write sender (disabled when the URL is empty)
+    remote_write_url: str = ""
+    remote_write_shards: int = 4
+    remote_write_queue_capacity: int = 10000
+    remote_write_max_samples_per_send: int = 2000
+    remote_write_batch_send_deadline: float = 5.0
+    remote_write_timeout: float = 30.0
+    remote_write_min_backoff: float = 0.1
+    remote_write_max_backoff: float = 10.0
+    remote_write_max_retries: int = 5
+    remote_write_spill_dir: str = "/tmp/scnms-remote-write"
+    remote_write_spill_max_bytes: int = 256 * 1024 * 1024
+    remote_write_spill_replay_interval: float = 10.0
     
     # Service Configuration
     log_level: str = "INFO"
@@ -56,9 +86,61 @@ class Settings(BaseSettings):
     batch_size: int = 100
     max_concurrent_polls: int = 10
     
+    # Recent-sample buffer in the poller (Gorilla-compressed, fixed budget)
+    series_buffer_max_bytes: int = 64 * 1024 * 1024
+    series_buffer_window_seconds: int = 3600
+    series_buffer_chunk_points: int = 120
+    
+    # Incremental metric ingestion (watermark on metrics.ingest_xid, id)
+    ingestion_batch_size: int = 5000
+    ingestion_max_rows_per_cycle: int = 100000
+    ingestion_rule_refresh_interval: int = 60
+    
+    # Bulk ingestion (/ingest/bulk) and batched metric writer
+    ingest_queue_max_rows: int = 500000
+    ingest_chunk_rows: int = 5000
+    ingest_writer_batch_rows: int = 50000
+    ingest_writer_flush_interval: float = 1.0
+    ingest_backpressure_timeout: float = 2.0
+    ingest_max_future_seconds: int = 300
+    device_index_refresh_interval: int = 60
+    device_index_min_refresh_interval: int = 5
+    
+    # Interface name cache (ifIndex -> ifDescr/ifAlias)
+    interface_cache_check_interval: int = 300
+    interface_cache_min_walk_interval: int = 3600
+    
+    # Metric retention (per-metric policies live in retention_policies)
+    metric_retention_days: int = 30
+    retention_interval: int = 3600
+    retention_slice_pause_seconds: float = 0.5
+    
     # Alarm Configuration
     alarm_retention_days: int = 30
     alarm_cleanup_interval: int = 3600
+    alarm_rule_reload_interval: int = 300
+    alarm_clear_delay_seconds: int = 60
+    alarm_pending_stale_seconds: int = 180
+    alarm_timer_tick_seconds: float = 1.0
+    alarm_batch_max_messages: int = 500
+    alarm_batch_max_wait_ms: int = 50
+    alarm_flap_half_life_seconds: int = 300
+    alarm_flap_start_score: float = 6.0
+    alarm_flap_stop_score: float = 2.0
+    alarm_flap_summary_interval: int = 300
+    alarm_storm_raise_rate: float = 20.0
+    alarm_storm_burst: int = 200
+    alarm_topology_suppression: bool = True
+    alarm_ws_queue_size: int = 256
+    alarm_ws_send_timeout: float = 10.0
+    alarm_ws_replay_size: int = 10000
+    alarm_stats_refresh_seconds: float = 5.0
+    alarm_stats_reconcile_interval: int = 300
+    alarm_hot_retention_hours: int = 24
+    alarm_archive_chunk_size: int = 1000
+    alarm_archive_pause_seconds: float = 0.5
+    alarm_event_partitions_ahead: int = 7
+    alarm_event_replay_page_size: int = 10000
     
     class Config:
         env_file = ".env"
@@ -1,27 +1,184 @@
 """
 Database connection and session management
 """
+import time
+import uuid
 from sqlalchemy import create_engine, MetaData
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
 import redis
 from shared.config import settings
+from shared.logger import get_logger
+
+logger = get_logger("database")
 
 # PostgreSQL Database
 DATABASE_URL = f"postgresql://{settings.postgres_user}:{settings.postgres_password}@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}"
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{settings.postgres_user}:{settings.postgres_password}@{settings.postgres_host}:{settings.postgres_port}/{settings.postgres_db}"
+
+# Connection pool instrumentation
+pool_registry = CollectorRegistry()
+
+pool_checkout_wait = Histogram(
+    'scnms_db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled database connection',
+    ['service', 'pool'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    registry=pool_registry
+)
+
+pool_slow_checkouts = Counter(
+    'scnms_db_pool_slow_checkouts_total',
+    'Connection checkouts slower than the configured threshold',
+    ['service', 'pool'],
+    registry=pool_registry
+)
+
+pool_checkout_timeouts = Counter(
+    'scnms_db_pool_checkout_timeouts_total',
+    'Connection checkouts that timed out waiting for the pool',
+    ['service', 'pool'],
+    registry=pool_registry
+)
+
+
+class _CheckoutTimingMixin:
+    """Times every checkout from the pool queue, including overflow connects"""
+
+    pool_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            pool_checkout_timeouts.labels(settings.service_name, self.pool_label).inc()
+            logger.error(
+                "Database connection checkout timed out",
+                pool=self.pool_label,
+                waited_ms=round((time.perf_counter() - start) * 1000, 2),
+                in_use=self.checkedout(),
+                size=self.size()
+            )
+            raise
+
+        waited = time.perf_counter() - start
+        pool_checkout_wait.labels(settings.service_name, self.pool_label).observe(waited)
+        if waited * 1000 >= settings.db_slow_checkout_ms:
+            pool_slow_checkouts.labels(settings.service_name, self.pool_label).inc()
+            logger.warning(
+                "Slow database connection checkout",
+                pool=self.pool_label,
+                waited_ms=round(waited * 1000, 2),
+                in_use=self.checkedout(),
+                overflow=max(self.overflow(), 0)
+            )
+        return connection
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    """QueuePool for the sync engine with checkout timing"""
+    pool_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool for the asyncpg engine with checkout timing"""
+    pool_label = "async"
+
+
+def _pool_options(pool_size: int, max_overflow: int) -> dict:
+    """Pool options of one engine; each engine has its own share of the connection budget"""
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': settings.db_pool_timeout,
+        'pool_recycle': settings.db_pool_recycle,
+        'pool_pre_ping': True,
+        'echo': False
+    }
+
+
+def _async_connect_args() -> dict:
+    """asyncpg connect arguments; PgBouncer transaction pooling cannot use prepared statements"""
+    if not settings.db_pgbouncer_mode:
+        return {}
+    return {
+        'statement_cache_size': 0,
+        'prepared_statement_cache_size': 0,
+        'prepared_statement_name_func': lambda: f"__asyncpg_{uuid.uuid4()}__"
+    }
+
 
 engine = create_engine(
     DATABASE_URL,
-    poolclass=StaticPool,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    echo=False
+    poolclass=InstrumentedQueuePool,
+    **_pool_options(settings.db_pool_size, settings.db_max_overflow)
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine for FastAPI endpoints and background tasks running on the event loop
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=InstrumentedAsyncQueuePool,
+    connect_args=_async_connect_args(),
+    **_pool_options(settings.db_async_pool_size, settings.db_async_max_overflow)
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+class PoolStateCollector:
+    """Reads in-use, idle and overflow counts from the live pools at scrape time"""
+
+    def collect(self):
+        pools = (("sync", engine.pool), ("async", async_engine.sync_engine.pool))
+
+        size = GaugeMetricFamily(
+            'scnms_db_pool_size', 'Configured pool size', labels=['service', 'pool']
+        )
+        in_use = GaugeMetricFamily(
+            'scnms_db_pool_connections_in_use', 'Connections currently checked out', labels=['service', 'pool']
+        )
+        idle = GaugeMetricFamily(
+            'scnms_db_pool_connections_idle', 'Connections idle in the pool', labels=['service', 'pool']
+        )
+        overflow = GaugeMetricFamily(
+            'scnms_db_pool_overflow', 'Overflow connections open beyond pool_size', labels=['service', 'pool']
+        )
+
+        for label, pool in pools:
+            labels = [settings.service_name, label]
+            size.add_metric(labels, pool.size())
+            in_use.add_metric(labels, pool.checkedout())
+            idle.add_metric(labels, pool.checkedin())
+            overflow.add_metric(labels, max(pool.overflow(), 0))
+
+        yield size
+        yield in_use
+        yield idle
+        yield overflow
+
+
+pool_registry.register(PoolStateCollector())
+
+
+def render_pool_metrics() -> bytes:
+    """Render connection pool metrics in Prometheus text format"""
+    return generate_latest(pool_registry)
+
+
 # Redis Connection
 redis_client = redis.Redis(
     host=settings.redis_host,
@@ -43,6 +200,12 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    """Dependency to get an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 def get_redis():
     """Dependency to get Redis client"""
     return redis_client
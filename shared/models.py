@@ -1,7 +1,7 @@
 """
 Database models for SCNMS
 """
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Float, ForeignKey, Enum
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, Text, Float, ForeignKey, Enum, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from shared.database import Base
@@ -82,6 +82,9 @@ class Device(Base):
 class Metric(Base):
     """Network metrics model"""
     __tablename__ = "metrics"
+    __table_args__ = (
+        Index("idx_metrics_ingest_xid", "ingest_xid", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
@@ -89,6 +92,8 @@ class Metric(Base):
     metric_value = Column(Float, nullable=False)
     metric_unit = Column(String(20), nullable=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    # Writing transaction (pg_current_xact_id); incremental readers gate on the snapshot with it
+    ingest_xid = Column(BigInteger, server_default=text("CAST(CAST(pg_current_xact_id() AS text) AS bigint)"), nullable=False)
     
     # Relationships
     device = relationship("Device", back_populates="metrics")
@@ -111,16 +116,79 @@ class Alarm(Base):
     acknowledged_at = Column(DateTime(timezone=True), nullable=True)
     acknowledged_by = Column(String(100), nullable=True)
     cleared_at = Column(DateTime(timezone=True), nullable=True)
-    closed_at = Column(DateTime(timezone=True), nullable=True)
+    closed_at = Column(DateTime(timezone=True), nullable=True, index=True)
     
     # Additional metadata
     source = Column(String(50), nullable=True)  # snmp_trap, polling, manual
+    root_cause_alarm_id = Column(String(100), nullable=True, index=True)  # set on symptoms of an upstream outage
     tags = Column(Text, nullable=True)  # JSON string for additional tags
     
     # Relationships
     device = relationship("Device", back_populates="alarms")
 
 
+class AlarmHistory(Base):
+    """Closed alarms moved out of the hot alarms table; partitioned by day of closed_at"""
+    __tablename__ = "alarm_history"
+    __table_args__ = {"postgresql_partition_by": "RANGE (closed_at)"}
+    
+    id = Column(Integer, primary_key=True)
+    closed_at = Column(DateTime(timezone=True), primary_key=True)
+    device_id = Column(Integer, nullable=False)
+    alarm_id = Column(String(100), nullable=False, index=True)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    severity = Column(Enum(AlarmSeverity), nullable=False)
+    status = Column(Enum(AlarmStatus), nullable=False)
+    raised_at = Column(DateTime(timezone=True), nullable=True)
+    acknowledged_at = Column(DateTime(timezone=True), nullable=True)
+    acknowledged_by = Column(String(100), nullable=True)
+    cleared_at = Column(DateTime(timezone=True), nullable=True)
+    source = Column(String(50), nullable=True)
+    root_cause_alarm_id = Column(String(100), nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class AlarmEvent(Base):
+    """Append-only alarm lifecycle log: the alarm's state after each event, partitioned by day of ts"""
+    __tablename__ = "alarm_events"
+    __table_args__ = (
+        Index("idx_alarm_events_device_ts", "device_id", "ts"),
+        Index("idx_alarm_events_alarm_ts", "alarm_id", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+    
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    ts = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    event_type = Column(String(20), nullable=False)  # raised, acknowledged, cleared, auto_cleared, closed, root_cause
+    alarm_id = Column(String(100), nullable=False)
+    alarm_row_id = Column(Integer, nullable=False)  # alarms.id of the projection row
+    device_id = Column(Integer, nullable=False)
+    status = Column(Enum(AlarmStatus), nullable=False)
+    severity = Column(Enum(AlarmSeverity), nullable=False)
+    title = Column(String(255), nullable=False)
+    description = Column(Text, nullable=True)
+    source = Column(String(50), nullable=True)
+    raised_at = Column(DateTime(timezone=True), nullable=True)
+    actor = Column(String(100), nullable=True)  # acknowledged_by for acknowledgements
+    root_cause_alarm_id = Column(String(100), nullable=True)
+
+
+class DeviceDependency(Base):
+    """Upstream (parent) / downstream (child) link between two devices"""
+    __tablename__ = "device_dependencies"
+    __table_args__ = (
+        UniqueConstraint("parent_device_id", "child_device_id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    parent_device_id = Column(Integer, ForeignKey("devices.id"), nullable=False, index=True)
+    child_device_id = Column(Integer, ForeignKey("devices.id"), nullable=False, index=True)
+    source = Column(String(20), nullable=False, default="manual")  # manual, lldp
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class PollingJob(Base):
     """Polling job configuration"""
     __tablename__ = "polling_jobs"
@@ -148,9 +216,68 @@ class AlarmRule(Base):
     metric_name = Column(String(100), nullable=False)
     threshold_value = Column(Float, nullable=False)
     comparison_operator = Column(String(10), nullable=False)  # >, <, >=, <=, ==, !=
+    clear_threshold_value = Column(Float, nullable=True)  # None clears at threshold_value (no hysteresis)
     duration_seconds = Column(Integer, default=0)  # 0 means immediate
     severity = Column(Enum(AlarmSeverity), nullable=False)
     enabled = Column(Boolean, default=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=True)  # None applies to every device
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class RetentionPolicy(Base):
+    """Metric retention and downsampling policy"""
+    __tablename__ = "retention_policies"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False, unique=True)
+    metric_pattern = Column(String(255), nullable=False)  # shell-style glob on metric_name
+    raw_ttl_days = Column(Integer, nullable=False)
+    rollup_ttls = Column(Text, nullable=True)  # JSON: {"<resolution_seconds>": <ttl_days>}
+    archive = Column(Boolean, default=False)  # copy expired raw rows to metrics_archive
+    priority = Column(Integer, default=100)  # lowest matching priority wins
+    enabled = Column(Boolean, default=True)
+    
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+class MetricRollup(Base):
+    """Downsampled metric aggregates"""
+    __tablename__ = "metric_rollups"
+    __table_args__ = (
+        UniqueConstraint("device_id", "metric_name", "resolution_seconds", "bucket_start"),
+    )
+    
+    id = Column(BigInteger, primary_key=True)
+    device_id = Column(Integer, ForeignKey("devices.id"), nullable=False)
+    metric_name = Column(String(100), nullable=False, index=True)
+    resolution_seconds = Column(Integer, nullable=False)
+    bucket_start = Column(DateTime(timezone=True), nullable=False, index=True)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+    sample_count = Column(Integer, nullable=False)
+
+
+class MetricArchive(Base):
+    """Raw metrics moved out of the hot table by an archiving retention policy"""
+    __tablename__ = "metrics_archive"
+    
+    id = Column(Integer, primary_key=True)
+    device_id = Column(Integer, nullable=False)
+    metric_name = Column(String(100), nullable=False)
+    metric_value = Column(Float, nullable=False)
+    metric_unit = Column(String(20), nullable=True)
+    timestamp = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class IngestionCheckpoint(Base):
+    """Durable read position of an incremental metrics consumer"""
+    __tablename__ = "ingestion_checkpoints"
+    
+    consumer = Column(String(100), primary_key=True)
+    last_xid = Column(BigInteger, nullable=False, default=0)  # read position is (last_xid, last_metric_id)
+    last_metric_id = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
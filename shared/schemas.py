@@ -1,7 +1,8 @@
 """
 Pydantic schemas for API serialization
 """
-from pydantic import BaseModel, Field
+import json
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 from shared.models import DeviceStatus, AlarmSeverity, AlarmStatus, ProtocolType
@@ -118,11 +119,53 @@ class Alarm(AlarmBase):
     acknowledged_by: Optional[str]
     cleared_at: Optional[datetime]
     closed_at: Optional[datetime]
+    root_cause_alarm_id: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class AlarmEvent(BaseModel):
+    """One alarm_events row: the alarm's state right after the event"""
+    id: int
+    ts: datetime
+    event_type: str
+    alarm_id: str
+    device_id: int
+    status: AlarmStatus
+    severity: AlarmSeverity
+    title: str
+    source: Optional[str] = None
+    actor: Optional[str] = None
+    root_cause_alarm_id: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+
+# Device Dependency Schemas
+class DeviceDependencyBase(BaseModel):
+    parent_device_id: int
+    child_device_id: int
+    source: str = "manual"
+
+
+class DeviceDependencyCreate(DeviceDependencyBase):
+    pass
+
+
+class DeviceDependency(DeviceDependencyBase):
+    id: int
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class LldpTopologyRequest(BaseModel):
+    root_device_ids: List[int] = Field(..., description="Core devices; links are oriented away from them")
+
+
 # Polling Job Schemas
 class PollingJobBase(BaseModel):
     device_id: int
@@ -154,9 +197,11 @@ class AlarmRuleBase(BaseModel):
     metric_name: str
     threshold_value: float
     comparison_operator: str
+    clear_threshold_value: Optional[float] = None
     duration_seconds: int = 0
     severity: AlarmSeverity
     enabled: bool = True
+    device_id: Optional[int] = None
 
 
 class AlarmRuleCreate(AlarmRuleBase):
@@ -169,9 +214,11 @@ class AlarmRuleUpdate(BaseModel):
     metric_name: Optional[str] = None
     threshold_value: Optional[float] = None
     comparison_operator: Optional[str] = None
+    clear_threshold_value: Optional[float] = None
     duration_seconds: Optional[int] = None
     severity: Optional[AlarmSeverity] = None
     enabled: Optional[bool] = None
+    device_id: Optional[int] = None
 
 
 class AlarmRule(AlarmRuleBase):
@@ -183,6 +230,38 @@ class AlarmRule(AlarmRuleBase):
         from_attributes = True
 
 
+# Retention Policy Schemas
+class RetentionPolicyBase(BaseModel):
+    name: str
+    metric_pattern: str = Field(..., description="Glob matched against metric_name (e.g. snmp_1.3.6.1.2.1.2.2.1.*)")
+    raw_ttl_days: int = Field(..., ge=1)
+    rollup_ttls: Dict[int, int] = Field(default_factory=dict, description="Rollup resolution in seconds -> TTL in days")
+    archive: bool = False
+    priority: int = 100
+    enabled: bool = True
+
+
+class RetentionPolicyCreate(RetentionPolicyBase):
+    pass
+
+
+class RetentionPolicy(RetentionPolicyBase):
+    id: int
+    created_at: datetime
+    updated_at: Optional[datetime]
+    
+    @field_validator('rollup_ttls', mode='before')
+    @classmethod
+    def parse_rollup_ttls(cls, value):
+        """rollup_ttls is stored as a JSON string"""
+        if isinstance(value, str):
+            return json.loads(value)
+        return value or {}
+    
+    class Config:
+        from_attributes = True
+
+
 # API Response Schemas
 class HealthCheck(BaseModel):
     status: str